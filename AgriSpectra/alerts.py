@@ -0,0 +1,586 @@
+"""Alert subscriptions and background delivery of hazard and risk-level alerts.
+
+A warehouse subscribes with its location, the crop it stores and a webhook.
+The first subscription for a warehouse returns an owner token; replacing or
+removing the subscription later needs it (`X-Subscription-Token`), and
+listing subscriptions shows a client only the one its token owns. Webhooks
+must resolve to public addresses: loopback, private and link-local targets
+are refused when subscribing and again, after a fresh DNS lookup, on every
+delivery (`allow_private` lifts this for local testing).
+
+`Dispatcher.check()` runs every `interval` seconds in a background thread:
+it scans the 7-day hazard forecast and re-scores the storage risk of all
+subscribed locations in batched upstream calls, and turns new hazards and
+risk-level changes into alerts.
+An alert is sent once: hazards are remembered per (warehouse, type, date,
+severity) until the day has passed, risk levels per warehouse until the
+level changes again.
+
+Alerts for the same webhook are grouped into batches and put on a bounded
+queue served by a small pool of delivery threads. A failed delivery
+(connection error, 5xx or 429) is retried with exponential backoff and
+jitter up to `max_attempts`; other 4xx answers, and batches that cannot be
+built or sent at all, count as failures without a retry. When the
+queue is full, new batches are dropped and counted rather than blocking
+the check, and their alerts are raised again by the next check. `stats()`
+reports queue depth, retries, throughput and failures (`alerts` in
+`/api/metrics`).
+
+Webhook body: ``{"alerts": [...], "count": n, "sent_at": "..."}``; with a
+subscription secret, ``X-AgriSpectra-Signature: sha256=<hmac of the body>``.
+Use `webhook_sink.py` as a local receiver.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import json
+import queue
+import random
+import secrets
+import socket
+import threading
+import time
+from collections import deque
+from datetime import date, datetime, timezone
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import schema
+
+
+TOKEN_HEADER = 'X-Subscription-Token'
+# operator token for manual checks and the full subscription list
+ADMIN_HEADER = 'X-Alerts-Admin-Token'
+HAZARD_MEMORY_SECONDS = 8 * 86400
+# levels worth telling someone about on a warehouse's first check
+NOTIFY_LEVELS = frozenset({'HIGH', 'CRITICAL'})
+
+
+class AlertError(ValueError):
+    pass
+
+
+class AlertForbidden(AlertError):
+    """The caller does not hold the owner token of the subscription it tries to change."""
+
+
+def _webhook(value):
+    url = str(value).strip()
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        raise ValueError(url)
+    parsed.port  # raises ValueError for a malformed port
+    return url
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if ip.version == 6 and ip.ipv4_mapped is not None:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+
+def public_address(host: str, port: int) -> str:
+    """An address to connect to for `host`; AlertError if any address it resolves to is not public.
+
+    Raises socket.gaierror (an OSError) when the name does not resolve.
+    """
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    blocked = [a for a in addresses if not _is_public(a)]
+    if blocked:
+        raise AlertError(f'webhook host {host} resolves to a non-public address ({blocked[0]})')
+    return addresses[0]
+
+
+def _default_port(parsed) -> int:
+    return parsed.port or (443 if parsed.scheme == 'https' else 80)
+
+
+SUBSCRIPTION = schema.Schema('Subscription', (
+    schema.Field('warehouse_id', 'trimmed', required=True),
+    schema.Field('latitude', 'number', required=True, strict=True),
+    schema.Field('longitude', 'number', required=True, strict=True),
+    schema.Field('crop_type', 'trimmed', required=True),
+    schema.Field('webhook', _webhook, required=True, strict=True),
+    schema.Field('season', 'text', 'Post-harvest'),
+    schema.Field('storage_days', 'days', 0),
+    # strict: an unusable secret must not quietly turn into an unsigned subscription
+    schema.Field('secret', 'text', '', strict=True),
+))
+
+
+def _token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def _owns(sub: Dict, token) -> bool:
+    return isinstance(token, str) and hmac.compare_digest(sub['owner_hash'], _token_hash(token))
+
+
+def admin_authorized(expected: Optional[str], given) -> bool:
+    """Whether `given` is the operator token; always False when none is configured."""
+    return bool(expected) and isinstance(given, str) and hmac.compare_digest(
+        given.encode('utf-8'), expected.encode('utf-8'))
+
+
+class Registry:
+    """Subscriptions by warehouse; one webhook per warehouse, changed only with its owner token."""
+
+    def __init__(self, allow_private: bool = False):
+        self.allow_private = allow_private
+        self._subs: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, payload: Dict, token: Optional[str] = None) -> Dict:
+        """Add or replace a subscription; a new one is returned with its `owner_token`."""
+        try:
+            sub = SUBSCRIPTION(payload)._asdict()
+        except schema.SchemaError as exc:
+            raise AlertError(str(exc))
+        if not (-90 <= sub['latitude'] <= 90 and -180 <= sub['longitude'] <= 180):
+            raise AlertError('latitude/longitude out of range')
+        if not self.allow_private:
+            parsed = urlparse(sub['webhook'])
+            try:
+                public_address(parsed.hostname, _default_port(parsed))
+            except OSError:
+                raise AlertError(f'webhook host {parsed.hostname} does not resolve')
+        sub['created'] = time.time()
+        issued = None
+        with self._lock:
+            current = self._subs.get(sub['warehouse_id'])
+            if current is None:
+                issued = secrets.token_urlsafe(24)
+                sub['owner_hash'] = _token_hash(issued)
+            elif _owns(current, token):
+                sub['owner_hash'] = current['owner_hash']
+            else:
+                raise AlertForbidden(f'{sub["warehouse_id"]} is already subscribed; '
+                                     f'send its owner token in {TOKEN_HEADER} to replace it')
+            self._subs[sub['warehouse_id']] = sub
+        out = public(sub)
+        if issued is not None:
+            out['owner_token'] = issued
+        return out
+
+    def unsubscribe(self, warehouse_id: str, token: Optional[str] = None) -> bool:
+        """Remove a subscription; False if there is none, AlertForbidden without its owner token."""
+        with self._lock:
+            current = self._subs.get(warehouse_id)
+            if current is None:
+                return False
+            if not _owns(current, token):
+                raise AlertForbidden(f'send the owner token of {warehouse_id} in {TOKEN_HEADER} to remove it')
+            del self._subs[warehouse_id]
+            return True
+
+    def get(self, warehouse_id: str) -> Optional[Dict]:
+        with self._lock:
+            sub = self._subs.get(warehouse_id)
+            return dict(sub) if sub else None
+
+    def all(self) -> List[Dict]:
+        with self._lock:
+            return [dict(sub) for sub in self._subs.values()]
+
+    def owned_by(self, token) -> List[Dict]:
+        """The subscriptions `token` owns (at most one: each warehouse gets its own token)."""
+        with self._lock:
+            return [dict(sub) for sub in self._subs.values() if _owns(sub, token)]
+
+    def __len__(self) -> int:
+        return len(self._subs)
+
+
+def public(sub: Dict) -> Dict:
+    """A subscription as shown to API clients (the signing secret and owner token are never echoed)."""
+    out = {k: v for k, v in sub.items() if k not in ('secret', 'owner_hash')}
+    out['signed'] = bool(sub.get('secret'))
+    return out
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _Batch:
+    __slots__ = ('url', 'secret', 'alerts', 'attempts', 'due')
+
+    def __init__(self, url: str, secret: str, alerts: List[Dict]):
+        self.url = url
+        self.secret = secret
+        self.alerts = alerts
+        self.attempts = 0
+        self.due = 0.0
+
+    def __lt__(self, other):
+        return self.due < other.due
+
+
+def post_json(url: str, body: bytes, headers: Dict[str, str], timeout: float, allow_private: bool = False) -> int:
+    """POST `body` and return the HTTP status; raises OSError on connection failure.
+
+    Unless `allow_private`, the host is resolved first and the request refused
+    with AlertError when any address is not public; the connection then goes
+    to the checked address, so a second DNS answer cannot redirect it.
+    Redirects are not followed.
+    """
+    # imported here so the HTTP client stays out of start-up (see coldstart.py)
+    import http.client
+
+    parsed = urlparse(url)
+    connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' else http.client.HTTPConnection
+    conn = connection_class(parsed.hostname, parsed.port, timeout=timeout)
+    if not allow_private:
+        address = public_address(parsed.hostname, _default_port(parsed))
+        # HTTP(S)Connection.connect opens its socket through this hook; TLS still verifies the host name
+        conn._create_connection = lambda where, *args: socket.create_connection((address, where[1]), *args)
+    path = (parsed.path or '/') + (f'?{parsed.query}' if parsed.query else '')
+    try:
+        conn.request('POST', path, body=body, headers=headers)
+        response = conn.getresponse()
+        response.read()
+        return response.status
+    except http.client.HTTPException as exc:
+        raise OSError(f'{type(exc).__name__}: {exc}')
+    finally:
+        conn.close()
+
+
+class Dispatcher:
+    """Periodic alert check plus a bounded, retrying webhook delivery pool.
+
+    `hazards(subscriptions)` returns {warehouse_id: [hazard alert, ...]} and
+    `risk(subscriptions)` returns {warehouse_id: {'risk_level', 'risk_score',
+    'temperature', 'humidity', 'source'}} (`source` says where the weather
+    came from; warehouses that could not be scored are left out). Both are
+    supplied by the app, which batches the upstream calls and bounds them
+    with a deadline, so this module never talks to the forecast API itself.
+    """
+
+    def __init__(self, registry: Registry, hazards: Callable[[List[Dict]], Dict[str, List[Dict]]],
+                 risk: Callable[[List[Dict]], Dict[str, Dict]], interval: float = 900.0, workers: int = 4,
+                 max_queue: int = 1000, batch_size: int = 50, max_attempts: int = 5,
+                 backoff_seconds: float = 2.0, max_backoff_seconds: float = 300.0, timeout: float = 10.0,
+                 send: Callable[[str, bytes, Dict[str, str], float], int] = post_json):
+        self.registry = registry
+        self.hazards = hazards
+        self.risk = risk
+        self.interval = interval
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.timeout = timeout
+        self.send = send
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._retries: List[_Batch] = []
+        self._lock = threading.Lock()
+        self._check_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._scheduler: Optional[threading.Thread] = None
+        self._rng = random.Random()
+        self._sent_hazards: Dict[Tuple, float] = {}
+        self._levels: Dict[str, str] = {}
+        self._delivered_at: deque = deque(maxlen=10000)
+        self._failures: deque = deque(maxlen=20)
+        self.in_flight = 0
+        self.checks = 0
+        self.alerts_raised = 0
+        self.deduplicated = 0
+        self.batches_delivered = 0
+        self.alerts_delivered = 0
+        self.retries = 0
+        self.failed = 0
+        self.dropped = 0
+        self.last_check: Optional[Dict] = None
+        self.last_error: Optional[str] = None
+
+    # ---- evaluation ----------------------------------------------------
+
+    def _new_hazards(self, sub: Dict, found: Iterable[Dict], now: float) -> List[Dict]:
+        out = []
+        for hazard in found:
+            key = (sub['warehouse_id'], hazard.get('type'), hazard.get('date'), hazard.get('severity'))
+            if key in self._sent_hazards:
+                self.deduplicated += 1
+                continue
+            self._sent_hazards[key] = now + HAZARD_MEMORY_SECONDS
+            alert = {k: v for k, v in hazard.items() if k not in ('location_index', 'location_id')}
+            out.append({'kind': 'hazard', **alert})
+        return out
+
+    def _risk_change(self, sub: Dict, assessed: Optional[Dict]) -> Optional[Dict]:
+        if not assessed:
+            return None
+        level = assessed.get('risk_level') or 'UNKNOWN'
+        previous = self._levels.get(sub['warehouse_id'])
+        self._levels[sub['warehouse_id']] = level
+        if level == previous or (previous is None and level not in NOTIFY_LEVELS):
+            if previous is not None:
+                self.deduplicated += 1
+            return None
+        crop = sub['crop_type']
+        if previous is None:
+            headline = f'Storage risk for {crop} is {level}'
+        else:
+            headline = f'Storage risk for {crop} changed from {previous} to {level}'
+        return {
+            'kind': 'risk_level',
+            'type': 'RISK_LEVEL',
+            'date': date.today().isoformat(),
+            'headline': headline,
+            'previous_level': previous,
+            'risk_level': level,
+            'risk_score': assessed.get('risk_score'),
+            'conditions': {'temperature': assessed.get('temperature'), 'humidity': assessed.get('humidity'),
+                           'source': assessed.get('source')},
+        }
+
+    def _forget(self, batch: _Batch) -> None:
+        # a dropped batch was never sent, so the next check raises its alerts again
+        with self._lock:
+            for alert in batch.alerts:
+                warehouse_id = alert['warehouse_id']
+                if alert['kind'] == 'hazard':
+                    self._sent_hazards.pop((warehouse_id, alert.get('type'), alert.get('date'),
+                                            alert.get('severity')), None)
+                elif alert['previous_level'] is None:
+                    self._levels.pop(warehouse_id, None)
+                else:
+                    self._levels[warehouse_id] = alert['previous_level']
+
+    def check(self) -> Dict:
+        """Evaluate every subscription once and queue the new alerts; returns a summary."""
+        with self._check_lock:
+            started = time.time()
+            subs = self.registry.all()
+            events: Dict[str, List[Dict]] = {}
+            errors = []
+            hazards: Dict[str, List[Dict]] = {}
+            risks: Dict[str, Dict] = {}
+            if subs:
+                try:
+                    hazards = self.hazards(subs)
+                except Exception as exc:
+                    errors.append(f'hazards: {exc}')
+                try:
+                    risks = self.risk(subs)
+                except Exception as exc:
+                    errors.append(f'risk: {exc}')
+            with self._lock:
+                self._sent_hazards = {k: exp for k, exp in self._sent_hazards.items() if exp > started}
+            for sub in subs:
+                assessed = risks.get(sub['warehouse_id'])
+                with self._lock:
+                    raised = self._new_hazards(sub, hazards.get(sub['warehouse_id']) or (), started)
+                    change = self._risk_change(sub, assessed)
+                if change:
+                    raised.append(change)
+                for alert in raised:
+                    alert.update({
+                        'warehouse_id': sub['warehouse_id'],
+                        'crop_type': sub['crop_type'],
+                        'location': {'latitude': sub['latitude'], 'longitude': sub['longitude']},
+                    })
+                    events.setdefault((sub['webhook'], sub['secret']), []).append(alert)
+
+            queued = 0
+            batches = 0
+            for (url, secret), alerts in events.items():
+                for offset in range(0, len(alerts), self.batch_size):
+                    batches += 1
+                    batch = _Batch(url, secret, alerts[offset:offset + self.batch_size])
+                    if self._enqueue(batch):
+                        queued += 1
+                    else:
+                        self._forget(batch)
+            raised_count = sum(len(a) for a in events.values())
+            self.alerts_raised += raised_count
+            self.checks += 1
+            if errors:
+                self.last_error = '; '.join(errors[:5])
+            self.last_check = {
+                'at': _now_iso(),
+                'subscriptions': len(subs),
+                'alerts': raised_count,
+                'batches': batches,
+                'queued': queued,
+                'errors': len(errors),
+                'seconds': round(time.time() - started, 3),
+            }
+            return dict(self.last_check)
+
+    # ---- delivery ------------------------------------------------------
+
+    def _enqueue(self, batch: _Batch) -> bool:
+        self._ensure_workers()
+        try:
+            self._queue.put_nowait(batch)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _body(self, batch: _Batch) -> Tuple[bytes, Dict[str, str]]:
+        body = json.dumps({'alerts': batch.alerts, 'count': len(batch.alerts), 'sent_at': _now_iso()},
+                          separators=(',', ':')).encode('utf-8')
+        headers = {'Content-Type': 'application/json', 'User-Agent': 'AgriSpectra-alerts'}
+        if batch.secret:
+            digest = hmac.new(batch.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+            headers['X-AgriSpectra-Signature'] = f'sha256={digest}'
+        return body, headers
+
+    def deliver(self, batch: _Batch) -> bool:
+        """Send one batch; schedules a retry on a transient failure."""
+        batch.attempts += 1
+        try:
+            body, headers = self._body(batch)
+            status = self.send(batch.url, body, headers, self.timeout)
+            error = None if 200 <= status < 300 else f'HTTP {status}'
+            transient = status >= 500 or status == 429
+        except OSError as exc:
+            error, transient = str(exc) or type(exc).__name__, True
+        except Exception as exc:
+            # a refused destination or a batch that cannot be encoded will not succeed on a retry
+            error, transient = f'{type(exc).__name__}: {exc}', False
+        if error is None:
+            with self._lock:
+                self.batches_delivered += 1
+                self.alerts_delivered += len(batch.alerts)
+                self._delivered_at.append((time.monotonic(), len(batch.alerts)))
+            return True
+        if transient and batch.attempts < self.max_attempts:
+            delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** (batch.attempts - 1))
+            batch.due = time.monotonic() + delay * self._rng.uniform(0.5, 1.5)
+            with self._lock:
+                self.retries += 1
+                heapq.heappush(self._retries, batch)
+            self._wake.set()
+            return False
+        with self._lock:
+            self.failed += 1
+            self._failures.append({'url': batch.url, 'alerts': len(batch.alerts), 'attempts': batch.attempts,
+                                   'error': error, 'at': _now_iso()})
+        return False
+
+    def _worker(self) -> None:
+        while not self._stop.is_set():
+            try:
+                batch = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            with self._lock:
+                self.in_flight += 1
+            try:
+                self.deliver(batch)
+            except Exception as exc:
+                # a bug in one delivery must not take the worker down
+                self.last_error = f'delivery: {exc}'
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                self._queue.task_done()
+
+    def _release_retries(self) -> Optional[float]:
+        """Move due retries back onto the queue; returns seconds until the next one."""
+        now = time.monotonic()
+        with self._lock:
+            while self._retries and self._retries[0].due <= now:
+                batch = heapq.heappop(self._retries)
+                try:
+                    self._queue.put_nowait(batch)
+                except queue.Full:
+                    batch.due = now + self.backoff_seconds
+                    heapq.heappush(self._retries, batch)
+                    break
+            return self._retries[0].due - now if self._retries else None
+
+    def _ensure_workers(self) -> None:
+        with self._lock:
+            if any(t.is_alive() for t in self._threads):
+                return
+            self._threads = [
+                threading.Thread(target=self._worker, name=f'alert-delivery-{i}', daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def _run(self) -> None:
+        next_check = time.monotonic()
+        while not self._stop.is_set():
+            if self.interval > 0 and time.monotonic() >= next_check:
+                try:
+                    self.check()
+                except Exception as exc:
+                    self.last_error = f'check: {exc}'
+                next_check = time.monotonic() + self.interval
+            retry_in = self._release_retries()
+            waits = [max(0.0, next_check - time.monotonic())] if self.interval > 0 else []
+            if retry_in is not None:
+                waits.append(retry_in)
+            self._wake.wait(min(waits) if waits else None)
+            self._wake.clear()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._scheduler is not None:
+                return
+            self._scheduler = threading.Thread(target=self._run, name='alert-scheduler', daemon=True)
+            self._scheduler.start()
+        self._ensure_workers()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler is not None and self._scheduler.is_alive()
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """Wait until nothing is queued, in flight or waiting to retry."""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            self._release_retries()
+            with self._lock:
+                idle = not self._retries and not self.in_flight
+            if idle and self._queue.empty():
+                return True
+            time.sleep(0.02)
+        return False
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        with self._lock:
+            recent = [(at, n) for at, n in self._delivered_at if now - at <= 60.0]
+            return {
+                'subscriptions': len(self.registry),
+                'interval_seconds': self.interval,
+                'running': self.running,
+                'workers': self.workers,
+                'queue_depth': self._queue.qsize(),
+                'queue_capacity': self._queue.maxsize,
+                'in_flight': self.in_flight,
+                'retry_pending': len(self._retries),
+                'checks': self.checks,
+                'alerts_raised': self.alerts_raised,
+                'deduplicated': self.deduplicated,
+                'batches_delivered': self.batches_delivered,
+                'alerts_delivered': self.alerts_delivered,
+                'alerts_per_second_1m': round(sum(n for _, n in recent) / 60.0, 2),
+                'retries': self.retries,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'recent_failures': list(self._failures),
+                'last_check': self.last_check,
+                'last_error': self.last_error,
+            }
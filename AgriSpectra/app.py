@@ -3,15 +3,60 @@
 # Scientific Crop Storage Risk Assessment System
 # =====================================================
 
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-import json
-from urllib.parse import quote_plus
-from urllib.request import urlopen
-import data
-import risk_engine
-import eligibility_engine
+import coldstart
+
+with coldstart.phase('import:flask'):
+    from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, stream_with_context
+    from markupsafe import escape
+with coldstart.phase('import:stdlib'):
+    import hashlib
+    import io
+    import math
+    import os
+    import re
+    import threading
+    # werkzeug has already loaded http.client and ssl, so deferring this saves nothing
+    import urllib.request as urllib_request
+    from datetime import date
+    from functools import partial
+    from urllib.parse import quote_plus
+    # used by their own endpoints only, not by the pages or the risk API;
+    # each loads on first use (the objects built from them are created then too)
+    hazard_engine = coldstart.lazy_import('hazard_engine')
+    bulk_eligibility = coldstart.lazy_import('bulk_eligibility')
+    portfolio = coldstart.lazy_import('portfolio')
+    climatology = coldstart.lazy_import('climatology')
+    history = coldstart.lazy_import('history')
+    alerts = coldstart.lazy_import('alerts')
+    profiler = coldstart.lazy_import('profiler')
+with coldstart.phase('import:engines'):
+    import data
+    import risk_engine
+    import eligibility_engine
+    import risk_token
+    import risk_distribution
+    import forecast_cache
+    import fastjson
+    import schema
+    # eager: the threshold file is installed before the first request is scored
+    import thresholds
+    from deadline import Deadline, hop_timeout, read_body
 
-app = Flask(__name__, template_folder="templates", static_folder="static")
+app = Flask(__name__, template_folder="templates", static_folder="static")
+# compiled templates from `python coldstart.py build`; AGRISPECTRA_SNAPSHOT=0 disables
+if os.environ.get('AGRISPECTRA_SNAPSHOT') != '0':
+    with coldstart.phase('init:snapshot'):
+        coldstart.use_snapshot(app, os.environ.get('AGRISPECTRA_SNAPSHOT'))
+coldstart.track_first_response(app)
+# orjson-backed request/response JSON when installed; AGRISPECTRA_JSON=json disables
+fastjson.install(app)
+# per-request profiling behind AGRISPECTRA_PROFILE_TOKEN; without it no hooks are
+# added and profiler.py is never imported
+PROFILE_TOKEN = os.environ.get('AGRISPECTRA_PROFILE_TOKEN')
+_profiler = profiler.install(app, PROFILE_TOKEN) if PROFILE_TOKEN else None
+# Signs risk tokens; set it explicitly when running several workers so a
+# token issued by one is accepted by the others.
+app.config['SECRET_KEY'] = os.environ.get('AGRISPECTRA_SECRET_KEY') or os.urandom(32).hex()
 
 
 AVAILABLE_CROPS = [
@@ -26,9 +71,21 @@ def _safe_float(value):
     try:
         if value is None or str(value).strip() == '':
             return None
-        return float(value)
+        value = float(value)
     except Exception:
         return None
+    # 'nan' and 'inf' parse as floats but are not usable inputs
+    return value if math.isfinite(value) else None
+
+
+def _json_params(silent=False):
+    """The request's JSON body as a dict ({} when empty); any other JSON value raises SchemaError."""
+    params = request.get_json(silent=silent)
+    if params is None:
+        return {}
+    if not isinstance(params, dict):
+        raise schema.SchemaError('request body must be a JSON object')
+    return params
 
 
 def _infer_region_from_coordinates(lat, lon):
@@ -45,15 +102,35 @@ def _infer_region_from_coordinates(lat, lon):
     return 'West'
 
 
-def _fetch_json(url):
-    with urlopen(url, timeout=10) as response:
-        return json.loads(response.read().decode('utf-8'))
+# Upstream endpoints; point these at openmeteo_stub.py for offline runs
+GEOCODING_URL = os.environ.get('AGRISPECTRA_GEOCODING_URL', 'https://geocoding-api.open-meteo.com/v1/search')
+FORECAST_URL = os.environ.get('AGRISPECTRA_FORECAST_URL', 'https://api.open-meteo.com/v1/forecast')
+
+# Per-hop cap for any single upstream call, and the default overall budget
+# a request may spend across all of its hops (clients can ask for less via
+# the X-Request-Budget-Ms header).
+UPSTREAM_TIMEOUT_SECONDS = 10.0
+REQUEST_BUDGET_SECONDS = float(os.environ.get('AGRISPECTRA_REQUEST_BUDGET', '8'))
+
+
+def _request_deadline():
+    budget = REQUEST_BUDGET_SECONDS
+    asked = _safe_float(request.headers.get('X-Request-Budget-Ms'))
+    if asked is not None and asked > 0:
+        budget = min(budget, asked / 1000.0)
+    return Deadline(budget)
+
 
+def _fetch_json(url, deadline=None):
+    timeout = hop_timeout(deadline, UPSTREAM_TIMEOUT_SECONDS)
+    with urllib_request.urlopen(url, timeout=timeout) as response:
+        return app.json.loads(read_body(response, deadline))
 
-def _resolve_place_in_india(place_query):
+
+def _resolve_place_in_india(place_query, deadline=None):
     q = quote_plus(place_query)
-    url = f'https://geocoding-api.open-meteo.com/v1/search?name={q}&count=1&country=IN&language=en&format=json'
-    data_json = _fetch_json(url)
+    url = f'{GEOCODING_URL}?name={q}&count=1&country=IN&language=en&format=json'
+    data_json = _fetch_json(url, deadline)
     results = data_json.get('results') or []
     if not results:
         return None
@@ -67,15 +144,19 @@ def _resolve_place_in_india(place_query):
     }
 
 
-def _ten_day_weather_average(lat, lon):
+AVERAGE_DAILY_FIELDS = 'temperature_2m_mean,relative_humidity_2m_mean'
+
+
+def _ten_day_weather_average(lat, lon, deadline=None):
     url = (
-        'https://api.open-meteo.com/v1/forecast'
-        f'?latitude={lat}&longitude={lon}'
-        '&daily=temperature_2m_mean,relative_humidity_2m_mean'
+        f'{FORECAST_URL}?latitude={lat}&longitude={lon}'
+        f'&daily={AVERAGE_DAILY_FIELDS}'
         '&timezone=auto&forecast_days=10'
     )
-    data_json = _fetch_json(url)
-    daily = data_json.get('daily') or {}
+    return _daily_average(_fetch_json(url, deadline).get('daily') or {})
+
+
+def _daily_average(daily):
     temps = [x for x in (daily.get('temperature_2m_mean') or []) if isinstance(x, (int, float))]
     humidities = [x for x in (daily.get('relative_humidity_2m_mean') or []) if isinstance(x, (int, float))]
     if not temps or not humidities:
@@ -87,109 +168,520 @@ def _ten_day_weather_average(lat, lon):
         'avg_temperature': avg_temp,
         'avg_humidity': avg_humidity,
         'days_used': min(len(temps), len(humidities)),
+        # day-to-day spread, used as the forecast uncertainty in risk distributions
+        'spread': risk_distribution.spread_from_series(
+            daily.get('temperature_2m_mean') or [], daily.get('relative_humidity_2m_mean') or []
+        ),
     }
 
 
-def _weather_hazard_alerts(lat, lon):
+HAZARD_DAILY_FIELDS = 'time,precipitation_sum,windspeed_10m_max,weathercode'
+# Open-Meteo accepts comma-separated coordinate lists; keep URLs a sane length
+HAZARD_BATCH_SIZE = 50
+# most sites one /api/weather-alerts/batch request may ask for (each 50 is one upstream call)
+HAZARD_BATCH_MAX_LOCATIONS = int(os.environ.get('AGRISPECTRA_HAZARD_BATCH_MAX', '500'))
+
+
+def _weather_hazard_alerts(lat, lon, deadline=None):
     url = (
-        'https://api.open-meteo.com/v1/forecast'
-        f'?latitude={lat}&longitude={lon}'
-        '&daily=time,precipitation_sum,windspeed_10m_max,weathercode'
+        f'{FORECAST_URL}?latitude={lat}&longitude={lon}'
+        f'&daily={HAZARD_DAILY_FIELDS}'
         '&timezone=auto&forecast_days=7'
     )
-    data_json = _fetch_json(url)
-    daily = data_json.get('daily') or {}
-    days = daily.get('time') or []
-    precipitation = daily.get('precipitation_sum') or []
-    wind_max = daily.get('windspeed_10m_max') or []
-    weather_codes = daily.get('weathercode') or []
-
-    alerts = []
-    for idx, day in enumerate(days):
-        rain = precipitation[idx] if idx < len(precipitation) else 0
-        wind = wind_max[idx] if idx < len(wind_max) else 0
-        code = weather_codes[idx] if idx < len(weather_codes) else None
-
-        is_heavy_rain = isinstance(rain, (int, float)) and rain >= 50
-        is_cyclone_like = (
-            isinstance(wind, (int, float)) and wind >= 62
-        ) or (code in {95, 96, 99})
-
-        if is_heavy_rain:
-            severity = 'SEVERE' if rain >= 100 else 'HIGH'
-            alerts.append(
-                {
-                    'date': day,
-                    'type': 'HEAVY_RAIN',
-                    'severity': severity,
-                    'headline': f'Heavy rain expected on {day}',
-                    'details': f'Forecast rainfall is about {round(float(rain), 1)} mm.',
-                    'recommendations': [
-                        'Move produce to elevated and covered storage immediately.',
-                        'Use waterproof tarpaulins and seal side openings to avoid moisture ingress.',
-                        'Keep pallets above floor level and maintain drainage around storage.',
-                    ],
-                }
-            )
-
-        if is_cyclone_like:
-            alerts.append(
-                {
-                    'date': day,
-                    'type': 'CYCLONE_RISK',
-                    'severity': 'SEVERE',
-                    'headline': f'Cyclone/strong storm risk on {day}',
-                    'details': f'Peak wind may reach about {round(float(wind), 1)} km/h.',
-                    'recommendations': [
-                        'Shift stock to the safest available pucca storage building.',
-                        'Avoid temporary sheds; secure doors, roof sheets, and ventilation shutters.',
-                        'Keep emergency backup: tarpaulins, ropes, power backup, and contact list.',
-                    ],
-                }
-            )
+    data_json = _fetch_json(url, deadline)
+    return hazard_engine.evaluate_daily(data_json.get('daily') or {})
 
+
+def _weather_hazard_alerts_many(locations, deadline=None):
+    """Fetch 7-day forecasts for many sites in batched calls and scan them at once.
+
+    When the deadline runs out part-way, the sites fetched so far are scanned
+    and the result is flagged `partial`.
+    """
+    forecasts = []
+    partial_result = False
+    for offset in range(0, len(locations), HAZARD_BATCH_SIZE):
+        chunk = locations[offset:offset + HAZARD_BATCH_SIZE]
+        lats = ','.join(str(loc['latitude']) for loc in chunk)
+        lons = ','.join(str(loc['longitude']) for loc in chunk)
+        url = (
+            f'{FORECAST_URL}?latitude={lats}&longitude={lons}'
+            f'&daily={HAZARD_DAILY_FIELDS}'
+            '&timezone=auto&forecast_days=7'
+        )
+        try:
+            data_json = _fetch_json(url, deadline)
+        except Exception:
+            if not forecasts or deadline is None or not deadline.expired:
+                raise
+            partial_result = True
+            break
+        # a single coordinate pair comes back as an object, several as a list
+        if isinstance(data_json, dict):
+            data_json = [data_json]
+        for loc, item in zip(chunk, data_json):
+            forecasts.append({'id': loc.get('id'), 'daily': (item or {}).get('daily') or {}})
+
+    alerts = hazard_engine.scan_hazards(forecasts)
     return {
         'alerts': alerts,
-        'forecast_days_checked': len(days),
+        'locations_checked': len(forecasts),
+        'forecast_days_checked': sum(len(f['daily'].get('time') or []) for f in forecasts),
+        'partial': partial_result,
     }
-
-
+
+
+# -------------------------------
+# Threshold data
+# -------------------------------
+# Thresholds come from a versioned JSON file (the built-in tables if it is
+# missing) and are reloaded in the background when it changes; portfolio
+# scores are recomputed against each new version.
+THRESHOLDS_PATH = os.environ.get('AGRISPECTRA_THRESHOLDS') or thresholds.DEFAULT_PATH
+THRESHOLDS_POLL_SECONDS = float(os.environ.get('AGRISPECTRA_THRESHOLDS_POLL', '5'))
+
+_threshold_watcher = thresholds.ThresholdWatcher(THRESHOLDS_PATH, THRESHOLDS_POLL_SECONDS)
+
+
+def _rescore_portfolios(tables):
+    # until the portfolio API is first used there is nothing to rescore
+    if coldstart.loaded(portfolio):
+        portfolio.tick_all(0)
+
+
+thresholds.on_install(_rescore_portfolios)
+with coldstart.phase('init:thresholds'):
+    _threshold_watcher.check()
+if _threshold_watcher.last_error:
+    app.logger.warning('Ignoring threshold file, using built-in tables: %s', _threshold_watcher.last_error)
+
+
+@app.before_request
+def _ensure_threshold_watch():
+    if THRESHOLDS_POLL_SECONDS > 0 and not _threshold_watcher.running:
+        _threshold_watcher.start()
+
+
+# -------------------------------
+# Offline climatology
+# -------------------------------
+# Monthly normals per grid cell, memory-mapped on first use. They pre-fill
+# the calculator, stand in when the forecast is unavailable and cover storage
+# periods beyond the 10-day forecast. The shipped grid is modelled, not
+# measured, so every response that uses it says so ('modelled-climatology',
+# 'approximate': true).
+CLIMATOLOGY_PATH = os.environ.get('AGRISPECTRA_CLIMATOLOGY')  # unset: climatology.DEFAULT_PATH
+_climatology = None
+_climatology_opened = False
+# creates the services that are built on first use (climatology, history, alerts)
+_services_lock = threading.Lock()
+
+
+def _climatology_grid():
+    """The memory-mapped normals, opened on first use; None when they are unavailable."""
+    global _climatology, _climatology_opened
+    if not _climatology_opened:
+        with _services_lock:
+            if not _climatology_opened:
+                try:
+                    _climatology = climatology.Climatology.open(CLIMATOLOGY_PATH or climatology.DEFAULT_PATH)
+                except (OSError, climatology.ClimatologyError) as exc:
+                    app.logger.warning('Climatology unavailable: %s', exc)
+                _climatology_opened = True
+    return _climatology
+
+
+# storage outlooks are cut off here (ten years is longer than any crop keeps)
+MAX_OUTLOOK_DAYS = 3650
+
+
+def _climatology_average(lat, lon, days=10):
+    grid = _climatology_grid()
+    if grid is None or lat is None or lon is None:
+        return None
+    outlook = grid.period_mean(lat, lon, date.today(), days)
+    if outlook is None:
+        return None
+    return {
+        'avg_temperature': outlook['avg_temperature'],
+        'avg_humidity': outlook['avg_humidity'],
+        'days_used': outlook['days'],
+    }
+
+
+def _storage_outlook(lat, lon, weather, storage_days):
+    """Forecast average for the forecast days, monthly normals for the rest of the storage period."""
+    forecast_days = weather.get('days_used') or 0
+    storage_days = min(storage_days, MAX_OUTLOOK_DAYS)
+    grid = _climatology_grid()
+    if grid is None or storage_days <= forecast_days:
+        return None
+    later = grid.period_mean(lat, lon, date.fromordinal(date.today().toordinal() + forecast_days),
+                             storage_days - forecast_days)
+    if later is None:
+        return None
+    rest = later['days']
+    return {
+        'days': storage_days,
+        'forecast_days': forecast_days,
+        'climatology_days': rest,
+        'climatology_source': grid.label,
+        'approximate': grid.modelled,
+        'avg_temperature': round((weather['avg_temperature'] * forecast_days + later['avg_temperature'] * rest)
+                                 / storage_days, 1),
+        'avg_humidity': round((weather['avg_humidity'] * forecast_days + later['avg_humidity'] * rest)
+                              / storage_days, 1),
+        'months': later['months'],
+    }
+
+
+# -------------------------------
+# Assessment history
+# -------------------------------
+# Every assessment is queued for the append-only history store and written
+# in batches by a background thread; the store is created and the thread
+# started with the first record. AGRISPECTRA_HISTORY sets the directory, 0
+# disables.
+HISTORY_PATH = os.environ.get('AGRISPECTRA_HISTORY')  # unset: history.DEFAULT_PATH
+_history = None
+
+
+def _history_store():
+    """The history store, created on first use; None when history is disabled."""
+    global _history
+    if _history is None and HISTORY_PATH != '0':
+        with _services_lock:
+            if _history is None:
+                _history = history.HistoryStore(HISTORY_PATH or history.DEFAULT_PATH)
+    return _history
+
+
+def _history_writer():
+    store = _history_store()
+    if store is not None and not store.running:
+        store.start()
+    return store
+
+
+def _risk_score(result):
+    # the rice/paddy branch reports a percentage on the same 0-100 scale
+    return result.get('risk_score', result.get('risk_percentage'))
+
+
+def _record_assessment(source, inputs, risk_level, score=None, eligibility=None):
+    store = _history_writer()
+    if store is None:
+        return
+    schemes = len(eligibility.get('possible_schemes') or []) if eligibility is not None else None
+    store.record(source, inputs.crop_type, inputs.region, risk_level, score, inputs.temperature,
+                 inputs.humidity, inputs.storage_days, schemes=schemes)
+
+
+def _record_lots(warehouse_id, lots):
+    store = _history_writer()
+    if store is None:
+        return
+    for lot in lots:
+        store.record('portfolio', lot['crop_type'], lot['region'], lot['risk_level'], lot['risk_score'],
+                     lot['temperature'], lot['humidity'], lot['storage_days'], warehouse=warehouse_id)
+
+
+# -------------------------------
+# Forecast cache and prefetch
+# -------------------------------
+# Forecasts are cached per ~11 km grid cell so nearby users share entries;
+# the prefetcher keeps the most requested cells and places warm.
+GRID_STEP = 0.1
+FORECAST_TTL_SECONDS = 1800
+PLACE_TTL_SECONDS = 24 * 3600
+
+_hot_keys = forecast_cache.HotKeyTracker()
+_weather_cache = forecast_cache.ForecastCache(FORECAST_TTL_SECONDS, tracker=_hot_keys)
+_prefetcher = forecast_cache.PrefetchScheduler(_weather_cache, _hot_keys)
+
+
+def _grid_cell(lat, lon):
+    return (
+        round(round(lat / GRID_STEP) * GRID_STEP, 4),
+        round(round(lon / GRID_STEP) * GRID_STEP, 4),
+    )
+
+
+def _ensure_prefetch():
+    if os.environ.get('AGRISPECTRA_PREFETCH', '1') != '0' and not _prefetcher.running:
+        _prefetcher.start()
+
+
+_NO_VALUE = object()
+
+
+def _cached_lookup(key, loader, deadline, ttl=None):
+    """Cached upstream call bounded by `deadline`; returns (value, is_stale).
+
+    If the upstream call fails or the budget runs out, an expired cache
+    entry is served instead when one exists.
+    """
+    try:
+        return _weather_cache.get_or_load(key, loader, ttl=ttl, deadline=deadline), False
+    except Exception:
+        stale = _weather_cache.get_stale(key, _NO_VALUE)
+        if stale is _NO_VALUE:
+            raise
+        return stale, True
+
+
+def _cached_place(place, deadline=None):
+    key = ('place', ' '.join(place.lower().split()))
+    return _cached_lookup(key, partial(_resolve_place_in_india, place), deadline, ttl=PLACE_TTL_SECONDS)
+
+
+def _cached_weather_average(lat, lon, deadline=None):
+    cell = _grid_cell(lat, lon)
+    return _cached_lookup(('average',) + cell, partial(_ten_day_weather_average, *cell), deadline)
+
+
+def _cached_hazard_alerts(lat, lon, deadline=None):
+    cell = _grid_cell(lat, lon)
+    return _cached_lookup(('hazards',) + cell, partial(_weather_hazard_alerts, *cell), deadline)
+
+
+def _cached_weather_averages(cells, deadline=None):
+    """10-day averages for many grid cells: cache hits first, the rest in batched upstream calls.
+
+    Cells still missing when an upstream call fails or the deadline runs out
+    get an expired cache entry when there is one, else no entry at all.
+    """
+    found, missing = {}, []
+    for cell in cells:
+        value = _weather_cache.get(('average',) + cell, _NO_VALUE)
+        if value is _NO_VALUE:
+            missing.append(cell)
+        else:
+            found[cell] = value
+    for offset in range(0, len(missing), HAZARD_BATCH_SIZE):
+        chunk = missing[offset:offset + HAZARD_BATCH_SIZE]
+        url = (
+            f'{FORECAST_URL}?latitude={",".join(str(lat) for lat, _ in chunk)}'
+            f'&longitude={",".join(str(lon) for _, lon in chunk)}'
+            f'&daily={AVERAGE_DAILY_FIELDS}'
+            '&timezone=auto&forecast_days=10'
+        )
+        try:
+            data_json = _fetch_json(url, deadline)
+        except Exception:
+            break
+        # a single coordinate pair comes back as an object, several as a list
+        if isinstance(data_json, dict):
+            data_json = [data_json]
+        for cell, item in zip(chunk, data_json):
+            found[cell] = _daily_average((item or {}).get('daily') or {})
+            _weather_cache.put(('average',) + cell, found[cell])
+    for cell in missing:
+        if cell not in found:
+            stale = _weather_cache.get_stale(('average',) + cell, _NO_VALUE)
+            if stale is not _NO_VALUE:
+                found[cell] = stale
+    return found
+
+
+def _upstream_error(message, deadline):
+    # 504 tells clients the budget ran out rather than the upstream failing
+    status = 504 if deadline.expired else 502
+    return jsonify({'error': message}), status
+
+
+# -------------------------------
+# Alerts
+# -------------------------------
+# Subscribed warehouses are re-checked every AGRISPECTRA_ALERT_INTERVAL
+# seconds (0 checks only on an authorised POST /api/alerts/check); new hazards and risk
+# level changes are batched per webhook and delivered in the background.
+# The registry and dispatcher are created by the first alert request and the
+# dispatcher starts with the first subscription.
+ALERT_INTERVAL_SECONDS = float(os.environ.get('AGRISPECTRA_ALERT_INTERVAL', '900'))
+ALERT_WORKERS = int(os.environ.get('AGRISPECTRA_ALERT_WORKERS', '4'))
+# upstream time each part of a check (hazards, risk) may spend across all subscriptions
+ALERT_CHECK_BUDGET_SECONDS = float(os.environ.get('AGRISPECTRA_ALERT_CHECK_BUDGET', '30'))
+# webhooks on loopback/private addresses, e.g. webhook_sink.py on 127.0.0.1; for local testing only
+ALERT_ALLOW_PRIVATE = os.environ.get('AGRISPECTRA_ALERT_ALLOW_PRIVATE', '0') == '1'
+# operator token for POST /api/alerts/check and the full subscription list; unset disables both
+ALERT_ADMIN_TOKEN = os.environ.get('AGRISPECTRA_ALERT_ADMIN_TOKEN') or None
+
+
+def _subscription_hazards(subs):
+    locations = [{'id': s['warehouse_id'], 'latitude': s['latitude'], 'longitude': s['longitude']} for s in subs]
+    found = {}
+    for alert in _weather_hazard_alerts_many(locations, Deadline(ALERT_CHECK_BUDGET_SECONDS))['alerts']:
+        found.setdefault(alert.get('location_id'), []).append(alert)
+    return found
+
+
+def _subscription_risks(subs):
+    cells = {sub['warehouse_id']: _grid_cell(sub['latitude'], sub['longitude']) for sub in subs}
+    averages = _cached_weather_averages(sorted(set(cells.values())), Deadline(ALERT_CHECK_BUDGET_SECONDS))
+    found = {}
+    for sub in subs:
+        lat, lon = sub['latitude'], sub['longitude']
+        weather, source = averages.get(cells[sub['warehouse_id']]), 'forecast'
+        if weather is None:
+            weather = _climatology_average(lat, lon)
+            source = _climatology_grid().label if weather else None
+        if weather is None:
+            continue
+        inputs = risk_engine.normalize_inputs({
+            'crop_type': sub['crop_type'],
+            'region': _infer_region_from_coordinates(lat, lon),
+            'temperature': weather['avg_temperature'],
+            'humidity': weather['avg_humidity'],
+            'season': sub['season'],
+            'storage_days': sub['storage_days'],
+        })
+        result = risk_engine.evaluate(inputs)
+        found[sub['warehouse_id']] = {
+            'risk_level': result.get('risk_level'),
+            'risk_score': _risk_score(result),
+            'temperature': inputs.temperature,
+            'humidity': inputs.humidity,
+            'source': source,
+        }
+    return found
+
+
+_alerts = None
+
+
+def _alert_service():
+    """(registry, dispatcher), created on first use."""
+    global _alerts
+    if _alerts is None:
+        with _services_lock:
+            if _alerts is None:
+                registry = alerts.Registry(allow_private=ALERT_ALLOW_PRIVATE)
+                dispatcher = alerts.Dispatcher(registry, _subscription_hazards, _subscription_risks,
+                                               interval=ALERT_INTERVAL_SECONDS, workers=ALERT_WORKERS,
+                                               send=partial(alerts.post_json, allow_private=ALERT_ALLOW_PRIVATE))
+                _alerts = (registry, dispatcher)
+    return _alerts
+
+
+# -------------------------------
+# Calculator rendering
+# -------------------------------
+# The calculator page is a fixed shell around the form values and the result
+# panels. The shell is rendered once with placeholders and split into literal
+# chunks, so a request only joins the chunks with its own escaped values. The
+# risk and eligibility panels are rendered as fragments and cached by their
+# normalised inputs and the threshold version, so a repeat submission skips
+# both the engines and Jinja.
+CALCULATOR_FIELDS = ('place', 'latitude', 'longitude', 'region', 'temperature', 'humidity', 'storage_days')
+FRAGMENT_TTL_SECONDS = 3600
+_SLOT = re.compile(r'\x00(\w+)\x00')
+
+_calculator_shells = {}
+_risk_fragments = forecast_cache.ForecastCache(FRAGMENT_TTL_SECONDS, max_entries=2048)
+_eligibility_fragments = forecast_cache.ForecastCache(FRAGMENT_TTL_SECONDS, max_entries=2048)
+
+
+def _slot(name):
+    return f'\x00{name}\x00'
+
+
+def _calculator_shell(with_result):
+    parts = _calculator_shells.get(with_result)
+    if parts is None:
+        html = render_template(
+            'calculator.html',
+            crops=AVAILABLE_CROPS,
+            seasons=SEASONS,
+            form={field: _slot(field) for field in CALCULATOR_FIELDS},
+            map_query=_slot('map_query'),
+            result_html=_slot('result_html') if with_result else None,
+            eligibility_html=_slot('eligibility_html') if with_result else None,
+        )
+        # even positions are literal chunks, odd positions slot names
+        parts = _calculator_shells[with_result] = tuple(_SLOT.split(html))
+    return parts
+
+
+def _render_calculator(form, result_html=None, eligibility_html=None):
+    values = {field: escape(form.get(field) or '') for field in CALCULATOR_FIELDS}
+    values['map_query'] = escape(app.jinja_env.filters['urlencode'](form.get('place') or 'India'))
+    values['result_html'] = result_html
+    values['eligibility_html'] = eligibility_html or ''
+    parts = _calculator_shell(result_html is not None)
+    return ''.join(part if i % 2 == 0 else str(values[part]) for i, part in enumerate(parts))
+
+
+def _render_risk_fragment(inputs):
+    result = risk_engine.evaluate(inputs)
+    return render_template('_risk_result.html', result=result), result.get('risk_level'), _risk_score(result)
+
+
+def _render_eligibility_fragment(form, inputs):
+    result = eligibility_engine.evaluate_eligibility(form, inputs)
+    return render_template('_eligibility_result.html', eligibility_result=result)
+
+
+def _calculator_fragments(form):
+    """(risk html, risk level, eligibility html) for a calculator form; sets form['risk_level']."""
+    version = risk_engine.rules_version()
+    risk_inputs = risk_engine.normalize_inputs(form)
+    risk_html, risk_level, score = _risk_fragments.get_or_load(
+        (version,) + risk_inputs, _render_risk_fragment, inputs=risk_inputs
+    )
+    _record_assessment('calculator', risk_inputs, risk_level, score)
+    form['risk_level'] = risk_level
+    # the summary echoes these back as entered
+    echoed = (form.get('crop_type'), form.get('state'), form.get('landholding_size'))
+    eligibility_inputs = eligibility_engine.normalize_inputs(form)
+    eligibility_html = _eligibility_fragments.get_or_load(
+        (version,) + eligibility_inputs + echoed, _render_eligibility_fragment, form=form, inputs=eligibility_inputs
+    )
+    return risk_html, risk_level, eligibility_html
+
+
+def _calculator_form(source):
+    form = {
+        'crop_type': source.get('crop_type'),
+        'place': source.get('place'),
+        'latitude': source.get('latitude'),
+        'longitude': source.get('longitude'),
+        'temperature': source.get('temperature'),
+        'humidity': source.get('humidity'),
+        'season': source.get('season'),
+        'storage_days': source.get('storage_days')
+    }
+    lat = _safe_float(form.get('latitude'))
+    lon = _safe_float(form.get('longitude'))
+    form['region'] = _infer_region_from_coordinates(lat, lon)
+    return form
+
+
 @app.route('/')
 def index():
     return render_template('index.html')
 
 @app.route('/calculator', methods=['GET', 'POST'])
 def calculator():
-    result = None
-    eligibility_result = None
+    result_html = None
+    eligibility_html = None
     form = {}
     if request.method == 'POST':
-        form = {
-            'crop_type': request.form.get('crop_type'),
-            'place': request.form.get('place'),
-            'latitude': request.form.get('latitude'),
-            'longitude': request.form.get('longitude'),
-            'temperature': request.form.get('temperature'),
-            'humidity': request.form.get('humidity'),
-            'season': request.form.get('season'),
-            'storage_days': request.form.get('storage_days')
-        }
-        lat = _safe_float(form.get('latitude'))
-        lon = _safe_float(form.get('longitude'))
-        form['region'] = _infer_region_from_coordinates(lat, lon)
-        result = risk_engine.compute_risk(form)
-        eligibility_payload = dict(form)
-        eligibility_payload['risk_level'] = result.get('risk_level')
-        eligibility_result = eligibility_engine.evaluate_eligibility(eligibility_payload)
-    return render_template(
-        'calculator.html',
-        crops=AVAILABLE_CROPS,
-        seasons=SEASONS,
-        result=result,
-        eligibility_result=eligibility_result,
-        form=form
-    )
-
+        form = _calculator_form(request.form)
+        result_html, _, eligibility_html = _calculator_fragments(form)
+    elif _climatology_grid() is not None:
+        # no location yet: start from India-wide normals for this month
+        temp, rh = _climatology_grid().national(date.today().month)
+        form = {'temperature': temp, 'humidity': rh}
+    return _render_calculator(form, result_html, eligibility_html)
+
+
+@app.route('/calculator/fragments', methods=['POST'])
+def calculator_fragments():
+    """The calculator's result panels as HTML, for the front end to drop in."""
+    form = _calculator_form(_json_params(silent=True) or request.form)
+    result_html, risk_level, eligibility_html = _calculator_fragments(form)
+    return jsonify({'risk_level': risk_level, 'result_html': result_html, 'eligibility_html': eligibility_html})
 
 @app.route('/how')
 def how():
@@ -216,66 +708,194 @@ def about():
     return render_template('about.html')
 
 
+# -------------------------------
+# Request schemas
+# -------------------------------
+# Endpoints that need more than the engines' lenient RISK_INPUTS parse with
+# their own compiled schema; a SchemaError becomes a 400.
+@app.errorhandler(schema.SchemaError)
+def _bad_request_body(exc):
+    return jsonify({'error': str(exc)}), 400
+
+
+LIMITS_INPUTS = risk_engine.RISK_INPUTS.derive(
+    'LimitsInputs',
+    temperature={'strict': True},
+    humidity={'strict': True},
+    storage_days={'strict': True},
+)
+
+COMPARE_INPUTS = schema.Schema('CompareInputs', (
+    schema.Field('temperature', 'number', required=True, strict=True),
+    schema.Field('humidity', 'number', required=True, strict=True),
+    schema.Field('season', 'text', 'Post-harvest'),
+    schema.Field('storage_days', 'days', 0),
+))
+
+
 @app.route('/api/risk', methods=['POST'])
 def api_risk():
-    params = request.get_json() or {}
+    params = _json_params()
     if not params.get('region'):
         lat = _safe_float(params.get('latitude'))
         lon = _safe_float(params.get('longitude'))
         params['region'] = _infer_region_from_coordinates(lat, lon)
-    res = risk_engine.compute_risk(params)
+    inputs = risk_engine.normalize_inputs(params)
+    try:
+        distribution = risk_distribution.simulate_request(params, inputs)
+    except risk_distribution.DistributionError as exc:
+        return jsonify({'error': str(exc)}), 400
+    res = risk_engine.evaluate(inputs)
+    res['risk_token'] = risk_token.issue(res, inputs, app.config['SECRET_KEY'], risk_engine.rules_version())
+    _record_assessment('risk', inputs, res.get('risk_level'), _risk_score(res))
+    res['distribution'] = distribution
     return jsonify(res)
 
 
+@app.route('/api/assess', methods=['POST'])
+def api_assess():
+    """Risk and eligibility from a single engine pass."""
+    params = _json_params()
+    if not params.get('region'):
+        lat = _safe_float(params.get('latitude'))
+        lon = _safe_float(params.get('longitude'))
+        params['region'] = _infer_region_from_coordinates(lat, lon)
+    inputs = risk_engine.normalize_inputs(params)
+    try:
+        distribution = risk_distribution.simulate_request(params, inputs)
+    except risk_distribution.DistributionError as exc:
+        return jsonify({'error': str(exc)}), 400
+    risk = risk_engine.evaluate(inputs)
+    params['risk_level'] = risk.get('risk_level') or 'UNKNOWN'
+    eligibility = eligibility_engine.evaluate_eligibility(params)
+    risk['risk_token'] = risk_token.issue(risk, inputs, app.config['SECRET_KEY'], risk_engine.rules_version())
+    _record_assessment('assess', inputs, risk.get('risk_level'), _risk_score(risk), eligibility)
+    risk['distribution'] = distribution
+    return jsonify({'risk': risk, 'eligibility': eligibility})
+
+
+@app.route('/api/risk/limits', methods=['POST'])
+def api_risk_limits():
+    params = _json_params()
+    if not params.get('region'):
+        lat = _safe_float(params.get('latitude'))
+        lon = _safe_float(params.get('longitude'))
+        params['region'] = _infer_region_from_coordinates(lat, lon)
+    try:
+        inputs = LIMITS_INPUTS(params)
+    except schema.SchemaError:
+        return jsonify({'error': 'temperature, humidity and storage_days must be numbers.'}), 400
+    timeline = risk_engine.days_to_levels(
+        inputs.crop_type, inputs.region, inputs.temperature, inputs.humidity, inputs.season
+    )
+    envelope = risk_engine.safe_envelope(inputs.crop_type, inputs.region, inputs.season, inputs.storage_days)
+    return jsonify({**timeline, 'envelope': envelope})
+
+
+@app.route('/api/risk/compare', methods=['GET', 'POST'])
+def api_risk_compare():
+    """Every available crop in every region under one set of conditions, lowest risk first."""
+    params = request.args if request.method == 'GET' else _json_params()
+    try:
+        inputs = COMPARE_INPUTS(params)
+    except schema.SchemaError:
+        return jsonify({'error': 'temperature and humidity are required numbers.'}), 400
+    result = risk_engine.compare_crops(AVAILABLE_CROPS, *inputs)
+    response = jsonify(result)
+    if request.method == 'GET':
+        # the answer depends only on the conditions and the threshold version, so
+        # the ETag is built from both; no-cache makes every cache revalidate, and
+        # a hot reload shows up on the next request instead of minutes later
+        tag = repr((result['version'],) + tuple(inputs)).encode('utf-8')
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        response.set_etag(hashlib.sha1(tag).hexdigest())
+        response = response.make_conditional(request)
+    return response
+
+
 @app.route('/api/eligibility', methods=['POST'])
 def api_eligibility():
-    params = request.get_json() or {}
+    params = _json_params()
     if not params.get('region'):
         lat = _safe_float(params.get('latitude'))
         lon = _safe_float(params.get('longitude'))
         params['region'] = _infer_region_from_coordinates(lat, lon)
-    risk_level = (params.get('risk_level') or '').strip()
+    risk_level = str(params.get('risk_level') or '').strip()
+    inputs = risk_engine.normalize_inputs(params)
 
+    # a token from a previous /api/risk call for the same inputs saves a recompute
+    token = risk_token.verify(params.get('risk_token'), inputs, app.config['SECRET_KEY'],
+                              version=risk_engine.rules_version())
+    if token:
+        risk_level = token.get('l') or risk_level
+        params['risk_level'] = risk_level
+
+    score = None
     if not risk_level:
-        risk_payload = {
-            'crop_type': params.get('crop_type'),
-            'region': params.get('region'),
-            'temperature': params.get('temperature'),
-            'humidity': params.get('humidity'),
-            'season': params.get('season'),
-            'storage_days': params.get('storage_days'),
-        }
-        risk_res = risk_engine.compute_risk(risk_payload)
-        risk_level = risk_res.get('risk_level') or risk_res.get('risk_level'.lower()) or 'UNKNOWN'
+        risk_res = risk_engine.evaluate(inputs)
+        risk_level = risk_res.get('risk_level') or 'UNKNOWN'
+        score = _risk_score(risk_res)
         params['risk_level'] = risk_level
 
     res = eligibility_engine.evaluate_eligibility(params)
+    _record_assessment('eligibility', inputs, risk_level, score, res)
     return jsonify(res)
 
 
+@app.route('/api/eligibility/bulk', methods=['POST'])
+def api_eligibility_bulk():
+    """Stream a membership-roll CSV (raw request body) back as NDJSON."""
+    if request.mimetype not in ('text/csv', 'text/plain', 'application/octet-stream'):
+        return jsonify({'error': 'Send the CSV as the raw request body with Content-Type: text/csv.'}), 415
+    lines = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+    return Response(
+        stream_with_context(bulk_eligibility.stream_assessments(lines)),
+        mimetype='application/x-ndjson',
+    )
+
+
 @app.route('/api/weather-average', methods=['POST'])
 def api_weather_average():
-    params = request.get_json() or {}
-    place = (params.get('place') or '').strip()
+    _ensure_prefetch()
+    deadline = _request_deadline()
+    params = _json_params()
+    place = str(params.get('place') or '').strip()
     lat = _safe_float(params.get('latitude'))
     lon = _safe_float(params.get('longitude'))
+    storage_days = _safe_float(params.get('storage_days'))
+    if params.get('storage_days') not in (None, '') and (storage_days is None or storage_days < 0):
+        return jsonify({'error': 'storage_days must be a non-negative number.'}), 400
     resolved_place = None
+    stale = False
 
     if lat is None or lon is None:
         if not place:
             return jsonify({'error': 'Please provide a place in India or valid coordinates.'}), 400
-        resolved_place = _resolve_place_in_india(place)
+        try:
+            resolved_place, stale = _cached_place(place, deadline)
+        except Exception:
+            return _upstream_error('Unable to look up this place right now. Please enter coordinates or values manually.', deadline)
         if not resolved_place:
             return jsonify({'error': 'Place not found in India. Please refine your input.'}), 404
         lat = _safe_float(resolved_place.get('latitude'))
         lon = _safe_float(resolved_place.get('longitude'))
 
+    source = 'forecast'
+    upstream_failed = False
     try:
-        weather = _ten_day_weather_average(lat, lon)
+        weather, weather_stale = _cached_weather_average(lat, lon, deadline)
     except Exception:
-        return jsonify({'error': 'Unable to fetch weather right now. Please enter values manually.'}), 502
+        weather, weather_stale, upstream_failed = None, False, True
+    stale = stale or weather_stale
 
     if not weather:
+        # monthly normals are better than no defaults at all
+        weather = _climatology_average(lat, lon)
+        source = _climatology_grid().label if weather else None
+    if not weather:
+        if upstream_failed:
+            return _upstream_error('Unable to fetch weather right now. Please enter values manually.', deadline)
         return jsonify({'error': 'Weather data unavailable for this location.'}), 404
 
     region = _infer_region_from_coordinates(lat, lon)
@@ -292,31 +912,81 @@ def api_weather_average():
             'longitude': lon,
             'region': region,
             **weather,
+            'stale': stale,
+            'source': source,
+            'approximate': source != 'forecast' and _climatology_grid().modelled,
+            'storage_outlook': _storage_outlook(lat, lon, weather, int(storage_days or 0)),
+        }
+    )
+
+
+@app.route('/api/climatology')
+def api_climatology():
+    """Monthly normals for a location (or India-wide without one), no network needed."""
+    grid = _climatology_grid()
+    if grid is None:
+        return jsonify({'error': 'Climatology data is not installed.'}), 503
+    args = request.args
+    lat = _safe_float(args.get('latitude'))
+    lon = _safe_float(args.get('longitude'))
+    if (args.get('latitude') and lat is None) or (args.get('longitude') and lon is None):
+        return jsonify({'error': 'latitude and longitude must be numbers.'}), 400
+    month = _safe_float(args.get('month')) if args.get('month') else date.today().month
+    if month is None or not 1 <= month < 13:
+        return jsonify({'error': 'month must be between 1 and 12.'}), 400
+    month = int(month)
+    labels = {'source': grid.label, 'approximate': grid.modelled}
+
+    if lat is None or lon is None:
+        temp, rh = grid.national(month)
+        return jsonify({'scope': 'india', 'month': month, 'temperature': temp, 'humidity': rh, **labels})
+
+    normals = grid.normals(lat, lon)
+    if normals is None:
+        return jsonify({'error': 'No climatology for this location (outside India).'}), 404
+    temp, rh = normals[month - 1]
+    return jsonify(
+        {
+            'scope': 'cell',
+            'cell': grid.cell(lat, lon),
+            'region': _infer_region_from_coordinates(lat, lon),
+            'month': month,
+            'temperature': temp,
+            'humidity': rh,
+            'monthly': [{'month': m + 1, 'temperature': t, 'humidity': h} for m, (t, h) in enumerate(normals)],
+            **labels,
         }
     )
 
 
 @app.route('/api/weather-alerts', methods=['POST'])
 def api_weather_alerts():
-    params = request.get_json() or {}
-    place = (params.get('place') or '').strip()
+    _ensure_prefetch()
+    deadline = _request_deadline()
+    params = _json_params()
+    place = str(params.get('place') or '').strip()
     lat = _safe_float(params.get('latitude'))
     lon = _safe_float(params.get('longitude'))
     resolved_place = None
+    stale = False
 
     if lat is None or lon is None:
         if not place:
             return jsonify({'error': 'Please provide a place in India or valid coordinates.'}), 400
-        resolved_place = _resolve_place_in_india(place)
+        try:
+            resolved_place, stale = _cached_place(place, deadline)
+        except Exception:
+            return _upstream_error('Unable to look up this place right now. Please enter coordinates or values manually.', deadline)
         if not resolved_place:
             return jsonify({'error': 'Place not found in India. Please refine your input.'}), 404
         lat = _safe_float(resolved_place.get('latitude'))
         lon = _safe_float(resolved_place.get('longitude'))
 
     try:
-        hazards = _weather_hazard_alerts(lat, lon)
+        hazards, hazards_stale = _cached_hazard_alerts(lat, lon, deadline)
     except Exception:
-        return jsonify({'error': 'Unable to fetch hazard alerts right now.'}), 502
+        return _upstream_error('Unable to fetch hazard alerts right now.', deadline)
+    stale = stale or hazards_stale
 
     place_name = place
     if resolved_place:
@@ -330,6 +1000,267 @@ def api_weather_alerts():
             'latitude': lat,
             'longitude': lon,
             **hazards,
+            'stale': stale,
+        }
+    )
+
+
+@app.route('/api/weather-alerts/batch', methods=['POST'])
+def api_weather_alerts_batch():
+    deadline = _request_deadline()
+    params = _json_params()
+    requested = params.get('locations') if isinstance(params.get('locations'), list) else []
+    if len(requested) > HAZARD_BATCH_MAX_LOCATIONS:
+        return jsonify({'error': f'Please send at most {HAZARD_BATCH_MAX_LOCATIONS} locations per request.'}), 400
+    locations = []
+    for idx, item in enumerate(requested):
+        if not isinstance(item, dict):
+            continue
+        lat = _safe_float(item.get('latitude'))
+        lon = _safe_float(item.get('longitude'))
+        if lat is None or lon is None:
+            continue
+        locations.append({'id': item.get('id', idx), 'latitude': lat, 'longitude': lon})
+
+    if not locations:
+        return jsonify({'error': 'Please provide a list of locations with valid coordinates.'}), 400
+
+    try:
+        hazards = _weather_hazard_alerts_many(locations, deadline)
+    except Exception:
+        return _upstream_error('Unable to fetch hazard alerts right now.', deadline)
+
+    return jsonify(hazards)
+
+
+@app.route('/api/portfolio/<warehouse_id>', methods=['GET'])
+def api_portfolio(warehouse_id):
+    book = portfolio.get_portfolio(warehouse_id, create=False)
+    if book is None:
+        return jsonify({'error': 'Unknown warehouse.'}), 404
+    top = request.args.get('top', default=10, type=int)
+    return jsonify(book.summary(top=max(0, top)))
+
+
+@app.route('/api/portfolio/<warehouse_id>/lots', methods=['GET', 'POST'])
+def api_portfolio_lots(warehouse_id):
+    if request.method == 'GET':
+        book = portfolio.get_portfolio(warehouse_id, create=False)
+        if book is None:
+            return jsonify({'error': 'Unknown warehouse.'}), 404
+        return jsonify(
+            {
+                'lots': book.lots(
+                    crop=request.args.get('crop'),
+                    region=request.args.get('region'),
+                    level=request.args.get('level'),
+                )
+            }
+        )
+
+    params = _json_params()
+    items = params.get('lots') if isinstance(params.get('lots'), list) else [params]
+    try:
+        book, lots = portfolio.upsert_lots(warehouse_id, items)
+    except portfolio.PortfolioError as exc:
+        return jsonify({'error': str(exc)}), 400
+    _record_lots(warehouse_id, lots)
+    return jsonify({'lots': lots, 'summary': book.summary(top=0)})
+
+
+@app.route('/api/portfolio/<warehouse_id>/lots/<lot_id>', methods=['PATCH', 'DELETE'])
+def api_portfolio_lot(warehouse_id, lot_id):
+    book = portfolio.get_portfolio(warehouse_id, create=False)
+    if book is None:
+        return jsonify({'error': 'Unknown warehouse.'}), 404
+
+    if request.method == 'DELETE':
+        if not book.remove(lot_id):
+            return jsonify({'error': 'Unknown lot.'}), 404
+        return jsonify({'removed': lot_id, 'summary': book.summary(top=0)})
+
+    if book.get(lot_id) is None:
+        return jsonify({'error': 'Unknown lot.'}), 404
+    params = dict(_json_params())
+    params['lot_id'] = lot_id
+    try:
+        lot = book.upsert(params)
+    except portfolio.PortfolioError as exc:
+        return jsonify({'error': str(exc)}), 400
+    _record_lots(warehouse_id, [lot])
+    return jsonify({'lot': lot, 'summary': book.summary(top=0)})
+
+
+TICK_INPUTS = schema.Schema('TickInputs', (
+    schema.Field('days', 'days', 1, strict=True),
+))
+
+
+@app.route('/api/portfolio/tick', methods=['POST'])
+def api_portfolio_tick():
+    # meant to be called once a day by a scheduler/cron
+    params = _json_params(silent=True)
+    days = TICK_INPUTS(params).days
+    if days > MAX_OUTLOOK_DAYS:
+        return jsonify({'error': f'days must be at most {MAX_OUTLOOK_DAYS}.'}), 400
+    aged = portfolio.tick_all(days)
+    # the daily tick is each warehouse's risk time series
+    for warehouse_id in aged:
+        _record_lots(warehouse_id, portfolio.get_portfolio(warehouse_id, create=False).lots())
+    return jsonify({'aged': aged})
+
+
+def _history_filters(args):
+    return {field: args.get(field) for field in ('crop', 'region', 'warehouse', 'level', 'source')}
+
+
+@app.route('/api/history')
+def api_history():
+    """Recorded assessments, newest first: ?since=&until=&crop=&region=&warehouse=&level=&source=&limit="""
+    store = _history_store()
+    if store is None:
+        return jsonify({'error': 'History is disabled.'}), 503
+    limit = int(_safe_float(request.args.get('limit')) or 100)
+    try:
+        records = store.query(request.args.get('since'), request.args.get('until'),
+                              max(0, min(limit, 10000)), **_history_filters(request.args))
+    except history.HistoryError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify({'records': records})
+
+
+@app.route('/api/history/summary')
+def api_history_summary():
+    """Counts, level mix and scores per ?bucket=hour|day|week and ?group_by=crop,region,..."""
+    store = _history_store()
+    if store is None:
+        return jsonify({'error': 'History is disabled.'}), 503
+    group_by = [g.strip() for g in (request.args.get('group_by') or '').split(',') if g.strip()]
+    try:
+        summary = store.summary(request.args.get('since'), request.args.get('until'),
+                                request.args.get('bucket'), group_by, **_history_filters(request.args))
+    except history.HistoryError as exc:
+        return jsonify({'error': str(exc)}), 400
+    return jsonify(summary)
+
+
+@app.route('/api/alerts/subscriptions', methods=['GET', 'POST'])
+def api_alert_subscriptions():
+    registry, dispatcher = _alert_service()
+    if request.method == 'GET':
+        # every subscription for the operator, otherwise only the one the owner token names
+        if alerts.admin_authorized(ALERT_ADMIN_TOKEN, request.headers.get(alerts.ADMIN_HEADER)):
+            subs = registry.all()
+        elif request.headers.get(alerts.TOKEN_HEADER):
+            subs = registry.owned_by(request.headers.get(alerts.TOKEN_HEADER))
+        else:
+            return jsonify({'error': f'Send the subscription owner token in {alerts.TOKEN_HEADER}.'}), 403
+        return jsonify({'subscriptions': [alerts.public(sub) for sub in subs]})
+    try:
+        sub = registry.subscribe(_json_params(), request.headers.get(alerts.TOKEN_HEADER))
+    except alerts.AlertForbidden as exc:
+        return jsonify({'error': str(exc)}), 403
+    except alerts.AlertError as exc:
+        return jsonify({'error': str(exc)}), 400
+    dispatcher.start()
+    return jsonify({'subscription': sub})
+
+
+@app.route('/api/alerts/subscriptions/<warehouse_id>', methods=['DELETE'])
+def api_alert_subscription(warehouse_id):
+    registry, _ = _alert_service()
+    try:
+        removed = registry.unsubscribe(warehouse_id, request.headers.get(alerts.TOKEN_HEADER))
+    except alerts.AlertForbidden as exc:
+        return jsonify({'error': str(exc)}), 403
+    if not removed:
+        return jsonify({'error': 'Unknown subscription.'}), 404
+    return jsonify({'removed': warehouse_id})
+
+
+@app.route('/api/alerts/check', methods=['POST'])
+def api_alerts_check():
+    """Run one check now; delivery still happens in the background."""
+    # a check fans out upstream for every subscription, so only the operator may force one
+    if ALERT_ADMIN_TOKEN is None:
+        return jsonify({'error': 'Manual alert checks are disabled; set AGRISPECTRA_ALERT_ADMIN_TOKEN.'}), 404
+    if not alerts.admin_authorized(ALERT_ADMIN_TOKEN, request.headers.get(alerts.ADMIN_HEADER)):
+        return jsonify({'error': f'Send the alerts admin token in {alerts.ADMIN_HEADER}.'}), 403
+    _, dispatcher = _alert_service()
+    dispatcher.start()
+    return jsonify({'check': dispatcher.check(), 'delivery': dispatcher.stats()})
+
+
+def _profile_denied():
+    if _profiler is None:
+        return jsonify({'error': 'Profiling is disabled.'}), 404
+    if not _profiler.authorized(request.headers.get(profiler.HEADER)):
+        return jsonify({'error': f'Send the profiling token in {profiler.HEADER}.'}), 403
+    return None
+
+
+@app.route('/api/profile')
+def api_profile():
+    """Stored traces, newest first (?path= to filter)."""
+    denied = _profile_denied()
+    if denied:
+        return denied
+    traces = _profiler.traces(request.args.get('path'))
+    return jsonify({'traces': [trace.summary() for trace in traces], 'profiler': _profiler.stats()})
+
+
+@app.route('/api/profile/flamegraph')
+def api_profile_flamegraph():
+    """Sampled stacks of all stored traces (?path= to filter) merged, in collapsed format."""
+    denied = _profile_denied()
+    if denied:
+        return denied
+    return Response(_profiler.collapsed(_profiler.traces(request.args.get('path'))), mimetype='text/plain')
+
+
+@app.route('/api/profile/window', methods=['POST'])
+def api_profile_window():
+    """Sample every thread for {"seconds": n} (at most 30) and return the trace."""
+    denied = _profile_denied()
+    if denied:
+        return denied
+    params = _json_params(silent=True)
+    trace = _profiler.window(_safe_float(params.get('seconds')) or 5.0)
+    if trace is None:
+        return jsonify({'error': 'Profiling rate limit reached or a window is already running.'}), 429
+    return jsonify(trace.summary(top=25))
+
+
+@app.route('/api/profile/<trace_id>')
+def api_profile_trace(trace_id):
+    """One trace: JSON summary with the top functions, or ?format=collapsed for flamegraph tools."""
+    denied = _profile_denied()
+    if denied:
+        return denied
+    trace = _profiler.get(trace_id)
+    if trace is None:
+        return jsonify({'error': 'Unknown trace.'}), 404
+    if request.args.get('format') == 'collapsed':
+        return Response(trace.collapsed(), mimetype='text/plain')
+    top = request.args.get('top', default=25, type=int)
+    return jsonify(trace.summary(top=max(1, top)))
+
+
+@app.route('/api/metrics')
+def api_metrics():
+    # services created on first use report None until then; reading metrics does not load them
+    return jsonify(
+        {
+            'forecast_cache': _weather_cache.stats(),
+            'prefetch': _prefetcher.stats(),
+            'thresholds': _threshold_watcher.stats(),
+            'climatology': _climatology.stats() if _climatology is not None else None,
+            'fragments': {'risk': _risk_fragments.stats(), 'eligibility': _eligibility_fragments.stats()},
+            'startup': coldstart.report(),
+            'json': fastjson.stats(),
+            'history': _history.stats() if _history is not None else None,
+            'alerts': _alerts[1].stats() if _alerts is not None else None,
+            'profiler': _profiler.stats() if _profiler is not None else None,
         }
     )
 
@@ -0,0 +1,154 @@
+"""Streaming eligibility checks for whole membership rolls.
+
+`stream_assessments(lines)` reads CSV text line by line, scores each member
+with `risk_engine.compute_risk` and `eligibility_engine.evaluate_eligibility`
+and yields NDJSON lines as it goes. Nothing is accumulated per row, so
+memory stays flat however large the upload is; identical risk inputs (very
+common in a roll) are scored once through a small bounded memo.
+
+Output lines, in order:
+- one `{"schemes": {...}}` catalogue line (names and links, sent once)
+- one line per CSV row: `{"row", "member_id", "risk_level", "schemes", "reasons"}`
+  or `{"row", "error"}`
+- one final `{"summary": {...}}` line
+
+An upload that cannot be read any further (not UTF-8, or broken CSV
+quoting) ends with a `{"row", "error"}` line for the unreadable row and the
+summary, flagged `"complete": false`.
+"""
+
+from __future__ import annotations
+
+import csv
+import json
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator
+
+import eligibility_engine
+import risk_engine
+
+
+# Accepted header spellings -> canonical field
+COLUMN_ALIASES = {
+    'crop': 'crop_type',
+    'crop_type': 'crop_type',
+    'state': 'state',
+    'region': 'region',
+    'landholding_size': 'landholding_size',
+    'land_size': 'landholding_size',
+    'farmer_category': 'farmer_category',
+    'category': 'farmer_category',
+    'storage_days': 'storage_days',
+    'temperature': 'temperature',
+    'humidity': 'humidity',
+    'season': 'season',
+    'member_id': 'member_id',
+    'id': 'member_id',
+}
+
+RISK_MEMO_SIZE = 4096
+
+# rows per yielded chunk; keeps the number of socket writes reasonable
+CHUNK_ROWS = 50
+
+
+def _risk_level(row: Dict, memo: OrderedDict) -> str:
+    key = (
+        (row.get('crop_type') or '').strip().lower(),
+        row.get('region'),
+        row.get('temperature'),
+        row.get('humidity'),
+        row.get('season'),
+        row.get('storage_days'),
+    )
+    level = memo.get(key)
+    if level is not None:
+        memo.move_to_end(key)
+        return level
+    level = risk_engine.compute_risk(row).get('risk_level') or 'UNKNOWN'
+    memo[key] = level
+    if len(memo) > RISK_MEMO_SIZE:
+        memo.popitem(last=False)
+    return level
+
+
+def _canonical_row(raw: Dict) -> Dict:
+    row = {}
+    for key, value in raw.items():
+        field = COLUMN_ALIASES.get((key or '').strip().lower())
+        if field and value is not None:
+            row[field] = value.strip()
+    if not row.get('region'):
+        row['region'] = eligibility_engine.region_for_state(row.get('state'))
+    return row
+
+
+def stream_assessments(lines: Iterable[str]) -> Iterator[str]:
+    yield json.dumps({
+        'schemes': {
+            code: {'name': s['name'], 'official_link': s['link'], 'type': s['type']}
+            for code, s in eligibility_engine.SCHEMES.items()
+        }
+    }) + '\n'
+
+    memo: OrderedDict = OrderedDict()
+    rows = errors = 0
+    scheme_counts: Dict[str, int] = {}
+    level_counts: Dict[str, int] = {}
+    chunk = []
+    complete = True
+
+    reader = csv.DictReader(lines)
+    row_no = 0
+    while True:
+        row_no += 1
+        try:
+            raw = next(reader)
+        except StopIteration:
+            break
+        except (UnicodeDecodeError, csv.Error) as exc:
+            # the reader cannot go on after this; report it and close with the summary
+            errors += 1
+            complete = False
+            reason = 'not UTF-8 text' if isinstance(exc, UnicodeDecodeError) else f'malformed CSV: {exc}'
+            chunk.append(json.dumps({'row': row_no, 'error': reason}))
+            break
+        rows += 1
+        row = _canonical_row(raw)
+        try:
+            if not row.get('crop_type'):
+                raise ValueError('crop is required')
+            row['risk_level'] = _risk_level(row, memo)
+            result = eligibility_engine.evaluate_eligibility(row)
+        except (TypeError, ValueError) as exc:
+            errors += 1
+            chunk.append(json.dumps({'row': row_no, 'error': str(exc)}))
+        else:
+            level = result['input_summary']['risk_level']
+            level_counts[level] = level_counts.get(level, 0) + 1
+            codes = [item['code'] for item in result['possible_schemes']]
+            for code in codes:
+                scheme_counts[code] = scheme_counts.get(code, 0) + 1
+            chunk.append(json.dumps({
+                'row': row_no,
+                'member_id': row.get('member_id'),
+                'risk_level': level,
+                'schemes': codes,
+                'reasons': {item['code']: item['why_eligible'] for item in result['possible_schemes']},
+            }))
+
+        if len(chunk) >= CHUNK_ROWS:
+            yield '\n'.join(chunk) + '\n'
+            chunk = []
+
+    if chunk:
+        yield '\n'.join(chunk) + '\n'
+    yield json.dumps({
+        'summary': {
+            'rows': rows,
+            'errors': errors,
+            'complete': complete,
+            'risk_levels': level_counts,
+            'schemes': scheme_counts,
+        }
+    }) + '\n'
@@ -0,0 +1,390 @@
+"""Offline monthly climatology (mean temperature and humidity) on a grid over India.
+
+The data lives in a small binary file that is memory-mapped, not parsed:
+`Climatology.open()` reads a fixed header and a short JSON metadata block,
+then exposes the grid as a zero-copy `memoryview` of int16 values, so
+opening is constant time and pages are only touched when queried. A lookup
+is one index computation.
+
+File layout (little-endian):
+- header `HEADER` (magic, format version, grid origin/step/shape, scale,
+  metadata length)
+- metadata JSON (source description, India-wide monthly means)
+- padding to an 8-byte boundary
+- int16 grid `[lat][lon][month][field]`, field 0 = temperature, 1 = RH,
+  both multiplied by `scale`; `MISSING` marks cells outside the land mask
+
+The shipped `climatology.bin` is built by `python climatology.py build` from
+an approximate parametric model of Indian seasonal normals. Pass
+`--csv normals.csv` (columns lat, lon, month, temperature, humidity, e.g.
+exported from IMD or ERA5 monthly normals) to build from real data.
+
+    python climatology.py build --step 0.5
+    python climatology.py query 20.46 85.88 --month 7
+"""
+
+from __future__ import annotations
+
+import argparse
+import calendar
+import csv
+import json
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'climatology.bin')
+
+MAGIC = b'AGCL'
+FORMAT_VERSION = 1
+# magic, version, fields, lat0, lon0, step, scale, nlat, nlon, months, metadata length
+HEADER = struct.Struct('<4sHHffffHHHI')
+MISSING = -32768
+FIELDS = 2
+MONTHS = 12
+
+# Grid extent used by the builder (covers the Indian mainland and islands near it)
+LAT_RANGE = (6.0, 37.5)
+LON_RANGE = (68.0, 97.5)
+
+# Coarse outline of India, (lon, lat) clockwise from Kutch; good enough to
+# tell land cells from sea and neighbouring countries at 0.25-0.5 degrees.
+INDIA_OUTLINE = (
+    (68.4, 23.6), (70.1, 22.6), (70.0, 21.4), (70.9, 20.7), (72.6, 21.1), (72.8, 19.0),
+    (73.3, 17.0), (73.8, 15.4), (74.8, 12.9), (75.5, 11.5), (76.2, 9.9), (77.0, 8.3),
+    (77.5, 8.0), (78.2, 8.8), (79.3, 10.3), (79.9, 11.5), (80.3, 13.1), (80.1, 15.2),
+    (81.0, 15.8), (82.3, 16.6), (83.3, 17.7), (85.1, 19.3), (86.8, 20.4), (87.5, 21.6),
+    (88.9, 21.6), (89.0, 22.9), (88.7, 24.2), (88.1, 24.6), (88.4, 26.3), (89.8, 25.9),
+    (92.0, 25.1), (92.3, 24.1), (91.5, 23.0), (92.2, 22.0), (92.7, 21.9), (93.3, 23.9),
+    (94.2, 23.9), (95.2, 26.6), (97.0, 27.7), (96.1, 29.4), (94.7, 29.3), (92.0, 27.8),
+    (89.8, 26.8), (88.9, 27.3), (88.1, 27.9), (88.0, 26.6), (85.5, 26.7), (84.1, 27.5),
+    (80.9, 28.8), (80.2, 30.3), (79.0, 31.0), (78.8, 32.5), (79.5, 33.2), (79.4, 35.5),
+    (77.8, 35.5), (74.6, 35.0), (74.0, 34.0), (75.2, 32.6), (74.6, 31.1), (73.9, 30.0),
+    (72.5, 27.8), (70.6, 27.8), (69.5, 26.6), (70.3, 25.4), (71.0, 24.4), (68.8, 24.2),
+)
+
+# Seasonal shape of the temperature anomaly (-1 = coldest month, 1 = warmest):
+# hottest just before the monsoon, cooled by monsoon cloud from June
+TEMP_SHAPE = (-1.0, -0.7, -0.1, 0.55, 1.0, 0.85, 0.45, 0.35, 0.35, 0.05, -0.5, -0.9)
+# Baseline relative humidity by month for the interior plains (%)
+RH_BASE = (60.0, 52.0, 45.0, 45.0, 52.0, 70.0, 82.0, 84.0, 78.0, 68.0, 64.0, 63.0)
+
+
+# cells around a query point that may answer for it
+_NEIGHBOURS = tuple((di, dj) for di in (-1, 0, 1) for dj in (-1, 0, 1) if di or dj)
+
+
+class ClimatologyError(ValueError):
+    pass
+
+
+def in_india(lat: float, lon: float) -> bool:
+    """Ray-casting point-in-polygon test against `INDIA_OUTLINE`."""
+    inside = False
+    pts = INDIA_OUTLINE
+    j = len(pts) - 1
+    for i in range(len(pts)):
+        xi, yi = pts[i]
+        xj, yj = pts[j]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def model_normals(lat: float, lon: float) -> List[Tuple[float, float]]:
+    """Approximate monthly (temperature, RH) normals from latitude, coast and terrain."""
+    annual = 27.5 - 0.35 * max(0.0, lat - 18.0)
+    amplitude = 1.5 + 0.45 * max(0.0, lat - 10.0)
+    rh_shift = [0.0] * MONTHS
+
+    west_coast = 72.8 + (20.0 - lat) * 0.32
+    east_coast = 80.3 + (lat - 13.0) * 0.84
+    if lat < 21.0 and lon - west_coast < 1.0:
+        # Konkan/Malabar coast: damp all year, very wet monsoon
+        amplitude *= 0.5
+        rh_shift = [6.0 if m not in (5, 6, 7, 8) else 10.0 for m in range(MONTHS)]
+    elif 10.0 < lat < 21.5 and east_coast - lon < 1.0:
+        amplitude *= 0.6
+        rh_shift = [8.0] * MONTHS
+        if lat < 14.0:
+            # north-east monsoon on the Tamil Nadu coast
+            for m in (9, 10, 11):
+                rh_shift[m] += 8.0
+    if lon < 75.5 and lat > 24.0:
+        # Thar desert: dry and continental
+        amplitude += 2.0
+        rh_shift = [s - 18.0 for s in rh_shift]
+    if lon > 89.5:
+        # north-east: humid, a little cooler
+        annual -= 2.0
+        rh_shift = [s + 8.0 for s in rh_shift]
+    if (lat > 31.0 and lon < 81.0) or (lat > 27.5 and lon > 91.5):
+        # Himalayan terrain
+        annual -= 9.0
+        rh_shift = [s - 5.0 for s in rh_shift]
+
+    out = []
+    for m in range(MONTHS):
+        temp = annual + amplitude * TEMP_SHAPE[m]
+        rh = min(95.0, max(15.0, RH_BASE[m] + rh_shift[m]))
+        out.append((round(temp, 1), round(rh, 1)))
+    return out
+
+
+def read_normals_csv(path: str) -> Dict[Tuple[float, float], Dict[int, Tuple[float, float]]]:
+    """Read `lat, lon, month, temperature, humidity` rows into {(lat, lon): {month: (t, rh)}}."""
+    points: Dict[Tuple[float, float], Dict[int, Tuple[float, float]]] = {}
+    with open(path, newline='', encoding='utf-8') as fh:
+        for row in csv.DictReader(fh):
+            try:
+                key = (float(row['lat']), float(row['lon']))
+                month = int(row['month'])
+                values = (float(row['temperature']), float(row['humidity']))
+            except (KeyError, TypeError, ValueError):
+                raise ClimatologyError(f'{path}: bad row {row}')
+            if not 1 <= month <= MONTHS:
+                raise ClimatologyError(f'{path}: month {month} out of range')
+            points.setdefault(key, {})[month - 1] = values
+    return points
+
+
+def build(path: str = DEFAULT_PATH, step: float = 0.5, normals_csv: Optional[str] = None,
+          scale: float = 10.0) -> Dict:
+    """Write a climatology file; returns its metadata."""
+    lat0, lon0 = LAT_RANGE[0], LON_RANGE[0]
+    nlat = int(round((LAT_RANGE[1] - lat0) / step)) + 1
+    nlon = int(round((LON_RANGE[1] - lon0) / step)) + 1
+    observed = read_normals_csv(normals_csv) if normals_csv else None
+    if observed:
+        # snap observations to the nearest grid cell
+        snapped = {}
+        for (lat, lon), months in observed.items():
+            cell = (int(round((lat - lat0) / step)), int(round((lon - lon0) / step)))
+            snapped.setdefault(cell, {}).update(months)
+        observed = snapped
+
+    grid = array('h', [MISSING]) * (nlat * nlon * MONTHS * FIELDS)
+    sums = [[0.0, 0.0] for _ in range(MONTHS)]
+    land = 0
+    for i in range(nlat):
+        lat = lat0 + i * step
+        for j in range(nlon):
+            lon = lon0 + j * step
+            if observed is not None:
+                months = observed.get((i, j))
+                if not months or len(months) < MONTHS:
+                    continue
+                normals = [months[m] for m in range(MONTHS)]
+            else:
+                if not in_india(lat, lon):
+                    continue
+                normals = model_normals(lat, lon)
+            land += 1
+            base = (i * nlon + j) * MONTHS * FIELDS
+            for m, (temp, rh) in enumerate(normals):
+                grid[base + m * FIELDS] = int(round(temp * scale))
+                grid[base + m * FIELDS + 1] = int(round(rh * scale))
+                sums[m][0] += temp
+                sums[m][1] += rh
+    if not land:
+        raise ClimatologyError('no grid cells with data')
+
+    meta = {
+        'source': f'csv:{os.path.basename(normals_csv)}' if normals_csv else 'parametric model (approximate)',
+        'cells_with_data': land,
+        'india_monthly': [[round(t / land, 1), round(h / land, 1)] for t, h in sums],
+    }
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    if sys.byteorder != 'little':
+        grid.byteswap()
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, FIELDS, lat0, lon0, step, scale, nlat, nlon, MONTHS,
+                         len(meta_bytes))
+    padding = b'\0' * (-(HEADER.size + len(meta_bytes)) % 8)
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(header)
+        fh.write(meta_bytes)
+        fh.write(padding)
+        fh.write(grid.tobytes())
+    os.replace(tmp, path)
+    return meta
+
+
+class Climatology:
+    """Read-only view of a climatology file; safe to share between threads."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            (magic, fmt, fields, lat0, lon0, step, scale, nlat, nlon, months,
+             meta_len) = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or fmt != FORMAT_VERSION or fields != FIELDS or months != MONTHS:
+                raise ClimatologyError(f'{path}: not a climatology file (format {fmt})')
+            self.meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_len].decode('utf-8'))
+            offset = HEADER.size + meta_len
+            offset += -offset % 8
+            size = nlat * nlon * MONTHS * FIELDS * 2
+            if len(self._mm) < offset + size:
+                raise ClimatologyError(f'{path}: truncated')
+            if sys.byteorder == 'little':
+                self._grid = memoryview(self._mm)[offset:offset + size].cast('h')
+            else:
+                # big-endian hosts pay for one copy
+                values = array('h', self._mm[offset:offset + size])
+                values.byteswap()
+                self._grid = values
+        except Exception:
+            self._mm.close()
+            raise
+        self.lat0, self.lon0, self.step, self.scale = lat0, lon0, step, scale
+        self.nlat, self.nlon = nlat, nlon
+
+    @classmethod
+    def open(cls, path: str = DEFAULT_PATH) -> Optional['Climatology']:
+        """Open `path`, or return None if the file does not exist."""
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    @property
+    def modelled(self) -> bool:
+        """True unless the grid was built from measured normals (`build --csv`)."""
+        return not str(self.meta.get('source', '')).startswith('csv:')
+
+    @property
+    def label(self) -> str:
+        """How API responses name this data as a source."""
+        return 'modelled-climatology' if self.modelled else 'climatology'
+
+    def close(self) -> None:
+        if isinstance(self._grid, memoryview):
+            self._grid.release()
+        self._mm.close()
+
+    def _has_data(self, i: int, j: int) -> bool:
+        return (0 <= i < self.nlat and 0 <= j < self.nlon
+                and self._grid[(i * self.nlon + j) * MONTHS * FIELDS] != MISSING)
+
+    def _locate(self, lat: float, lon: float) -> Optional[Tuple[int, int]]:
+        if not (math.isfinite(lat) and math.isfinite(lon)):
+            return None
+        fi = (lat - self.lat0) / self.step
+        fj = (lon - self.lon0) / self.step
+        i, j = int(round(fi)), int(round(fj))
+        if self._has_data(i, j):
+            return i, j
+        # coastal points often round into a sea cell; use the nearest land cell around it
+        for di, dj in sorted(_NEIGHBOURS, key=lambda d: (i + d[0] - fi) ** 2 + (j + d[1] - fj) ** 2):
+            if self._has_data(i + di, j + dj):
+                return i + di, j + dj
+        return None
+
+    def _base(self, lat: float, lon: float) -> Optional[int]:
+        found = self._locate(lat, lon)
+        if found is None:
+            return None
+        return (found[0] * self.nlon + found[1]) * MONTHS * FIELDS
+
+    def cell(self, lat: float, lon: float) -> Optional[Tuple[float, float]]:
+        """Centre of the grid cell that answers for (lat, lon), or None outside coverage."""
+        found = self._locate(lat, lon)
+        if found is None:
+            return None
+        return round(self.lat0 + found[0] * self.step, 4), round(self.lon0 + found[1] * self.step, 4)
+
+    def at(self, lat: float, lon: float, month: int) -> Optional[Tuple[float, float]]:
+        """Mean (temperature, RH) for calendar `month` (1-12), or None outside coverage."""
+        base = self._base(lat, lon)
+        if base is None:
+            return None
+        k = base + (month - 1) * FIELDS
+        return self._grid[k] / self.scale, self._grid[k + 1] / self.scale
+
+    def normals(self, lat: float, lon: float) -> Optional[List[Tuple[float, float]]]:
+        base = self._base(lat, lon)
+        if base is None:
+            return None
+        g, s = self._grid, self.scale
+        return [(g[base + m * FIELDS] / s, g[base + m * FIELDS + 1] / s) for m in range(MONTHS)]
+
+    def national(self, month: int) -> Tuple[float, float]:
+        temp, rh = self.meta['india_monthly'][month - 1]
+        return temp, rh
+
+    def period_mean(self, lat: float, lon: float, start: date, days: int) -> Optional[Dict]:
+        """Day-weighted mean conditions over `days` days from `start`, with a per-month breakdown."""
+        normals = self.normals(lat, lon)
+        if normals is None:
+            return None
+        days = max(1, int(days))
+        end = start + timedelta(days=days)
+        months: List[Dict] = []
+        cursor = start
+        t_sum = h_sum = 0.0
+        while cursor < end:
+            last = calendar.monthrange(cursor.year, cursor.month)[1]
+            month_end = min(end, date(cursor.year, cursor.month, last) + timedelta(days=1))
+            span = (month_end - cursor).days
+            temp, rh = normals[cursor.month - 1]
+            t_sum += temp * span
+            h_sum += rh * span
+            months.append({'month': cursor.strftime('%Y-%m'), 'days': span, 'temperature': temp, 'humidity': rh})
+            cursor = month_end
+        return {
+            'avg_temperature': round(t_sum / days, 1),
+            'avg_humidity': round(h_sum / days, 1),
+            'days': days,
+            'months': months,
+        }
+
+    def stats(self) -> Dict:
+        return {
+            'path': self.path,
+            'source': self.meta.get('source'),
+            'modelled': self.modelled,
+            'grid_step': self.step,
+            'shape': [self.nlat, self.nlon],
+            'cells_with_data': self.meta.get('cells_with_data'),
+            'bytes_mapped': len(self._mm),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or query the offline climatology grid.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    b = sub.add_parser('build', help='write a climatology file')
+    b.add_argument('--out', default=DEFAULT_PATH)
+    b.add_argument('--step', type=float, default=0.5, help='grid spacing in degrees')
+    b.add_argument('--csv', help='monthly normals (lat, lon, month, temperature, humidity) instead of the model')
+    q = sub.add_parser('query', help='look up one location')
+    q.add_argument('lat', type=float)
+    q.add_argument('lon', type=float)
+    q.add_argument('--month', type=int, help='1-12 (default: all months)')
+    q.add_argument('--path', default=DEFAULT_PATH)
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        meta = build(args.out, args.step, args.csv)
+        print(f'wrote {args.out}: {meta["cells_with_data"]} cells, source {meta["source"]}')
+        return
+    clim = Climatology.open(args.path)
+    if clim is None:
+        raise SystemExit(f'{args.path} not found; run `python climatology.py build` first')
+    if args.month:
+        value = clim.at(args.lat, args.lon, args.month)
+        print(json.dumps(None if value is None else {'temperature': value[0], 'humidity': value[1]}))
+    else:
+        print(json.dumps(clim.normals(args.lat, args.lon)))
+
+
+if __name__ == '__main__':
+    main()
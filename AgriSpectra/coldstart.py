@@ -0,0 +1,203 @@
+"""Cold-start support: startup report, deferred imports and a prebuilt snapshot.
+
+`app.py` wraps its import groups and start-up steps in `phase()` so the
+time from this module's import to the first response is broken down in
+`report()` (also under `startup` in `/api/metrics`). Modules only needed
+by later requests (the hazard, bulk upload, portfolio, climatology,
+history, alerts and profiler modules) are imported with `lazy_import()`
+and load on first use; the first use is serialised, so concurrent requests
+never see a half-executed module.
+
+The snapshot is a directory of compiled Jinja templates. With it, the
+first request loads bytecode instead of parsing and compiling templates.
+Entries are checked against the template source, so a stale snapshot
+costs a recompile, never a wrong page.
+
+    python coldstart.py build [--path snapshot]   # compile every template into the snapshot
+    python coldstart.py report                    # start the app, serve one page, print the report
+"""
+
+from __future__ import annotations
+
+import argparse
+import importlib.util
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'snapshot')
+
+_started = time.perf_counter()
+_phases: List[Tuple[str, float, float]] = []
+_deferred: List[str] = []
+_snapshot: Dict = {'path': None, 'loaded': False}
+_first_response: Optional[Tuple[str, float, float]] = None
+
+
+@contextmanager
+def phase(name: str):
+    """Time a start-up step; names are `import:...` or `init:...`."""
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        _phases.append((name, begin - _started, time.perf_counter() - begin))
+
+
+class _DeferredModule:
+    """Stands in for a module until its first attribute access imports it.
+
+    importlib's LazyLoader is not thread-safe before Python 3.12: a second
+    thread can read the module while the first is still executing it and get
+    an AttributeError. Here the import runs once, under a lock, and every
+    thread waits for it.
+    """
+
+    def __init__(self, name: str):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        with self._lock:
+            if self._module is None:
+                self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        return getattr(self._module or self._load(), attr)
+
+    def __repr__(self):
+        return f'<deferred module {self._name!r}>'
+
+
+def lazy_import(name: str):
+    """Check `name` can be imported now; import it on first attribute access."""
+    if name in sys.modules:
+        return sys.modules[name]
+    if importlib.util.find_spec(name) is None:
+        raise ImportError(f'No module named {name!r}')
+    _deferred.append(name)
+    return _DeferredModule(name)
+
+
+def loaded(module) -> bool:
+    """Whether `module` (as returned by `lazy_import`) has been imported yet."""
+    return not isinstance(module, _DeferredModule) or module._module is not None
+
+
+def track_first_response(app) -> None:
+    """Record when `app` finishes its first response and how long that request took."""
+    pending = {}
+
+    @app.before_request
+    def _first_request_started():
+        if _first_response is None and not pending:
+            pending['at'] = time.perf_counter()
+
+    @app.after_request
+    def _first_request_finished(response):
+        global _first_response
+        if _first_response is None and pending:
+            now = time.perf_counter()
+            from flask import request
+
+            _first_response = (request.path, now - _started, now - pending['at'])
+        return response
+
+
+def _bytecode_cache(path: str):
+    # jinja2 comes in with flask; importing it here keeps it out of this module's import
+    from jinja2 import FileSystemBytecodeCache
+
+    class SnapshotCache(FileSystemBytecodeCache):
+        def get_cache_key(self, name, filename=None):
+            # key by template name only, so a snapshot survives moving the app
+            return super().get_cache_key(name)
+
+        def dump_bytecode(self, bucket):
+            try:
+                super().dump_bytecode(bucket)
+            except OSError:
+                # a read-only snapshot still serves the entries it has
+                pass
+
+    return SnapshotCache(path, '%s.jinja')
+
+
+def use_snapshot(app, path: Optional[str] = None) -> bool:
+    """Serve `app`'s templates from the snapshot at `path` when it exists.
+
+    Must run before the app's Jinja environment is first used.
+    """
+    path = path or DEFAULT_SNAPSHOT_PATH
+    _snapshot['path'] = path
+    if not os.path.isdir(path):
+        return False
+    app.jinja_options = {**app.jinja_options, 'bytecode_cache': _bytecode_cache(path)}
+    _snapshot['loaded'] = True
+    _snapshot['entries'] = sum(1 for name in os.listdir(path) if name.endswith('.jinja'))
+    return True
+
+
+def build_snapshot(app, path: Optional[str] = None) -> List[str]:
+    """Compile every template of `app` into the snapshot at `path`."""
+    path = path or DEFAULT_SNAPSHOT_PATH
+    os.makedirs(path, exist_ok=True)
+    cache = _bytecode_cache(path)
+    cache.clear()
+    env = app.jinja_env.overlay(bytecode_cache=cache, cache_size=0)
+    names = env.list_templates(extensions=['html'])
+    for name in names:
+        env.get_template(name)
+    return names
+
+
+def report() -> Dict:
+    imports = [(n, at, d) for n, at, d in _phases if n.startswith('import:')]
+    inits = [(n, at, d) for n, at, d in _phases if not n.startswith('import:')]
+    ready = max((at + d for _, at, d in _phases), default=0.0)
+    out = {
+        'phases': [{'name': n, 'at_ms': round(at * 1000, 1), 'ms': round(d * 1000, 1)} for n, at, d in _phases],
+        'import_ms': round(sum(d for _, _, d in imports) * 1000, 1),
+        'init_ms': round(sum(d for _, _, d in inits) * 1000, 1),
+        'ready_ms': round(ready * 1000, 1),
+        'deferred_imports': {name: 'loaded' if name in sys.modules else 'deferred' for name in _deferred},
+        'snapshot': dict(_snapshot),
+        'first_response': None,
+    }
+    if _first_response is not None:
+        path, at, took = _first_response
+        out['first_response'] = {'path': path, 'at_ms': round(at * 1000, 1), 'request_ms': round(took * 1000, 1)}
+    return out
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the start-up snapshot or print a start-up report.')
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('build', help='compile every template into the snapshot')
+    build.add_argument('--path', default=DEFAULT_SNAPSHOT_PATH)
+    show = sub.add_parser('report', help='start the app, serve one page and print the start-up report')
+    show.add_argument('--url', default='/calculator', help='page to request first')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        os.environ['AGRISPECTRA_SNAPSHOT'] = '0'
+        import app
+
+        names = build_snapshot(app.app, args.path)
+        print(f'compiled {len(names)} templates into {args.path}')
+        return
+    import app
+
+    app.app.test_client().get(args.url)
+    print(json.dumps(app.coldstart.report(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
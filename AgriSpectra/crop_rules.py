@@ -0,0 +1,504 @@
+"""Crop risk rules as data, compiled into per-crop evaluators.
+
+The scoring rules used by `risk_engine.compute_risk` are described here as
+plain data: bands, weights and multipliers for the rice/paddy rules, and
+penalty slopes, season effects, escalations and level cut-offs for the
+general rules. `compile_rules()` turns them, together with the crop
+threshold tables, into one closure per crop with everything that does not
+depend on the measured conditions (region-adjusted ranges, explanation
+fragments, respiration factor, escalations) resolved up front.
+
+Evaluating a crop is then a dict lookup plus a handful of comparisons, and
+adding crops or rules does not slow down evaluation of the others.
+"""
+
+from __future__ import annotations
+
+from bisect import bisect_left
+from functools import partial
+from typing import Callable, Dict, List, Sequence, Tuple
+
+
+# -------------------------------
+# Rice / paddy rules (step bands)
+# -------------------------------
+# Bands are (low, high, score, label), both ends inclusive, tried in order;
+# a value that falls in no band (including gaps between bands) gets `default`.
+RICE_RULES = {
+    'crops': ('rice', 'paddy'),
+    'humidity': {
+        'bands': (
+            (None, 65, 0.0, 'Safe humidity (≤65%)'),
+            (66, 75, 50.0, 'Moderate humidity (66–75%)'),
+        ),
+        'default': (100.0, 'High humidity (>75%) — fungal/mold risk'),
+    },
+    'temperature': {
+        'bands': (
+            (None, 25, 0.0, 'Safe temperature (≤25°C)'),
+            (26, 32, 40.0, 'Moderate temperature (26–32°C)'),
+        ),
+        'default': (80.0, 'High temperature (>32°C) — spoilage/insects'),
+    },
+    'duration': {
+        'bands': (
+            (None, 30, 0.0, 'Short storage (≤30 days)'),
+            (31, 90, 40.0, 'Medium storage (31–90 days)'),
+        ),
+        'default': (80.0, 'Long storage (>90 days) — quality loss'),
+    },
+    # humidity highest, then temperature, then duration
+    'weights': {'humidity': 0.5, 'temperature': 0.3, 'duration': 0.2},
+    # first entry whose keywords appear in the season wins
+    'season': (
+        (('monsoon', 'heavy'), 1.15, 'Monsoon/Heavy rainfall — high impact'),
+        (('moderate', 'rain'), 1.05, 'Moderate rainfall — medium impact'),
+    ),
+    'season_default': (0.95, 'Dry/Winter — low impact'),
+    # (highest score for the level, level, recommendation); None = no upper bound
+    'levels': (
+        (30, 'Low', 'Store as usual; monitor regularly.'),
+        (60, 'Medium', 'Monitor closely; consider selling part or improve storage.'),
+        (None, 'High', 'Sell now or move to controlled storage immediately.'),
+    ),
+}
+
+
+# -------------------------------
+# General rules (piecewise linear)
+# -------------------------------
+GENERAL_RULES = {
+    'temperature': {'below_slope': 1.5, 'above_slope': 2.0},
+    'humidity': {'below_slope': 1.2, 'above_slope': 2.5},
+    'duration': {'slope': 0.5, 'cap': 30.0},
+    # (keyword, humidity above which the entry applies or None, penalty, text)
+    'season': (
+        ('monsoon', None, 12.0, 'Season = Monsoon; raises risk due to high ambient moisture.'),
+        ('summer', 65, 10.0, 'Humid summer conditions increase fungal/spoilage risk.'),
+        ('summer', None, 2.0, 'Summer season with moderate humidity.'),
+        ('post-harvest', None, 3.0, 'Post-harvest handling affects risk depending on storage readiness.'),
+    ),
+    'season_default': (0.0, 'Seasonal effect minimal.'),
+    'escalations': (
+        {
+            'crops': ('sugarcane', 'banana'),
+            'beyond_safe_days': True,
+            'add': 20.0,
+            'text': 'Highly perishable crop: rapid risk escalation when stored beyond safe duration.',
+        },
+    ),
+    'levels': ((20, 'SAFE'), (50, 'MODERATE'), (80, 'HIGH'), (None, 'CRITICAL')),
+    'recommendations': {
+        'SAFE': ('Maintain current storage conditions; monitor weekly.',),
+        'MODERATE': (
+            'Consider ventilation and reduce humidity (use desiccants or drying).',
+            'Check storage for early signs of mold or pests.',
+        ),
+        'HIGH': (
+            'Reduce storage temperature if possible; increase ventilation.',
+            'Move to dryer storage or use moisture control measures.',
+        ),
+        'CRITICAL': (
+            'Immediate action: move produce to cold storage or sell/consume promptly.',
+            'Use aeration, drying, or short-term processing to avoid loss.',
+        ),
+    },
+    'tailored': (
+        {
+            'crops': ('paddy', 'groundnut'),
+            'humidity_above': 70,
+            'text': 'Dry grains to safe moisture content and avoid long storage during humid season.',
+        },
+    ),
+    'unknown_crop': {
+        'ideal_temp': (15, 30),
+        'ideal_humidity': (30, 70),
+        'storage_days_safe': 90,
+        'respiration': 'medium',
+        'notes': 'Unknown crop — using conservative defaults.',
+    },
+}
+
+
+Evaluator = Callable[[str, str, float, float, str, int], Dict]
+# (region, season, days, temperatures, humidities) -> ScoreBatch
+BatchScorer = Callable[[str, str, int, Sequence[float], Sequence[float]], 'ScoreBatch']
+
+
+def _clamp(v, a, b):
+    return max(a, min(b, v))
+
+
+def _finalize(score: float) -> float:
+    return round(_clamp(score, 0.0, 100.0), 1)
+
+
+class ScoreBatch:
+    """Scores for many (temperature, RH) samples under the same crop and conditions.
+
+    `raw` holds unrounded scores and the reported score is `finalize(raw)`.
+    finalize (clamp to 0-100, round to 0.1) never decreases as raw grows, so
+    percentiles and level counts are read off the sorted raw values with a
+    handful of finalize() calls instead of one per sample.
+    """
+
+    def __init__(self, raw: List[float], finalize: Callable[[float], float], level_rows: Sequence):
+        self.raw = raw
+        self.finalize = finalize
+        self.level_names = tuple(row[1] for row in level_rows)
+        self._tops = tuple(row[0] for row in level_rows if row[0] is not None)
+
+    def scores(self) -> List[float]:
+        return [self.finalize(x) for x in self.raw]
+
+    def levels(self) -> List[int]:
+        return [bisect_left(self._tops, score) for score in self.scores()]
+
+    def summary(self, percentiles: Sequence[float] = (5, 50, 95)) -> Dict:
+        ordered = sorted(self.raw)
+        n = len(ordered)
+        finalize = self.finalize
+        counts = []
+        start = 0
+        for top in self._tops:
+            # first sample whose final score is above this level's ceiling
+            lo, hi = start, n
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if finalize(ordered[mid]) <= top:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            counts.append(lo - start)
+            start = lo
+        counts.append(n - start)
+        picks = {}
+        for pct in percentiles:
+            # nearest-rank
+            rank = max(0, min(n - 1, -(-pct * n // 100) - 1))
+            picks[pct] = finalize(ordered[int(rank)])
+        clamped = sum(100.0 if x > 100.0 else (0.0 if x < 0.0 else x) for x in ordered)
+        return {
+            'counts': dict(zip(self.level_names, counts)),
+            'percentiles': picks,
+            'mean': round(clamped / n, 1) if n else None,
+        }
+
+
+def _compile_band_index(bands: Sequence) -> Callable[[float], int]:
+    """Index of the first band containing x, or len(bands) for the default."""
+    bounds = tuple(
+        (float('-inf') if band[0] is None else band[0], float('inf') if band[1] is None else band[1])
+        for band in bands
+    )
+    if len(bounds) == 2:
+        (lo0, hi0), (lo1, hi1) = bounds
+
+        def index(x):
+            if lo0 <= x <= hi0:
+                return 0
+            if lo1 <= x <= hi1:
+                return 1
+            return 2
+        return index
+
+    miss = len(bounds)
+
+    def index(x):
+        for i, (lo, hi) in enumerate(bounds):
+            if lo <= x <= hi:
+                return i
+        return miss
+    return index
+
+
+def _compile_keyword_table(entries: Sequence[Tuple], default, limit: int = 256) -> Callable[[str], object]:
+    """Map a season string to the payload of its first matching entry, memoised per string."""
+    memo: Dict[str, object] = {}
+    missing = object()
+
+    def lookup(season_lower: str):
+        hit = memo.get(season_lower, missing)
+        if hit is missing:
+            hit = default
+            for keywords, payload in entries:
+                if any(k in season_lower for k in keywords):
+                    hit = payload
+                    break
+            if len(memo) < limit:
+                memo[season_lower] = hit
+        return hit
+    return lookup
+
+
+def _level_index(levels: Sequence) -> Tuple[Tuple, Callable[[float], int]]:
+    """Split level rows into (rows, score -> row index); a score belongs to the first row it does not exceed."""
+    tops = tuple(row[0] for row in levels if row[0] is not None)
+    return tuple(levels), partial(bisect_left, tops)
+
+
+def compile_rice(rules: Dict = RICE_RULES) -> Tuple[Evaluator, BatchScorer]:
+    """Every rice outcome is a combination of bands, so precompute them all.
+
+    Scoring, level, recommendation and explanation are looked up from a
+    table indexed by (humidity band, temperature band, duration band,
+    season entry); only the band tests run per call.
+    """
+    factors = ('humidity', 'temperature', 'duration')
+    choices = []
+    for name in factors:
+        spec = rules[name]
+        options = [(score, label) for _lo, _hi, score, label in spec['bands']] + [spec['default']]
+        choices.append([(score * rules['weights'][name], label) for score, label in options])
+    seasons = [(mul, label) for _keywords, mul, label in rules['season']] + [rules['season_default']]
+    level_rows, level_of = _level_index(rules['levels'])
+
+    def outcome(hum, temp, days, season):
+        # same operation order as the hand-written rule so scores match to the last bit
+        combined = (hum[0] + temp[0] + days[0]) * season[0]
+        risk_pct = _clamp(round(combined, 1), 0.0, 100.0)
+        _top, level, recommendation = level_rows[level_of(risk_pct)]
+        return risk_pct, level, recommendation, f"{hum[1]}. {temp[1]}. {days[1]}. {season[1]}."
+
+    hum_choices, temp_choices, days_choices = choices
+    table = tuple(
+        tuple(
+            tuple(
+                tuple(outcome(h, t, d, s) for s in seasons)
+                for d in days_choices
+            )
+            for t in temp_choices
+        )
+        for h in hum_choices
+    )
+    humidity_band = _compile_band_index(rules['humidity']['bands'])
+    temperature_band = _compile_band_index(rules['temperature']['bands'])
+    duration_band = _compile_band_index(rules['duration']['bands'])
+    season_of = _compile_keyword_table(
+        [(keywords, i) for i, (keywords, _mul, _label) in enumerate(rules['season'])],
+        len(rules['season']),
+    )
+
+    def evaluate(crop, region, temp, rh, season, days):
+        risk_pct, level, recommendation, explanation = table[humidity_band(rh)][temperature_band(temp)][
+            duration_band(days)][season_of((season or '').lower())]
+        return {
+            'risk_percentage': risk_pct,
+            'risk_level': level,
+            'explanation': explanation,
+            'recommendation': recommendation,
+            'details': {
+                'humidity': rh,
+                'temperature': temp,
+                'storage_days': days,
+                'season': season
+            }
+        }
+
+    def batch(region, season, days, temps, rhs):
+        d, s = duration_band(days), season_of((season or '').lower())
+        # score per (humidity band, temperature band) for these conditions
+        cells = [[by_temp[d][s][0] for by_temp in by_hum] for by_hum in table]
+        scores = [cells[h][t] for h, t in zip(map(humidity_band, rhs), map(temperature_band, temps))]
+        # table scores are already clamped and rounded
+        return ScoreBatch(scores, float, rules['levels'])
+    return evaluate, batch
+
+
+def _compile_general_crop(crop: str, info: Dict, region_adjustments: Dict, respiration_factor: Dict,
+                          rules: Dict) -> Tuple[Evaluator, BatchScorer]:
+    t_below = rules['temperature']['below_slope']
+    t_above = rules['temperature']['above_slope']
+    h_below = rules['humidity']['below_slope']
+    h_above = rules['humidity']['above_slope']
+    d_slope = rules['duration']['slope']
+    d_cap = rules['duration']['cap']
+
+    safe_days = info['storage_days_safe']
+    respiration = info['respiration']
+    notes = info.get('notes', '')
+    resp_factor = respiration_factor.get(respiration, 1.0)
+    resp_text = f' Crop respiration rate {respiration} increases spoilage risk.' if resp_factor > 1.0 else ''
+    # escalations that apply whatever the duration are folded into constants
+    always = [e for e in rules['escalations'] if crop in e['crops'] and not e['beyond_safe_days']]
+    beyond = [e for e in rules['escalations'] if crop in e['crops'] and e['beyond_safe_days']]
+    always_add = sum(e['add'] for e in always)
+    always_text = ''.join(' ' + e['text'] for e in always)
+    beyond_add = tuple(e['add'] for e in beyond)
+    beyond_text = ''.join(' ' + e['text'] for e in beyond)
+    tailored = tuple((t['humidity_above'], t['text']) for t in rules['tailored'] if crop in t['crops'])
+    level_rows, level_of = _level_index(rules['levels'])
+    level_recs = tuple((row[1], rules['recommendations'][row[1]]) for row in level_rows)
+    prefix = notes + ' '
+    days_within = f' days within safe limit ({safe_days} days).'
+    days_beyond = f' days exceeds safe limit ({safe_days} days) by '
+
+    season_entries: Dict[str, List] = {}
+    for keyword, rh_above, penalty, text in rules['season']:
+        season_entries.setdefault(keyword, []).append((rh_above, penalty, text))
+    season_of = _compile_keyword_table(
+        [((keyword,), tuple(entries)) for keyword, entries in season_entries.items()],
+        (),
+    )
+    season_default = rules['season_default']
+
+    # region -> (ideal_temp, ideal_rh, explanation suffixes), resolved once
+    def profile(adj):
+        base_t = info['ideal_temp']
+        base_h = info['ideal_humidity']
+        ideal_temp = (base_t[0] + adj['temp_bias'], base_t[1] + adj['temp_bias'])
+        ideal_rh = (base_h[0] + adj['humidity_bias'], base_h[1] + adj['humidity_bias'])
+        return (
+            ideal_temp,
+            ideal_rh,
+            f'°C below ideal range {ideal_temp[0]}–{ideal_temp[1]}°C.',
+            f'°C above ideal range {ideal_temp[0]}–{ideal_temp[1]}°C.',
+            f'% below ideal range {ideal_rh[0]}–{ideal_rh[1]}% (dry).',
+            f'% above ideal range {ideal_rh[0]}–{ideal_rh[1]}% (wet).',
+        )
+
+    profiles = {region: profile(adj) for region, adj in region_adjustments.items()}
+    fallback = profile({'humidity_bias': 0, 'temp_bias': 0})
+
+    def evaluate(crop_name, region, temp, rh, season, days):
+        ideal_temp, ideal_rh, t_lo_text, t_hi_text, h_lo_text, h_hi_text = profiles.get(region) or fallback
+
+        if temp < ideal_temp[0]:
+            score = (ideal_temp[0] - temp) * t_below
+            temp_text = f'Temperature {temp}{t_lo_text}'
+        elif temp > ideal_temp[1]:
+            score = (temp - ideal_temp[1]) * t_above
+            temp_text = f'Temperature {temp}{t_hi_text}'
+        else:
+            score = 0.0
+            temp_text = f'Temperature {temp}°C within ideal range.'
+
+        if rh < ideal_rh[0]:
+            score += (ideal_rh[0] - rh) * h_below
+            rh_text = f'Humidity {rh}{h_lo_text}'
+        elif rh > ideal_rh[1]:
+            score += (rh - ideal_rh[1]) * h_above
+            rh_text = f'Humidity {rh}{h_hi_text}'
+        else:
+            rh_text = f'Humidity {rh}% within ideal range.'
+
+        if days <= safe_days:
+            days_text = f'Storage duration {days}{days_within}'
+        else:
+            over = days - safe_days
+            score += min(d_cap, over * d_slope)
+            days_text = f'Storage duration {days}{days_beyond}{over} days.'
+
+        season_penalty, season_text = season_default
+        for rh_above, penalty, text in season_of(season.lower()):
+            if rh_above is None or rh > rh_above:
+                season_penalty, season_text = penalty, text
+                break
+        score = (score + season_penalty) * resp_factor + always_add
+
+        escalation_text = always_text
+        if beyond_add and days > safe_days:
+            for add in beyond_add:
+                score += add
+            escalation_text += beyond_text
+
+        risk_score = round(_clamp(score, 0.0, 100.0), 1)
+        level, recs = level_recs[level_of(risk_score)]
+        recs = list(recs)
+        for humidity_above, text in tailored:
+            if rh > humidity_above:
+                recs.append(text)
+
+        return {
+            'risk_score': risk_score,
+            'risk_level': level,
+            'explanation': (f'{prefix}{temp_text} {rh_text} {days_text} {season_text}'
+                            f'{resp_text}{escalation_text}').strip(),
+            'recommendations': recs,
+            'details': {
+                'ideal_temp': ideal_temp,
+                'ideal_humidity': ideal_rh,
+                'safe_days': safe_days,
+                'respiration': respiration
+            }
+        }
+
+    default_penalty = season_default[0]
+
+    def batch(region, season, days, temps, rhs):
+        # score only, one column at a time: the same arithmetic as evaluate()
+        # (in the same order, so results match exactly) with everything that
+        # does not depend on temperature/RH hoisted out
+        (t_lo, t_hi), (h_lo, h_hi) = (profiles.get(region) or fallback)[:2]
+        days_penalty = min(d_cap, (days - safe_days) * d_slope) if days > safe_days else 0.0
+        entries = season_of(season.lower())
+
+        def season_penalty(rh):
+            for rh_above, penalty, _text in entries:
+                if rh_above is None or rh > rh_above:
+                    return penalty
+            return default_penalty
+
+        temp_part = [
+            (t_lo - t) * t_below if t < t_lo else ((t - t_hi) * t_above if t > t_hi else 0.0)
+            for t in temps
+        ]
+        rh_part = [
+            (h_lo - h) * h_below if h < h_lo else ((h - h_hi) * h_above if h > h_hi else 0.0)
+            for h in rhs
+        ]
+        season_part = list(map(season_penalty, rhs)) if entries else [default_penalty] * len(rhs)
+        raw = [
+            (t + h + days_penalty + sp) * resp_factor + always_add
+            for t, h, sp in zip(temp_part, rh_part, season_part)
+        ]
+        if days > safe_days:
+            for add in beyond_add:
+                raw = [x + add for x in raw]
+        return ScoreBatch(raw, _finalize, level_rows)
+    return evaluate, batch
+
+
+class CompiledRules:
+    """Evaluator table for one version of the crop data.
+
+    Also keeps the source tables it was compiled from, so code that needs
+    the raw thresholds reads them from the same version as the evaluators.
+    """
+
+    def __init__(self, evaluators: Dict[str, Evaluator], unknown: Evaluator, version: str = 'builtin',
+                 crops: Dict = None, region_adjustments: Dict = None, respiration_factor: Dict = None,
+                 batch_scorers: Dict[str, BatchScorer] = None, unknown_batch: BatchScorer = None):
+        self.evaluators = evaluators
+        self.unknown = unknown
+        self.batch_scorers = batch_scorers or {}
+        self.unknown_batch = unknown_batch
+        self.version = version
+        self.crops = crops or {}
+        self.region_adjustments = region_adjustments or {}
+        self.respiration_factor = respiration_factor or {}
+
+    def evaluator_for(self, crop: str) -> Evaluator:
+        return self.evaluators.get(crop) or self.unknown
+
+    def batch_scorer_for(self, crop: str) -> BatchScorer:
+        return self.batch_scorers.get(crop) or self.unknown_batch
+
+
+def compile_rules(crops: Dict, region_adjustments: Dict, respiration_factor: Dict,
+                  general_rules: Dict = GENERAL_RULES, rice_rules: Dict = RICE_RULES,
+                  version: str = 'builtin') -> CompiledRules:
+    """Build the per-crop evaluator table from crop thresholds and rule data."""
+    rice, rice_batch = compile_rice(rice_rules)
+    evaluators: Dict[str, Evaluator] = {}
+    batch_scorers: Dict[str, BatchScorer] = {}
+    for crop, info in crops.items():
+        evaluators[crop], batch_scorers[crop] = _compile_general_crop(
+            crop, info, region_adjustments, respiration_factor, general_rules)
+    # rule-specific crops take precedence over the threshold table
+    for crop in rice_rules['crops']:
+        evaluators[crop], batch_scorers[crop] = rice, rice_batch
+    unknown, unknown_batch = _compile_general_crop('', general_rules['unknown_crop'], region_adjustments,
+                                                   respiration_factor, general_rules)
+    return CompiledRules(evaluators, unknown, version, crops, region_adjustments, respiration_factor,
+                         batch_scorers, unknown_batch)
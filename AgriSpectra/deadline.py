@@ -0,0 +1,74 @@
+"""Per-request time budget shared by every upstream call a request makes.
+
+A `Deadline` is created once per request and passed down to each hop.
+Each hop asks for `deadline.timeout(cap)` and gets the smaller of its own
+cap and whatever budget is left, so a geocode plus forecast chain can never
+run longer than the request budget.
+"""
+
+from __future__ import annotations
+
+import time
+from typing import Optional
+
+
+# Below this there is no point opening a socket
+MIN_USEFUL_SECONDS = 0.05
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a hop is started with no useful budget left."""
+
+
+class Deadline:
+    def __init__(self, budget_seconds: float):
+        self.budget_seconds = budget_seconds
+        self.expires_at = time.monotonic() + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() < MIN_USEFUL_SECONDS
+
+    def timeout(self, cap: float) -> float:
+        """Timeout for the next hop: at most `cap`, never more than what is left."""
+        remaining = self.remaining()
+        if remaining < MIN_USEFUL_SECONDS:
+            raise DeadlineExceeded(f'request budget of {self.budget_seconds}s exhausted')
+        return min(cap, remaining)
+
+
+def hop_timeout(deadline: Optional[Deadline], cap: float) -> float:
+    """Timeout helper for call sites where the deadline is optional."""
+    if deadline is None:
+        return cap
+    return deadline.timeout(cap)
+
+
+def _socket_of(response):
+    # http.client response -> buffered reader -> SocketIO -> socket
+    return getattr(getattr(getattr(response, 'fp', None), 'raw', None), '_sock', None)
+
+
+def read_body(response, deadline: Optional[Deadline], chunk_size: int = 65536) -> bytes:
+    """Read an HTTP response body without running past `deadline`.
+
+    The urlopen timeout bounds each socket operation, not the whole body, so
+    an upstream that drips bytes could otherwise keep a hop going long after
+    the budget. The body is read in chunks and the remaining budget is
+    checked (and applied to the socket) before every read.
+    """
+    if deadline is None:
+        return response.read()
+    sock = _socket_of(response)
+    chunks = []
+    while True:
+        remaining = deadline.timeout(float('inf'))
+        if sock is not None:
+            sock.settimeout(remaining)
+        chunk = response.read1(chunk_size)
+        if not chunk:
+            return b''.join(chunks)
+        chunks.append(chunk)
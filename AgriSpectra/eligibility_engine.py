@@ -9,6 +9,8 @@ from __future__ import annotations
 
 from typing import Dict, List, Tuple
 
+import schema
+
 
 SCHEMES = {
     "PMFBY": {
@@ -81,9 +83,46 @@ HEAT_PRONE_STATES = {
     "andhra pradesh",
 }
 
+# Broad region for rows that carry a state but no coordinates
+STATE_REGIONS = {
+    "punjab": "North",
+    "haryana": "North",
+    "delhi": "North",
+    "uttar pradesh": "North",
+    "uttarakhand": "North",
+    "himachal pradesh": "North",
+    "jammu and kashmir": "North",
+    "ladakh": "North",
+    "chandigarh": "North",
+    "bihar": "East",
+    "jharkhand": "East",
+    "odisha": "East",
+    "west bengal": "East",
+    "assam": "East",
+    "arunachal pradesh": "East",
+    "manipur": "East",
+    "meghalaya": "East",
+    "mizoram": "East",
+    "nagaland": "East",
+    "sikkim": "East",
+    "tripura": "East",
+    "chhattisgarh": "East",
+    "kerala": "South",
+    "tamil nadu": "South",
+    "karnataka": "South",
+    "andhra pradesh": "South",
+    "telangana": "South",
+    "puducherry": "South",
+    "rajasthan": "West",
+    "gujarat": "West",
+    "maharashtra": "West",
+    "goa": "West",
+    "madhya pradesh": "West",
+}
+
 
-def _normalize_risk_level(level: str) -> str:
-    value = (level or "").strip().lower()
+def normalize_risk_level(level: str) -> str:
+    value = str(level or "").strip().lower()
     if value in {"critical", "very high"}:
         return "CRITICAL"
     if value in {"high"}:
@@ -104,23 +143,32 @@ def _is_small_or_marginal(category: str, land_size: float | None) -> bool:
     return False
 
 
-def _safe_float(value) -> float | None:
-    try:
-        if value is None or str(value).strip() == "":
-            return None
-        return float(value)
-    except Exception:
-        return None
+def region_for_state(state: str | None, default: str = "North") -> str:
+    return STATE_REGIONS.get((state or "").strip().lower(), default)
+
+
+# how evaluate_eligibility reads its inputs; missing or unreadable values take the default
+ELIGIBILITY_INPUTS = schema.Schema("EligibilityInputs", (
+    schema.Field("crop_type", "key", ""),
+    schema.Field("region", "title", "North"),
+    schema.Field("state", "key", ""),
+    schema.Field("risk_level", normalize_risk_level, normalize_risk_level("")),
+    schema.Field("storage_days", "days", 0),
+    schema.Field("farmer_category", "trimmed", ""),
+    schema.Field("landholding_size", "number", None),
+))
+
+
+def normalize_inputs(payload: Dict) -> Tuple:
+    """The fields the eligibility rules read, as an EligibilityInputs record."""
+    return ELIGIBILITY_INPUTS(payload)
 
 
-def evaluate_eligibility(payload: Dict) -> Dict:
-    crop = (payload.get("crop_type") or "").strip().lower()
-    region = (payload.get("region") or "").strip().title() or "North"
-    state = (payload.get("state") or "").strip().lower()
-    risk_level = _normalize_risk_level(payload.get("risk_level") or "")
-    storage_days = int(payload.get("storage_days") or 0)
-    farmer_category = (payload.get("farmer_category") or "").strip()
-    land_size = _safe_float(payload.get("landholding_size"))
+def evaluate_eligibility(payload: Dict, inputs: Tuple = None) -> Dict:
+    """Eligibility for `payload`; pass `inputs` when the request was already validated."""
+    if inputs is None:
+        inputs = ELIGIBILITY_INPUTS(payload)
+    crop, region, state, risk_level, storage_days, farmer_category, land_size = inputs
 
     schemes: Dict[str, List[str]] = {}
     checks: List[Dict] = []
@@ -172,9 +220,11 @@ def evaluate_eligibility(payload: Dict) -> Dict:
         add_scheme("STATE_POST_HARVEST", "Use state agriculture portals to identify active local support programs.")
         add_scheme("PMFBY", "Insurance verification is recommended for seasonal risk management.")
 
+    # read the catalogue once; a threshold reload may swap it mid-request
+    catalogue = SCHEMES
     scheme_items: List[Dict] = []
     for code, reasons in schemes.items():
-        base = SCHEMES[code]
+        base = catalogue[code]
         scheme_items.append(
             {
                 "code": code,
@@ -0,0 +1,103 @@
+"""JSON for requests and responses, with an optional fast backend.
+
+Flask encodes every `jsonify` response and decodes every JSON request body
+through `app.json`. `install(app)` replaces that provider with one backed by
+orjson when it is installed (`pip install orjson`); otherwise the stdlib
+provider stays in place. Both backends sort keys when `app.json.sort_keys`
+is set and write dates as HTTP dates, and anything orjson cannot encode or
+decode (big integers, namedtuples, NaN literals in request bodies) is handed
+to the stdlib provider. One difference remains: orjson writes a NaN or
+infinite float as `null`, the stdlib as the non-standard `NaN`/`Infinity`.
+The request schemas reject non-finite numbers, so responses should not
+carry them under either backend.
+
+    AGRISPECTRA_JSON=auto     orjson if installed, else stdlib (default)
+    AGRISPECTRA_JSON=orjson   orjson, failing at start-up if it is missing
+    AGRISPECTRA_JSON=json     stdlib only
+
+Compare the two with loadgen.py against a server started with each setting;
+the backend in use is reported under `json` in `/api/metrics`.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import Dict
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+try:
+    from flask.json.provider import DefaultJSONProvider
+except ImportError:  # Flask < 2.2 has no pluggable provider
+    DefaultJSONProvider = None
+
+
+_state: Dict = {'backend': 'json', 'fallbacks': 0}
+
+
+if orjson is not None and DefaultJSONProvider is not None:
+
+    class OrjsonProvider(DefaultJSONProvider):
+        """`DefaultJSONProvider` that encodes and decodes with orjson."""
+
+        def _options(self, indent: bool = False) -> int:
+            # datetimes go through `default` so they stay HTTP dates, as in Flask
+            option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            if self.sort_keys:
+                option |= orjson.OPT_SORT_KEYS
+            if indent:
+                option |= orjson.OPT_INDENT_2
+            return option
+
+        def _encode(self, obj, indent: bool = False) -> bytes:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._options(indent))
+            except orjson.JSONEncodeError:
+                _state['fallbacks'] += 1
+                kwargs = {'indent': 2} if indent else {'separators': (',', ':')}
+                return super().dumps(obj, **kwargs).encode('utf-8')
+
+        def dumps(self, obj, **kwargs) -> str:
+            if kwargs:
+                return super().dumps(obj, **kwargs)
+            return self._encode(obj).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            if kwargs:
+                return super().loads(s, **kwargs)
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                # raises the usual ValueError for input that is not JSON at all
+                _state['fallbacks'] += 1
+                return super().loads(s)
+
+        def response(self, *args, **kwargs):
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            return self._app.response_class(self._encode(obj, indent) + b'\n', mimetype=self.mimetype)
+
+else:
+    OrjsonProvider = None
+
+
+def install(app, backend: str = None) -> str:
+    """Use the JSON backend chosen by `backend` (default AGRISPECTRA_JSON) for `app`."""
+    backend = (backend or os.environ.get('AGRISPECTRA_JSON') or 'auto').strip().lower()
+    if backend not in ('auto', 'orjson', 'json'):
+        raise ValueError(f'AGRISPECTRA_JSON must be auto, orjson or json, not {backend!r}')
+    if backend == 'orjson' and OrjsonProvider is None:
+        raise RuntimeError('AGRISPECTRA_JSON=orjson needs orjson installed and Flask 2.2 or newer.')
+    if backend != 'json' and OrjsonProvider is not None:
+        app.json = OrjsonProvider(app)
+        _state['backend'] = 'orjson'
+    else:
+        _state['backend'] = 'json'
+    return _state['backend']
+
+
+def stats() -> Dict:
+    return dict(_state)
@@ -0,0 +1,283 @@
+"""In-process cache for upstream weather lookups with hot-key prefetch.
+
+`ForecastCache` is a small thread-safe TTL cache. Every lookup goes through
+`get_or_load(key, loader)`, which also tells a `HotKeyTracker` how often each
+key is asked for. `PrefetchScheduler` runs in a daemon thread, picks the
+most-requested keys whose entries are about to expire, and reloads them
+(with jitter and a concurrency cap) so user-facing calls keep hitting a warm
+cache. Both expose a `stats()` dict for the metrics endpoint.
+
+All three take a `clock` (default `time.monotonic`), and the scheduler a
+`rng` for its jitter, so tests can drive expiry and selection without
+sleeping.
+"""
+
+from __future__ import annotations
+
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+
+_MISSING = object()
+
+
+class ForecastCache:
+    def __init__(self, ttl_seconds: float, max_entries: int = 4096, tracker: Optional['HotKeyTracker'] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.tracker = tracker
+        self._clock = clock
+        self._entries: Dict[Hashable, Tuple[float, object]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale_served = 0
+
+    def get(self, key, default=None):
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                return default
+            return entry[1]
+
+    def put(self, key, value, ttl: Optional[float] = None) -> None:
+        expires_at = self._clock() + (self.ttl_seconds if ttl is None else ttl)
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                self._evict_locked()
+            self._entries[key] = (expires_at, value)
+
+    def expires_in(self, key) -> Optional[float]:
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        return entry[0] - self._clock()
+
+    def get_stale(self, key, default=None):
+        """Return the last stored value for `key` even if it has expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            self.stale_served += 1
+            return entry[1]
+
+    def get_or_load(self, key, loader: Callable[..., object], ttl: Optional[float] = None, **load_kwargs):
+        """Return the cached value for `key`, calling `loader(**load_kwargs)` on a miss.
+
+        Only the bare `loader` is handed to the tracker, so per-request
+        arguments such as a deadline never leak into background refreshes.
+        Loader exceptions propagate and are not cached; a `None` result is
+        cached like any other value.
+        """
+        if self.tracker is not None:
+            self.tracker.record(key, loader, ttl)
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            with self._lock:
+                self.hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        value = loader(**load_kwargs)
+        self.put(key, value, ttl)
+        return value
+
+    def refresh(self, key, loader: Callable[[], object], ttl: Optional[float] = None) -> None:
+        self.put(key, loader(), ttl)
+
+    def _evict_locked(self) -> None:
+        # drop expired entries first, then the one closest to expiry; expired
+        # entries otherwise stay around as stale fallbacks
+        now = self._clock()
+        expired = [k for k, (exp, _) in self._entries.items() if exp <= now]
+        for k in expired:
+            del self._entries[k]
+        if len(self._entries) >= self.max_entries:
+            oldest = min(self._entries, key=lambda k: self._entries[k][0])
+            del self._entries[oldest]
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale_served': self.stale_served,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+class HotKeyTracker:
+    """Exponentially decayed request counts per cache key."""
+
+    def __init__(self, half_life_seconds: float = 3600.0, max_keys: int = 2048,
+                 clock: Callable[[], float] = time.monotonic):
+        self.half_life_seconds = half_life_seconds
+        self.max_keys = max_keys
+        self._clock = clock
+        self._scores: Dict[Hashable, float] = {}
+        self._loaders: Dict[Hashable, Tuple[Callable[[], object], Optional[float]]] = {}
+        self._last_decay = clock()
+        self._lock = threading.Lock()
+
+    def record(self, key, loader: Callable[[], object], ttl: Optional[float] = None) -> None:
+        with self._lock:
+            self._scores[key] = self._scores.get(key, 0.0) + 1.0
+            self._loaders[key] = (loader, ttl)
+            if len(self._scores) > self.max_keys:
+                coldest = min(self._scores, key=self._scores.get)
+                del self._scores[coldest]
+                del self._loaders[coldest]
+
+    def _decay_locked(self) -> None:
+        now = self._clock()
+        elapsed = now - self._last_decay
+        if elapsed <= 0:
+            return
+        factor = 0.5 ** (elapsed / self.half_life_seconds)
+        for key in list(self._scores):
+            score = self._scores[key] * factor
+            if score < 0.05:
+                del self._scores[key]
+                del self._loaders[key]
+            else:
+                self._scores[key] = score
+        self._last_decay = now
+
+    def top(self, limit: int) -> List[Tuple[Hashable, Callable[[], object], Optional[float]]]:
+        with self._lock:
+            self._decay_locked()
+            keys = sorted(self._scores, key=self._scores.get, reverse=True)[:limit]
+            return [(k, *self._loaders[k]) for k in keys]
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+class PrefetchScheduler:
+    """Refresh hot cache entries shortly before they expire."""
+
+    def __init__(
+        self,
+        cache: ForecastCache,
+        tracker: HotKeyTracker,
+        hot_keys: int = 50,
+        refresh_ahead_seconds: float = 300.0,
+        jitter_seconds: float = 60.0,
+        max_concurrency: int = 4,
+        tick_seconds: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+        rng: Optional[random.Random] = None,
+    ):
+        self.cache = cache
+        self.tracker = tracker
+        self.hot_keys = hot_keys
+        self.refresh_ahead_seconds = refresh_ahead_seconds
+        self.jitter_seconds = jitter_seconds
+        self.max_concurrency = max_concurrency
+        self.tick_seconds = tick_seconds
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._inflight = set()
+        self._lock = threading.Lock()
+        self._started_at: Optional[float] = None
+        self.ticks = 0
+        self.scheduled = 0
+        self.refreshed = 0
+        self.failed = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._started_at = self._clock()
+            self._pool = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='prefetch')
+            self._thread = threading.Thread(target=self._run, name='prefetch-scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.tick_seconds):
+            try:
+                self.tick()
+            except Exception:
+                # a broken tick must never take the scheduler down
+                with self._lock:
+                    self.failed += 1
+
+    def tick(self) -> int:
+        """Schedule refreshes for hot keys that are due; returns how many were queued."""
+        with self._lock:
+            self.ticks += 1
+        queued = 0
+        for key, loader, ttl in self.tracker.top(self.hot_keys):
+            remaining = self.cache.expires_in(key)
+            # missing entries are left to the next real request
+            if remaining is None:
+                continue
+            window = self.refresh_ahead_seconds + self._rng.uniform(0, self.jitter_seconds)
+            if remaining > window:
+                continue
+            with self._lock:
+                if key in self._inflight or len(self._inflight) >= self.max_concurrency:
+                    continue
+                self._inflight.add(key)
+                self.scheduled += 1
+            due_at = self._clock() + remaining - self.refresh_ahead_seconds
+            queued += 1
+            self._pool.submit(self._refresh, key, loader, ttl, due_at)
+        return queued
+
+    def _refresh(self, key, loader, ttl, due_at: float) -> None:
+        lag = round(max(0.0, self._clock() - due_at), 3)
+        try:
+            self.cache.refresh(key, loader, ttl)
+            ok = True
+        except Exception:
+            ok = False
+        # several pool threads finish at once; counters only change under the lock
+        with self._lock:
+            if ok:
+                self.refreshed += 1
+            else:
+                self.failed += 1
+            self.last_lag_seconds = lag
+            self.max_lag_seconds = max(self.max_lag_seconds, lag)
+            self._inflight.discard(key)
+
+    def stats(self) -> Dict:
+        uptime = self._clock() - self._started_at if self._started_at else 0.0
+        with self._lock:
+            return {
+                'running': self.running,
+                'tracked_keys': len(self.tracker),
+                'inflight': len(self._inflight),
+                'ticks': self.ticks,
+                'scheduled': self.scheduled,
+                'refreshed': self.refreshed,
+                'failed': self.failed,
+                'refreshes_per_minute': round(self.refreshed * 60.0 / uptime, 2) if uptime else 0.0,
+                'last_lag_seconds': self.last_lag_seconds,
+                'max_lag_seconds': self.max_lag_seconds,
+            }
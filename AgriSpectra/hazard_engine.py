@@ -0,0 +1,132 @@
+"""Weather hazard evaluation over a locations x forecast-days grid.
+
+Provides `scan_hazards(locations)` which takes the daily forecast block of
+many locations, lays it out as flat columns and classifies every cell in
+one pass. Alert records are only built for cells that trigger, so scanning
+a few thousand sites costs roughly one comparison per cell.
+"""
+
+from __future__ import annotations
+
+from typing import Dict, List, Sequence
+
+
+HEAVY_RAIN_MM = 50
+SEVERE_RAIN_MM = 100
+CYCLONE_WIND_KMH = 62
+CYCLONE_WEATHER_CODES = frozenset({95, 96, 99})
+
+HEAVY_RAIN_RECOMMENDATIONS = (
+    'Move produce to elevated and covered storage immediately.',
+    'Use waterproof tarpaulins and seal side openings to avoid moisture ingress.',
+    'Keep pallets above floor level and maintain drainage around storage.',
+)
+
+CYCLONE_RECOMMENDATIONS = (
+    'Shift stock to the safest available pucca storage building.',
+    'Avoid temporary sheds; secure doors, roof sheets, and ventilation shutters.',
+    'Keep emergency backup: tarpaulins, ropes, power backup, and contact list.',
+)
+
+
+def _number(value) -> float:
+    # bool is an int subclass but never a valid reading
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    return 0.0
+
+
+def _column(values: Sequence, width: int, fill=None) -> List:
+    values = list(values or [])[:width]
+    if len(values) < width:
+        values.extend([fill] * (width - len(values)))
+    return values
+
+
+def _heavy_rain_alert(day, rain: float) -> Dict:
+    return {
+        'date': day,
+        'type': 'HEAVY_RAIN',
+        'severity': 'SEVERE' if rain >= SEVERE_RAIN_MM else 'HIGH',
+        'headline': f'Heavy rain expected on {day}',
+        'details': f'Forecast rainfall is about {round(rain, 1)} mm.',
+        'recommendations': list(HEAVY_RAIN_RECOMMENDATIONS),
+    }
+
+
+def _cyclone_alert(day, wind: float) -> Dict:
+    return {
+        'date': day,
+        'type': 'CYCLONE_RISK',
+        'severity': 'SEVERE',
+        'headline': f'Cyclone/strong storm risk on {day}',
+        'details': f'Peak wind may reach about {round(wind, 1)} km/h.',
+        'recommendations': list(CYCLONE_RECOMMENDATIONS),
+    }
+
+
+def scan_hazards(locations: Sequence[Dict]) -> List[Dict]:
+    """Classify every (location, day) cell and return alerts for hot cells.
+
+    Each location is a dict with an optional `id` and a `daily` block in the
+    Open-Meteo layout (`time`, `precipitation_sum`, `windspeed_10m_max`,
+    `weathercode`). Short or missing series are padded the same way the
+    single-location check always treated them: no rain, no wind, no code.
+
+    Returned alerts carry `location_index` and `location_id` so callers can
+    regroup them; order is location, then day, then rain before cyclone.
+    """
+    owners: List[int] = []
+    days: List = []
+    rain: List[float] = []
+    wind: List[float] = []
+    codes: List = []
+
+    # Flatten the ragged per-location series into aligned columns
+    for loc_idx, loc in enumerate(locations):
+        daily = loc.get('daily') or {}
+        times = list(daily.get('time') or [])
+        width = len(times)
+        if not width:
+            continue
+        owners.extend([loc_idx] * width)
+        days.extend(times)
+        rain.extend(map(_number, _column(daily.get('precipitation_sum'), width, 0)))
+        wind.extend(map(_number, _column(daily.get('windspeed_10m_max'), width, 0)))
+        codes.extend(_column(daily.get('weathercode'), width))
+
+    # Single pass over the columns; only indices of triggering cells survive
+    heavy = [r >= HEAVY_RAIN_MM for r in rain]
+    cyclone = [
+        w >= CYCLONE_WIND_KMH or c in CYCLONE_WEATHER_CODES
+        for w, c in zip(wind, codes)
+    ]
+    hot = [i for i, (h, c) in enumerate(zip(heavy, cyclone)) if h or c]
+
+    alerts: List[Dict] = []
+    for i in hot:
+        loc_idx = owners[i]
+        loc_id = locations[loc_idx].get('id', loc_idx)
+        if heavy[i]:
+            alert = _heavy_rain_alert(days[i], rain[i])
+            alert['location_index'] = loc_idx
+            alert['location_id'] = loc_id
+            alerts.append(alert)
+        if cyclone[i]:
+            alert = _cyclone_alert(days[i], wind[i])
+            alert['location_index'] = loc_idx
+            alert['location_id'] = loc_id
+            alerts.append(alert)
+    return alerts
+
+
+def evaluate_daily(daily: Dict) -> Dict:
+    """Single-location helper matching the `/api/weather-alerts` payload."""
+    alerts = scan_hazards([{'daily': daily}])
+    for alert in alerts:
+        alert.pop('location_index', None)
+        alert.pop('location_id', None)
+    return {
+        'alerts': alerts,
+        'forecast_days_checked': len((daily or {}).get('time') or []),
+    }
@@ -0,0 +1,754 @@
+"""Append-only history of risk and eligibility assessments.
+
+Request handlers call `HistoryStore.record()`, which only appends a tuple to
+an in-memory queue. A background thread drains the queue every few seconds
+(or as soon as a batch fills) into a new immutable segment file, so writing
+history never adds disk I/O to a request.
+
+A segment holds one batch sorted by time, stored column by column with
+fixed-width values, and is memory-mapped for reading like `climatology.bin`.
+Queries skip segments outside the time range or without the requested crop,
+region or warehouse, bisect the time column to the range and filter the
+small integer columns; nothing is parsed per record.
+
+Segment layout (little-endian):
+- header `HEADER` (magic, format version, column count, records, first and
+  last timestamp, metadata length)
+- metadata JSON: the dictionaries for the coded text columns (`crop`,
+  `region`, `warehouse`) and, after compaction, the segments it replaces
+- padding to an 8-byte boundary
+- one array per column in `COLUMNS` order, each padded to 8 bytes
+
+Small segments are merged by `compact()` (run automatically once there are
+`COMPACT_AFTER` of them, or with `python history.py compact`). A merged
+segment lists the files it replaces, so readers ignore those even if a
+crash or an open map on Windows left them on disk.
+
+    python history.py query --crop wheat --since 2024-06-01 --limit 20
+    python history.py summary --bucket day --group-by crop,region
+    python history.py compact
+"""
+
+from __future__ import annotations
+
+import argparse
+import atexit
+import bisect
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import Counter, deque
+from datetime import datetime, timezone
+from operator import itemgetter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from eligibility_engine import normalize_risk_level
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'history')
+
+MAGIC = b'AGHS'
+FORMAT_VERSION = 1
+# magic, version, columns, records, first timestamp, last timestamp, metadata length
+HEADER = struct.Struct('<4sHHIIII')
+SUFFIX = '.seg'
+
+# (name, array typecode, scale); text columns hold codes into the segment's dictionaries
+COLUMNS = (
+    ('ts', 'I', None),
+    ('crop', 'H', None),
+    ('region', 'H', None),
+    ('warehouse', 'H', None),
+    ('level', 'B', None),
+    ('source', 'B', None),
+    ('score', 'H', 10),
+    ('temperature', 'h', 10),
+    ('humidity', 'H', 10),
+    ('storage_days', 'H', None),
+    ('schemes', 'B', None),
+)
+DICTIONARY_COLUMNS = ('crop', 'region', 'warehouse')
+# "not recorded" per typecode
+NONE = {'B': 0xFF, 'H': 0xFFFF, 'h': -0x8000, 'I': 0xFFFFFFFF}
+
+LEVELS = ('SAFE', 'MODERATE', 'HIGH', 'CRITICAL', 'UNKNOWN')
+SOURCES = ('risk', 'assess', 'eligibility', 'calculator', 'portfolio')
+GROUP_FIELDS = {'crop': 'crop', 'region': 'region', 'warehouse': 'warehouse', 'level': 'level', 'source': 'source'}
+
+MAX_SEGMENT_RECORDS = 1 << 20
+# dictionary codes are uint16; a merge stops before a dictionary would overflow
+MAX_DICTIONARY = 0xFFFE
+COMPACT_AFTER = 16
+SMALL_SEGMENT_RECORDS = 1 << 16
+COMPACT_LOCK_STALE_SECONDS = 600
+
+_LEVEL_CODES = {name: i for i, name in enumerate(LEVELS)}
+_SOURCE_CODES = {name: i for i, name in enumerate(SOURCES)}
+_COLUMN_INDEX = {name: i for i, (name, _, _) in enumerate(COLUMNS)}
+
+
+logger = logging.getLogger(__name__)
+
+
+class HistoryError(ValueError):
+    pass
+
+
+def _scaled(value, scale: int, code: str) -> int:
+    if value is None:
+        return NONE[code]
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return NONE[code]
+    if not math.isfinite(number):
+        return NONE[code]
+    # every column is at most 16 bits wide; bound the value before scaling so huge inputs cannot overflow
+    scaled = int(round(max(-1e6, min(1e6, number)) * scale))
+    if code == 'h':
+        return max(-0x7FFF, min(0x7FFF, scaled))
+    return max(0, min(NONE[code] - 1, scaled))
+
+
+def _unscaled(raw: int, scale: int, code: str):
+    return None if raw == NONE[code] else raw / scale
+
+
+def _text(value) -> str:
+    return str(value or '').strip().lower()[:64]
+
+
+def _pad(n: int) -> int:
+    return -n % 8
+
+
+def write_segment(path: str, rows: Sequence[Tuple], dictionaries: Dict[str, List[str]],
+                  replaces: Sequence[str] = ()) -> None:
+    """Write `rows` (encoded column tuples, sorted by ts) as one segment file."""
+    meta = {name: list(dictionaries.get(name, [])) for name in DICTIONARY_COLUMNS}
+    if replaces:
+        meta['replaces'] = list(replaces)
+    meta_bytes = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+    t_first = rows[0][0] if rows else 0
+    t_last = rows[-1][0] if rows else 0
+    header = HEADER.pack(MAGIC, FORMAT_VERSION, len(COLUMNS), len(rows), t_first, t_last, len(meta_bytes))
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as fh:
+        fh.write(header)
+        fh.write(meta_bytes)
+        fh.write(b'\0' * _pad(HEADER.size + len(meta_bytes)))
+        for k, (_, code, _) in enumerate(COLUMNS):
+            values = array(code, [row[k] for row in rows])
+            if sys.byteorder != 'little':
+                values.byteswap()
+            raw = values.tobytes()
+            fh.write(raw)
+            fh.write(b'\0' * _pad(len(raw)))
+    os.replace(tmp, path)
+
+
+class Segment:
+    """Read-only, memory-mapped view of one segment file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, 'rb') as fh:
+            self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, fmt, ncols, count, t_first, t_last, meta_len = HEADER.unpack_from(self._mm, 0)
+            if magic != MAGIC or fmt != FORMAT_VERSION or ncols != len(COLUMNS):
+                raise HistoryError(f'{path}: not a history segment (format {fmt})')
+            self.meta = json.loads(self._mm[HEADER.size:HEADER.size + meta_len].decode('utf-8'))
+            offset = HEADER.size + meta_len
+            offset += _pad(offset)
+            self.columns = []
+            for _, code, _ in COLUMNS:
+                size = count * array(code).itemsize
+                if len(self._mm) < offset + size:
+                    raise HistoryError(f'{path}: truncated')
+                if sys.byteorder == 'little':
+                    self.columns.append(memoryview(self._mm)[offset:offset + size].cast(code))
+                else:
+                    values = array(code, self._mm[offset:offset + size])
+                    values.byteswap()
+                    self.columns.append(values)
+                offset += size + _pad(size)
+        except Exception:
+            for column in getattr(self, 'columns', ()):
+                if isinstance(column, memoryview):
+                    column.release()
+            self._mm.close()
+            raise
+        self.count, self.t_first, self.t_last = count, t_first, t_last
+        self.replaces = tuple(self.meta.get('replaces') or ())
+        self._codes = {name: {value: i for i, value in enumerate(self.meta.get(name) or [])}
+                       for name in DICTIONARY_COLUMNS}
+
+    def close(self) -> None:
+        for column in self.columns:
+            if isinstance(column, memoryview):
+                column.release()
+        self._mm.close()
+
+    def code(self, column: str, value: str) -> Optional[int]:
+        return self._codes[column].get(value)
+
+    def bounds(self, start: Optional[int], end: Optional[int]) -> Tuple[int, int]:
+        """Index range of records with start <= ts < end."""
+        ts = self.columns[0]
+        lo = 0 if start is None else bisect.bisect_left(ts, start)
+        hi = self.count if end is None else bisect.bisect_left(ts, end, lo)
+        return lo, hi
+
+    def decode(self, column: str, raw: int):
+        if column in DICTIONARY_COLUMNS:
+            # '' is "not given" (assessments outside a warehouse, a blank crop)
+            return self.meta[column][raw] or None
+        if column == 'level':
+            return LEVELS[raw] if raw < len(LEVELS) else 'UNKNOWN'
+        if column == 'source':
+            return SOURCES[raw] if raw < len(SOURCES) else 'unknown'
+        _, code, scale = COLUMNS[_COLUMN_INDEX[column]]
+        if scale:
+            return _unscaled(raw, scale, code)
+        return None if raw == NONE[code] else raw
+
+
+def _time_value(value) -> Optional[int]:
+    """Epoch seconds from a number or an ISO date/time (UTC unless it has an offset)."""
+    if value is None or value == '':
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    text = str(value).strip()
+    try:
+        return int(float(text))
+    except ValueError:
+        pass
+    try:
+        moment = datetime.fromisoformat(text.replace('Z', '+00:00'))
+    except ValueError:
+        raise HistoryError(f'not a time: {value!r}')
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return int(moment.timestamp())
+
+
+def _bucket_seconds(value) -> Optional[int]:
+    named = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+    if value in (None, ''):
+        return None
+    if str(value).lower() in named:
+        return named[str(value).lower()]
+    try:
+        seconds = int(value)
+    except (TypeError, ValueError):
+        raise HistoryError('bucket must be hour, day, week or a number of seconds')
+    if seconds <= 0:
+        raise HistoryError('bucket must be positive')
+    return seconds
+
+
+def _iso(ts: int) -> str:
+    return datetime.fromtimestamp(ts, timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def _select(values: List, positions: Sequence[int]) -> List:
+    if len(positions) == 1:
+        return [values[positions[0]]]
+    return list(itemgetter(*positions)(values))
+
+
+class HistoryStore:
+    """The history directory: queued writes, background flushes and mapped reads."""
+
+    def __init__(self, path: str = DEFAULT_PATH, flush_seconds: float = 2.0, batch_size: int = 4096,
+                 max_pending: int = 100000):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_pending = max_pending
+        self._pending: deque = deque()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._write_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._segments: Dict[str, Segment] = {}
+        self._listing: Optional[Tuple[int, int]] = None
+        self._sequence = 0
+        self.recorded = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.compactions = 0
+        self.restarts = 0
+        self.last_error: Optional[str] = None
+
+    # ---- writing -------------------------------------------------------
+
+    def record(self, source: str, crop, region, level, score=None, temperature=None, humidity=None,
+               storage_days=None, warehouse='', schemes=None, at: Optional[float] = None) -> None:
+        """Queue one assessment; never blocks on disk."""
+        if len(self._pending) >= self.max_pending:
+            # the flusher is behind or failing; shed rather than grow without bound
+            self.dropped += 1
+            return
+        self._pending.append((at or time.time(), source, crop, region, warehouse, level, score,
+                              temperature, humidity, storage_days, schemes))
+        self.recorded += 1
+        if len(self._pending) >= self.batch_size:
+            self._wake.set()
+
+    def _encode(self, batch: Iterable[Tuple]) -> Tuple[List[Tuple], Dict[str, List[str]]]:
+        dictionaries: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+
+        def code(column, value):
+            table = dictionaries[column]
+            value = _text(value)
+            found = table.get(value)
+            if found is None:
+                found = table[value] = len(table)
+            return found
+
+        rows = []
+        for at, source, crop, region, warehouse, level, score, temp, rh, days, schemes in batch:
+            level_code = _LEVEL_CODES.get(normalize_risk_level(level or ''), _LEVEL_CODES['UNKNOWN'])
+            rows.append((
+                int(at),
+                code('crop', crop),
+                code('region', region),
+                code('warehouse', warehouse),
+                level_code,
+                _SOURCE_CODES.get(source, NONE['B']),
+                _scaled(score, 10, 'H'),
+                _scaled(temp, 10, 'h'),
+                _scaled(rh, 10, 'H'),
+                _scaled(days, 1, 'H'),
+                _scaled(schemes, 1, 'B'),
+            ))
+        rows.sort(key=lambda row: row[0])
+        return rows, {name: list(table) for name, table in dictionaries.items()}
+
+    def _new_name(self) -> str:
+        self._sequence += 1
+        # several workers may share the directory; the pid keeps their names apart
+        return f'{int(time.time() * 1000):013d}-{os.getpid()}-{self._sequence:04d}{SUFFIX}'
+
+    def flush(self) -> int:
+        """Write everything queued so far as one segment per `batch_size` records."""
+        written = 0
+        with self._write_lock:
+            while self._pending:
+                batch = []
+                while self._pending and len(batch) < self.batch_size:
+                    batch.append(self._pending.popleft())
+                try:
+                    rows, dictionaries = self._encode(batch)
+                    os.makedirs(self.path, exist_ok=True)
+                    write_segment(os.path.join(self.path, self._new_name()), rows, dictionaries)
+                except Exception as exc:
+                    # one bad batch must not take the queue behind it down too
+                    logger.warning('history: dropped a batch of %d records: %s', len(batch), exc)
+                    self.last_error = str(exc)
+                    self.dropped += len(batch)
+                    continue
+                written += len(rows)
+                self.flushes += 1
+            if written:
+                # do not rely on directory mtime granularity to see our own segments
+                self._listing = None
+        return written
+
+    def start(self) -> None:
+        """Start the writer thread, or start a new one if the previous writer has died."""
+        with self._lock:
+            if self._thread is not None:
+                if self._thread.is_alive():
+                    return
+                self.restarts += 1
+            else:
+                atexit.register(self.flush)
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='history-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+                if self._small_segments() >= COMPACT_AFTER:
+                    self.compact()
+            except Exception as exc:
+                logger.exception('history writer: %s', exc)
+                self.last_error = str(exc)
+        self.flush()
+
+    # ---- reading -------------------------------------------------------
+
+    def _files(self) -> List[str]:
+        try:
+            return sorted(name for name in os.listdir(self.path) if name.endswith(SUFFIX))
+        except OSError:
+            return []
+
+    def segments(self) -> List[Segment]:
+        """Live segments in name (write) order, reopening only files that changed."""
+        try:
+            st = os.stat(self.path)
+            listing = (st.st_mtime_ns, st.st_ino)
+        except OSError:
+            listing = None
+        with self._lock:
+            if listing is None or listing != self._listing:
+                names = self._files()
+                current = {}
+                for name in names:
+                    segment = self._segments.get(name)
+                    if segment is None:
+                        try:
+                            segment = Segment(os.path.join(self.path, name))
+                        except (OSError, HistoryError) as exc:
+                            # a file another worker is still renaming into place
+                            self.last_error = str(exc)
+                            continue
+                    current[name] = segment
+                self._segments = current
+                self._listing = listing
+            replaced = {name for segment in self._segments.values() for name in segment.replaces}
+            return [s for name, s in sorted(self._segments.items()) if name not in replaced]
+
+    def _matches(self, start, end, filters) -> Iterable[Tuple[Segment, List[int]]]:
+        """(segment, matching record indexes) for every segment with matches."""
+        for segment in self.segments():
+            if not segment.count:
+                continue
+            if start is not None and segment.t_last < start:
+                continue
+            if end is not None and segment.t_first >= end:
+                continue
+            wanted = []
+            for column, value in filters.items():
+                if column in DICTIONARY_COLUMNS:
+                    found = segment.code(column, _text(value))
+                elif column == 'level':
+                    found = _LEVEL_CODES.get(normalize_risk_level(value))
+                elif column == 'source':
+                    found = _SOURCE_CODES.get(value)
+                else:
+                    raise HistoryError(f'cannot filter on {column!r}')
+                if found is None:
+                    # the segment has no such value
+                    break
+                wanted.append((_COLUMN_INDEX[column], found))
+            else:
+                lo, hi = segment.bounds(start, end)
+                if lo >= hi:
+                    continue
+                index = range(lo, hi)
+                for k, found in wanted:
+                    values = segment.columns[k][lo:hi].tolist()
+                    index = [i for i in index if values[i - lo] == found]
+                    if not index:
+                        break
+                if index:
+                    yield segment, index
+
+    def _row(self, segment: Segment, i: int) -> Dict:
+        raw = {name: segment.columns[k][i] for k, (name, _, _) in enumerate(COLUMNS)}
+        return {
+            'at': _iso(raw['ts']),
+            'ts': raw['ts'],
+            'source': segment.decode('source', raw['source']),
+            'crop_type': segment.decode('crop', raw['crop']),
+            'region': segment.decode('region', raw['region']),
+            'warehouse_id': segment.decode('warehouse', raw['warehouse']),
+            'risk_level': segment.decode('level', raw['level']),
+            'risk_score': segment.decode('score', raw['score']),
+            'temperature': segment.decode('temperature', raw['temperature']),
+            'humidity': segment.decode('humidity', raw['humidity']),
+            'storage_days': segment.decode('storage_days', raw['storage_days']),
+            'eligible_schemes': segment.decode('schemes', raw['schemes']),
+        }
+
+    def query(self, start=None, end=None, limit: int = 100, **filters) -> List[Dict]:
+        """Most recent records first; filters are crop, region, warehouse, level and source."""
+        start, end = _time_value(start), _time_value(end)
+        filters = {k: v for k, v in filters.items() if v not in (None, '')}
+        if limit <= 0:
+            return []
+        found = []
+        for segment, index in self._matches(start, end, filters):
+            ts = segment.columns[0]
+            # indexes are in time order, so the newest `limit` are at the end
+            found.extend((ts[i], segment.name, i, segment) for i in index[-limit:])
+        found.sort(key=lambda item: (item[0], item[1], item[2]), reverse=True)
+        return [self._row(segment, i) for _, _, i, segment in found[:limit]]
+
+    def summary(self, start=None, end=None, bucket=None, group_by: Sequence[str] = (), **filters) -> Dict:
+        """Counts, level mix and score statistics, optionally per time bucket and group."""
+        start, end = _time_value(start), _time_value(end)
+        width = _bucket_seconds(bucket)
+        group_by = tuple(group_by)
+        for field in group_by:
+            if field not in GROUP_FIELDS:
+                raise HistoryError(f'cannot group by {field!r}; choose from {", ".join(GROUP_FIELDS)}')
+        filters = {k: v for k, v in filters.items() if v not in (None, '')}
+        groups: Dict[Tuple, Dict] = {}
+        ts_k, level_k, score_k = _COLUMN_INDEX['ts'], _COLUMN_INDEX['level'], _COLUMN_INDEX['score']
+        group_columns = [GROUP_FIELDS[field] for field in group_by]
+        for segment, index in self._matches(start, end, filters):
+            columns = segment.columns
+            lo, hi = index[0], index[-1] + 1
+            offsets = None if len(index) == hi - lo else [i - lo for i in index]
+
+            def pick(k):
+                values = columns[k][lo:hi].tolist()
+                return values if offsets is None else _select(values, offsets)
+
+            ts, levels, scores = pick(ts_k), pick(level_k), pick(score_k)
+            # pack each row's group key into one int (mixed radix) so the
+            # counting below hashes ints; Counter and dict(zip()) run in C
+            parts = []
+            if width:
+                base = ts[0] // width
+                parts.append(([t // width - base for t in ts], ts[-1] // width - base + 1))
+            for column in group_columns:
+                radix = len(segment.meta[column]) if column in DICTIONARY_COLUMNS else 256
+                parts.append((pick(_COLUMN_INDEX[column]), radix))
+            if parts:
+                keys = parts[0][0]
+                for values, radix in parts[1:]:
+                    keys = [k * radix + v for k, v in zip(keys, values)]
+                level_counts = Counter([k * 256 + v for k, v in zip(keys, levels)])
+                score_counts = Counter([k * 65536 + v for k, v in zip(keys, scores)])
+                firsts = dict(zip(reversed(keys), reversed(ts)))
+                lasts = dict(zip(keys, ts))
+            else:
+                level_counts, score_counts = Counter(levels), Counter(scores)
+                firsts, lasts = {0: ts[0]}, {0: ts[-1]}
+
+            slots = {}
+            for packed, first in firsts.items():
+                codes = []
+                rest = packed
+                for _, radix in reversed(parts):
+                    rest, code = divmod(rest, radix)
+                    codes.append(code)
+                codes.reverse()
+                if width:
+                    key = ((codes.pop(0) + base) * width,)
+                else:
+                    key = ()
+                key += tuple(segment.decode(column, code) for column, code in zip(group_columns, codes))
+                slot = groups.get(key)
+                if slot is None:
+                    slot = groups[key] = {'count': 0, 'levels': [0] * len(LEVELS), 'scored': 0, 'score_sum': 0,
+                                          'score_max': None, 'first': first, 'last': lasts[packed]}
+                slot['first'] = min(slot['first'], first)
+                slot['last'] = max(slot['last'], lasts[packed])
+                slots[packed] = slot
+            for packed, n in level_counts.items():
+                slot = slots[packed >> 8]
+                slot['count'] += n
+                slot['levels'][packed & 0xFF] += n
+            for packed, n in score_counts.items():
+                score = packed & 0xFFFF
+                if score == NONE['H']:
+                    continue
+                slot = slots[packed >> 16]
+                slot['scored'] += n
+                slot['score_sum'] += score * n
+                if slot['score_max'] is None or score > slot['score_max']:
+                    slot['score_max'] = score
+
+        out = []
+        for key, slot in sorted(groups.items(), key=lambda item: tuple('' if v is None else v for v in item[0])):
+            item = {}
+            if width:
+                item['bucket'] = _iso(key[0])
+                key = key[1:]
+            item.update(zip(group_by, key))
+            item.update({
+                'count': slot['count'],
+                'levels': {name: n for name, n in zip(LEVELS, slot['levels']) if n},
+                'mean_score': round(slot['score_sum'] / slot['scored'] / 10, 1) if slot['scored'] else None,
+                'max_score': slot['score_max'] / 10 if slot['score_max'] is not None else None,
+                'first': _iso(slot['first']),
+                'last': _iso(slot['last']),
+            })
+            out.append(item)
+        return {
+            'start': _iso(start) if start is not None else None,
+            'end': _iso(end) if end is not None else None,
+            'bucket_seconds': width,
+            'group_by': list(group_by),
+            'filters': filters,
+            'total': sum(item['count'] for item in out),
+            'groups': out,
+        }
+
+    # ---- compaction ----------------------------------------------------
+
+    def _small_segments(self) -> int:
+        return sum(1 for s in self.segments() if s.count < SMALL_SEGMENT_RECORDS)
+
+    def _acquire_compaction(self) -> Optional[str]:
+        lock = os.path.join(self.path, 'compact.lock')
+        try:
+            if time.time() - os.path.getmtime(lock) > COMPACT_LOCK_STALE_SECONDS:
+                os.remove(lock)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return None
+        return lock
+
+    def compact(self) -> int:
+        """Merge runs of small segments into larger ones; returns the number of segments merged."""
+        lock = self._acquire_compaction()
+        if lock is None:
+            # another worker is compacting
+            return 0
+        try:
+            # consecutive small segments, up to MAX_SEGMENT_RECORDS per merge
+            runs: List[List[Segment]] = []
+            run: List[Segment] = []
+            size = 0
+            for segment in self.segments():
+                small = segment.count < SMALL_SEGMENT_RECORDS
+                if not small or size + segment.count > MAX_SEGMENT_RECORDS:
+                    runs.append(run)
+                    run, size = [], 0
+                if small:
+                    run.append(segment)
+                    size += segment.count
+            runs.append(run)
+            merged = 0
+            for run in runs:
+                if len(run) > 1:
+                    merged += self._merge(run)
+            self.compactions += 1 if merged else 0
+            self._remove_replaced()
+            return merged
+        finally:
+            try:
+                os.remove(lock)
+            except OSError:
+                pass
+
+    def _merge(self, run: List[Segment]) -> int:
+        dictionaries: Dict[str, Dict[str, int]] = {name: {} for name in DICTIONARY_COLUMNS}
+        rows: List[Tuple] = []
+        used: List[Segment] = []
+        dict_ks = [(_COLUMN_INDEX[name], name) for name in DICTIONARY_COLUMNS]
+        for segment in run:
+            if any(len(dictionaries[name]) + sum(1 for v in segment.meta[name] if v not in dictionaries[name])
+                   > MAX_DICTIONARY for _, name in dict_ks):
+                break
+            remap = {}
+            for _, name in dict_ks:
+                table = dictionaries[name]
+                remap[name] = [table.setdefault(value, len(table)) for value in segment.meta[name]]
+            columns = [segment.columns[k].tolist() for k in range(len(COLUMNS))]
+            for k, name in dict_ks:
+                columns[k] = [remap[name][code] for code in columns[k]]
+            rows.extend(zip(*columns))
+            used.append(segment)
+        if len(used) < 2:
+            return 0
+        rows.sort(key=lambda row: row[0])
+        # inherit what the inputs replace while those files are still on disk
+        replaces = [s.name for s in used]
+        replaces += [name for s in used for name in s.replaces
+                     if os.path.exists(os.path.join(self.path, name))]
+        write_segment(os.path.join(self.path, self._new_name()), rows,
+                      {name: list(table) for name, table in dictionaries.items()}, replaces=replaces)
+        return len(used)
+
+    def _remove_replaced(self) -> None:
+        live = self.segments()
+        replaced = {name for segment in live for name in segment.replaces}
+        with self._lock:
+            for name in replaced:
+                # not closed: a query may still hold it; the map goes with the last reference
+                self._segments.pop(name, None)
+                try:
+                    os.remove(os.path.join(self.path, name))
+                except FileNotFoundError:
+                    pass
+                except OSError:
+                    # still mapped elsewhere (Windows); readers skip it and the next compaction retries
+                    continue
+            self._listing = None
+
+    def stats(self) -> Dict:
+        segments = self.segments()
+        return {
+            'path': self.path,
+            'segments': len(segments),
+            'records': sum(s.count for s in segments),
+            'bytes_mapped': sum(len(s._mm) for s in segments),
+            'pending': len(self._pending),
+            'recorded': self.recorded,
+            'dropped': self.dropped,
+            'flushes': self.flushes,
+            'compactions': self.compactions,
+            'writer_running': self.running,
+            'writer_restarts': self.restarts,
+            'last_error': self.last_error,
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Query or compact the assessment history.')
+    parser.add_argument('--path', default=os.environ.get('AGRISPECTRA_HISTORY') or DEFAULT_PATH)
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('query', 'summary'):
+        p = sub.add_parser(name)
+        p.add_argument('--since', help='ISO date/time or epoch seconds')
+        p.add_argument('--until')
+        for field in ('crop', 'region', 'warehouse', 'level', 'source'):
+            p.add_argument(f'--{field}')
+        if name == 'query':
+            p.add_argument('--limit', type=int, default=50)
+        else:
+            p.add_argument('--bucket', help='hour, day, week or seconds')
+            p.add_argument('--group-by', default='', help='comma-separated: crop, region, warehouse, level, source')
+    sub.add_parser('compact', help='merge small segments')
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.path)
+    if args.command == 'compact':
+        print(f'merged {store.compact()} segments; {store.stats()["segments"]} remain')
+        return
+    filters = {field: getattr(args, field) for field in ('crop', 'region', 'warehouse', 'level', 'source')}
+    if args.command == 'query':
+        result = store.query(args.since, args.until, args.limit, **filters)
+    else:
+        group_by = [g.strip() for g in args.group_by.split(',') if g.strip()]
+        result = store.summary(args.since, args.until, args.bucket, group_by, **filters)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+"""Load generator for a running AgriSpectra instance.
+
+Drives a weighted mix of realistic requests (calculator form posts, risk /
+eligibility / assessment API calls, weather lookups and static pages) from
+a pool of keep-alive worker threads for a fixed duration, then prints a
+JSON report with throughput and latency percentiles per route.
+
+    python loadgen.py --url http://127.0.0.1:5000 --concurrency 16 --duration 30
+    python loadgen.py --mix api_risk=5,static=1 --output report.json
+
+Point the app at `openmeteo_stub.py` first so weather routes do not hit the
+real Open-Meteo API.
+"""
+
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import math
+import random
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urlparse
+
+
+CROPS = ['Wheat', 'Paddy', 'Rice', 'Mustard', 'Sugarcane', 'Black Pepper', 'Coffee', 'Banana',
+         'Potato', 'Onion', 'Groundnut', 'Bajra']
+SEASONS = ['Summer', 'Monsoon', 'Winter', 'Post-harvest']
+REGIONS = ['North', 'South', 'East', 'West']
+STATES = ['Bihar', 'Punjab', 'Odisha', 'Kerala', 'Maharashtra', 'Rajasthan', 'Assam', 'Gujarat']
+PLACES = ['Pune', 'Cuttack', 'Patna', 'Delhi', 'Jaipur', 'Ludhiana', 'Guwahati', 'Chennai']
+STATIC_PATHS = ['/', '/how', '/about', '/data-source', '/government-support', '/calculator',
+                '/static/style.css', '/static/script.js']
+
+DEFAULT_MIX = {
+    'calculator': 15,
+    'api_risk': 20,
+    'api_eligibility': 15,
+    'api_assess': 10,
+    'weather_average': 10,
+    'weather_alerts': 10,
+    'static': 20,
+}
+
+# (method, path, body, content type) for one request
+Request = Tuple[str, str, Optional[bytes], Optional[str]]
+
+
+def _conditions(rng: random.Random) -> Dict:
+    return {
+        'crop_type': rng.choice(CROPS),
+        'region': rng.choice(REGIONS),
+        'temperature': round(rng.uniform(8, 42), 1),
+        'humidity': round(rng.uniform(25, 98), 1),
+        'season': rng.choice(SEASONS),
+        'storage_days': rng.choice([7, 15, 30, 60, 90, 180, 365]),
+    }
+
+
+def _json(path: str, payload: Dict) -> Request:
+    return 'POST', path, json.dumps(payload).encode('utf-8'), 'application/json'
+
+
+def build_request(route: str, rng: random.Random) -> Request:
+    if route == 'calculator':
+        form = _conditions(rng)
+        form.update({'place': rng.choice(PLACES), 'latitude': round(rng.uniform(9, 31), 3),
+                     'longitude': round(rng.uniform(70, 92), 3)})
+        return 'POST', '/calculator', urlencode(form).encode('utf-8'), 'application/x-www-form-urlencoded'
+    if route == 'api_risk':
+        return _json('/api/risk', _conditions(rng))
+    if route == 'api_eligibility':
+        payload = _conditions(rng)
+        payload.update({'state': rng.choice(STATES), 'farmer_category': rng.choice(['small', 'marginal', 'medium']),
+                        'landholding_size': rng.choice([0.8, 1.5, 3, 6])})
+        return _json('/api/eligibility', payload)
+    if route == 'api_assess':
+        return _json('/api/assess', _conditions(rng))
+    if route == 'weather_average':
+        return _json('/api/weather-average', {'place': rng.choice(PLACES)})
+    if route == 'weather_alerts':
+        return _json('/api/weather-alerts', {'latitude': round(rng.uniform(9, 31), 2),
+                                             'longitude': round(rng.uniform(70, 92), 2)})
+    if route == 'static':
+        return 'GET', rng.choice(STATIC_PATHS), None, None
+    raise ValueError(f'unknown route {route!r}')
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    # nearest-rank method
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class Recorder:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+        self.statuses: Dict[str, Dict[str, int]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, route: str, seconds: float, status) -> None:
+        with self._lock:
+            self.samples.setdefault(route, []).append(seconds)
+            codes = self.statuses.setdefault(route, {})
+            codes[str(status)] = codes.get(str(status), 0) + 1
+            if status == 'error' or (isinstance(status, int) and status >= 500):
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+
+def _worker(base, mix, deadline, warmup_until, recorder, seed, timeout):
+    rng = random.Random(seed)
+    routes, weights = zip(*mix.items())
+    conn = None
+    while time.monotonic() < deadline:
+        route = rng.choices(routes, weights)[0]
+        method, path, body, ctype = build_request(route, rng)
+        headers = {'Content-Type': ctype} if ctype else {}
+        started = time.perf_counter()
+        try:
+            if conn is None:
+                conn_cls = http.client.HTTPSConnection if base.scheme == 'https' else http.client.HTTPConnection
+                conn = conn_cls(base.hostname, base.port, timeout=timeout)
+            conn.request(method, path, body=body, headers=headers)
+            resp = conn.getresponse()
+            resp.read()
+            status = resp.status
+            if resp.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                conn = None
+        except (OSError, http.client.HTTPException):
+            status = 'error'
+            if conn is not None:
+                conn.close()
+            conn = None
+        elapsed = time.perf_counter() - started
+        if time.monotonic() >= warmup_until:
+            recorder.add(route, elapsed, status)
+    if conn is not None:
+        conn.close()
+
+
+def _json_backend(base, timeout: float) -> Optional[str]:
+    """The JSON backend the server reports in /api/metrics, if it says."""
+    conn_cls = http.client.HTTPSConnection if base.scheme == 'https' else http.client.HTTPConnection
+    conn = conn_cls(base.hostname, base.port, timeout=timeout)
+    try:
+        conn.request('GET', '/api/metrics')
+        resp = conn.getresponse()
+        metrics = json.loads(resp.read()) if resp.status == 200 else {}
+        return (metrics.get('json') or {}).get('backend')
+    except (OSError, http.client.HTTPException, ValueError, AttributeError):
+        return None
+    finally:
+        conn.close()
+
+
+def run(url: str, concurrency: int = 8, duration: float = 10.0, warmup: float = 1.0,
+        mix: Optional[Dict[str, int]] = None, seed: int = 0, timeout: float = 30.0) -> Dict:
+    mix = {k: v for k, v in (mix or DEFAULT_MIX).items() if v > 0}
+    base = urlparse(url)
+    recorder = Recorder()
+    start = time.monotonic()
+    warmup_until = start + warmup
+    deadline = warmup_until + duration
+    threads = [
+        threading.Thread(target=_worker, args=(base, mix, deadline, warmup_until, recorder, seed + i, timeout),
+                         daemon=True)
+        for i in range(concurrency)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    measured = max(1e-9, time.monotonic() - warmup_until)
+
+    routes = {}
+    total = 0
+    for route, samples in sorted(recorder.samples.items()):
+        samples.sort()
+        total += len(samples)
+        routes[route] = {
+            'requests': len(samples),
+            'errors': recorder.errors.get(route, 0),
+            'status': recorder.statuses.get(route, {}),
+            'rps': round(len(samples) / measured, 1),
+            'mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+            'p50_ms': round(percentile(samples, 50) * 1000, 2),
+            'p95_ms': round(percentile(samples, 95) * 1000, 2),
+            'p99_ms': round(percentile(samples, 99) * 1000, 2),
+            'max_ms': round(samples[-1] * 1000, 2),
+        }
+    return {
+        'url': url,
+        'concurrency': concurrency,
+        'duration_s': round(measured, 2),
+        'warmup_s': warmup,
+        'mix': mix,
+        'json_backend': _json_backend(base, timeout),
+        'requests': total,
+        'rps': round(total / measured, 1),
+        'errors': sum(recorder.errors.values()),
+        'routes': routes,
+    }
+
+
+def _parse_mix(text: Optional[str]) -> Optional[Dict[str, int]]:
+    if not text:
+        return None
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise SystemExit(f'unknown route {name!r}; choose from {", ".join(DEFAULT_MIX)}')
+        try:
+            mix[name] = int(weight or 1)
+        except ValueError:
+            raise SystemExit(f'weight for {name!r} must be a whole number, not {weight.strip()!r}')
+        if mix[name] < 0:
+            raise SystemExit(f'weight for {name!r} cannot be negative')
+    # random.choices needs at least one positive weight
+    if not any(mix.values()):
+        raise SystemExit('the mix needs at least one route with a positive weight')
+    return mix
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Load-test a running AgriSpectra instance.')
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10.0, help='measured seconds (after warmup)')
+    parser.add_argument('--warmup', type=float, default=1.0)
+    parser.add_argument('--mix', help='route weights, e.g. api_risk=5,static=1 (default: realistic mix)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    report = run(args.url, args.concurrency, args.duration, args.warmup, _parse_mix(args.mix), args.seed, args.timeout)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as fh:
+            fh.write(text + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,307 @@
+"""Local stand-in for the Open-Meteo geocoding and forecast APIs.
+
+Serves the two endpoints `app.py` uses (`/v1/search` and `/v1/forecast`)
+with deterministic synthetic data, plus configurable latency, error and
+timeout injection, so caching, deadlines and pooling can be benchmarked
+offline and reproducibly.
+
+Run it and point the app at it:
+
+    python openmeteo_stub.py --port 8090 --latency lognormal:120,0.6 --error-rate 0.02
+    AGRISPECTRA_GEOCODING_URL=http://127.0.0.1:8090/v1/search \\
+    AGRISPECTRA_FORECAST_URL=http://127.0.0.1:8090/v1/forecast python app.py
+
+Latency specs (milliseconds): `none`, `fixed:MS`, `uniform:LO,HI`,
+`normal:MEAN,SD`, `lognormal:MEDIAN,SIGMA`, `exp:MEAN`.
+`GET /__stats` returns request, error and timeout counters.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+
+# A few well-known places so demos resolve to sensible spots; anything else
+# is hashed to a stable point inside India.
+GAZETTEER = {
+    'delhi': ('Delhi', 'Delhi', 28.61, 77.21),
+    'mumbai': ('Mumbai', 'Maharashtra', 19.08, 72.88),
+    'pune': ('Pune', 'Maharashtra', 18.52, 73.86),
+    'kolkata': ('Kolkata', 'West Bengal', 22.57, 88.36),
+    'chennai': ('Chennai', 'Tamil Nadu', 13.08, 80.27),
+    'bengaluru': ('Bengaluru', 'Karnataka', 12.97, 77.59),
+    'hyderabad': ('Hyderabad', 'Telangana', 17.39, 78.49),
+    'cuttack': ('Cuttack', 'Odisha', 20.46, 85.88),
+    'patna': ('Patna', 'Bihar', 25.59, 85.14),
+    'jaipur': ('Jaipur', 'Rajasthan', 26.91, 75.79),
+    'ludhiana': ('Ludhiana', 'Punjab', 30.90, 75.86),
+    'guwahati': ('Guwahati', 'Assam', 26.14, 91.74),
+}
+
+INDIA_BOUNDS = ((8.0, 35.0), (68.0, 97.0))
+
+# Names starting with this prefix are never found (exercises the 404 path)
+UNKNOWN_PREFIX = 'zz'
+
+
+def _seed(*parts) -> int:
+    digest = hashlib.sha256('|'.join(str(p) for p in parts).encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big')
+
+
+# kind -> (argument names, arguments that must be strictly positive)
+LATENCY_KINDS = {
+    'none': ((), ()),
+    'fixed': (('MS',), ()),
+    'uniform': (('LO', 'HI'), ()),
+    'normal': (('MEAN', 'SD'), ()),
+    'lognormal': (('MEDIAN', 'SIGMA'), ('MEDIAN',)),
+    'exp': (('MEAN',), ('MEAN',)),
+}
+
+
+def parse_latency(spec: str, rng: random.Random) -> Callable[[], float]:
+    """Turn a latency spec into a sampler returning seconds.
+
+    The spec is checked up front so a typo fails when the stub starts
+    rather than on the first request.
+    """
+    kind, _, args = (spec or 'none').partition(':')
+    if kind not in LATENCY_KINDS:
+        raise ValueError(f'unknown latency spec {spec!r}; expected one of {", ".join(LATENCY_KINDS)}')
+    names, positive = LATENCY_KINDS[kind]
+    usage = kind + (':' + ','.join(names) if names else '')
+    try:
+        values = [float(x) for x in args.split(',') if x.strip()]
+    except ValueError:
+        raise ValueError(f'latency spec {spec!r} must be {usage} with numbers in milliseconds') from None
+    if len(values) != len(names):
+        raise ValueError(f'latency spec {spec!r} must be {usage}')
+    for name, value in zip(names, values):
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f'latency spec {spec!r}: {name} must be a non-negative number')
+        if name in positive and value == 0:
+            raise ValueError(f'latency spec {spec!r}: {name} must be greater than zero')
+    if kind == 'uniform' and values[0] > values[1]:
+        raise ValueError(f'latency spec {spec!r}: LO must not exceed HI')
+
+    if kind == 'none':
+        return lambda: 0.0
+    if kind == 'fixed':
+        return lambda: values[0] / 1000.0
+    if kind == 'uniform':
+        return lambda: rng.uniform(values[0], values[1]) / 1000.0
+    if kind == 'normal':
+        return lambda: max(0.0, rng.gauss(values[0], values[1])) / 1000.0
+    if kind == 'lognormal':
+        mu = math.log(values[0])
+        return lambda: rng.lognormvariate(mu, values[1]) / 1000.0
+    return lambda: rng.expovariate(1.0 / values[0]) / 1000.0
+
+
+class StubConfig:
+    def __init__(
+        self,
+        latency: str = 'none',
+        error_rate: float = 0.0,
+        timeout_rate: float = 0.0,
+        timeout_seconds: float = 30.0,
+        hazard_rate: float = 0.05,
+        seed: int = 0,
+    ):
+        self.rng = random.Random(seed)
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency, self.rng)
+        self.error_rate = error_rate
+        self.timeout_rate = timeout_rate
+        self.timeout_seconds = timeout_seconds
+        self.hazard_rate = hazard_rate
+        self.seed = seed
+        self.lock = threading.Lock()
+        self.counters = {'requests': 0, 'errors': 0, 'timeouts': 0, 'geocode': 0, 'forecast': 0}
+
+    def count(self, key: str) -> None:
+        with self.lock:
+            self.counters[key] += 1
+
+    def draw(self):
+        # the rng is shared between handler threads
+        with self.lock:
+            return self.rng.random(), self.sample_latency()
+
+
+def geocode(name: str) -> List[Dict]:
+    key = ' '.join((name or '').lower().split())
+    if not key or key.startswith(UNKNOWN_PREFIX):
+        return []
+    if key in GAZETTEER:
+        label, admin1, lat, lon = GAZETTEER[key]
+    else:
+        rng = random.Random(_seed('place', key))
+        (lat_lo, lat_hi), (lon_lo, lon_hi) = INDIA_BOUNDS
+        label, admin1 = name.strip().title(), 'Stub State'
+        lat, lon = round(rng.uniform(lat_lo, lat_hi), 4), round(rng.uniform(lon_lo, lon_hi), 4)
+    return [{
+        'id': _seed('id', key) % 10_000_000,
+        'name': label,
+        'latitude': lat,
+        'longitude': lon,
+        'country_code': 'IN',
+        'country': 'India',
+        'admin1': admin1,
+        'timezone': 'Asia/Kolkata',
+    }]
+
+
+def daily_series(lat: float, lon: float, fields: List[str], days: int, hazard_rate: float, seed: int) -> Dict:
+    """Deterministic daily values for one location (same input, same output)."""
+    start = date(2025, 1, 1)
+    out: Dict[str, List] = {'time': [(start + timedelta(days=i)).isoformat() for i in range(days)]}
+    base_temp = 34.0 - 0.45 * abs(lat - 10.0)
+    base_rh = 55.0 + 15.0 * math.sin(math.radians(lon * 4))
+    temps, rhs, rain, wind, codes = [], [], [], [], []
+    for i in range(days):
+        rng = random.Random(_seed(seed, round(lat, 2), round(lon, 2), i))
+        temps.append(round(base_temp + rng.gauss(0, 2.0), 1))
+        rhs.append(round(min(100.0, max(10.0, base_rh + rng.gauss(0, 8.0))), 1))
+        stormy = rng.random() < hazard_rate
+        rain.append(round(rng.uniform(50, 140) if stormy else rng.expovariate(1 / 4.0), 1))
+        wind.append(round(rng.uniform(55, 90) if stormy else rng.uniform(5, 35), 1))
+        codes.append(rng.choice((95, 96, 99, 65)) if stormy else rng.choice((0, 1, 2, 3, 61)))
+    columns = {
+        'temperature_2m_mean': temps,
+        'relative_humidity_2m_mean': rhs,
+        'precipitation_sum': rain,
+        'windspeed_10m_max': wind,
+        'weathercode': codes,
+    }
+    for field in fields:
+        if field in columns:
+            out[field] = columns[field]
+    return out
+
+
+def _floats(text: Optional[str]) -> List[float]:
+    return [float(x) for x in (text or '').split(',') if x.strip()]
+
+
+def make_handler(config: StubConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if url.path == '/__stats':
+                with config.lock:
+                    stats = dict(config.counters)
+                return self._send(200, {**stats, 'latency': config.latency_spec,
+                                        'error_rate': config.error_rate, 'timeout_rate': config.timeout_rate})
+
+            config.count('requests')
+            roll, delay = config.draw()
+            if roll < config.timeout_rate:
+                config.count('timeouts')
+                time.sleep(config.timeout_seconds)
+                return self._send(504, {'error': True, 'reason': 'stub timeout'})
+            time.sleep(delay)
+            if roll < config.timeout_rate + config.error_rate:
+                config.count('errors')
+                return self._send(500, {'error': True, 'reason': 'stub injected error'})
+
+            if url.path == '/v1/search':
+                config.count('geocode')
+                return self._send(200, {'results': geocode(query.get('name', '')), 'generationtime_ms': 0.1})
+
+            if url.path == '/v1/forecast':
+                config.count('forecast')
+                try:
+                    lats, lons = _floats(query.get('latitude')), _floats(query.get('longitude'))
+                    days = int(query.get('forecast_days', 7))
+                except ValueError:
+                    # answer like the real API rather than dropping the connection
+                    return self._send(400, {'error': True, 'reason': 'Cannot parse query parameters'})
+                if not lats or len(lats) != len(lons):
+                    return self._send(400, {'error': True, 'reason': 'latitude/longitude mismatch'})
+                if not 0 <= days <= 16:
+                    return self._send(400, {'error': True, 'reason': 'forecast_days must be between 0 and 16'})
+                fields = [f for f in query.get('daily', '').split(',') if f]
+                items = [
+                    {
+                        'latitude': lat,
+                        'longitude': lon,
+                        'timezone': 'Asia/Kolkata',
+                        'daily': daily_series(lat, lon, fields, days, config.hazard_rate, config.seed),
+                    }
+                    for lat, lon in zip(lats, lons)
+                ]
+                return self._send(200, items[0] if len(items) == 1 else items)
+
+            return self._send(404, {'error': True, 'reason': 'not found'})
+
+    return Handler
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8090, config: Optional[StubConfig] = None) -> ThreadingHTTPServer:
+    """Build (but do not start) a stub server; call `serve_forever()` in a thread."""
+    server = ThreadingHTTPServer((host, port), make_handler(config or StubConfig()))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local Open-Meteo stand-in for offline testing.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8090)
+    parser.add_argument('--latency', default='none', help='e.g. fixed:50, uniform:20,200, lognormal:120,0.6')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of requests answered with HTTP 500')
+    parser.add_argument('--timeout-rate', type=float, default=0.0, help='fraction of requests that stall')
+    parser.add_argument('--timeout-seconds', type=float, default=30.0, help='how long a stalled request hangs')
+    parser.add_argument('--hazard-rate', type=float, default=0.05, help='fraction of forecast days with storms')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        config = StubConfig(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            timeout_rate=args.timeout_rate,
+            timeout_seconds=args.timeout_seconds,
+            hazard_rate=args.hazard_rate,
+            seed=args.seed,
+        )
+    except ValueError as exc:
+        parser.error(str(exc))
+    server = make_server(args.host, args.port, config)
+    print(f'Open-Meteo stub listening on http://{args.host}:{args.port} (latency={args.latency})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
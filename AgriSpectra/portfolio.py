@@ -0,0 +1,274 @@
+"""Warehouse inventory portfolios with incrementally maintained risk totals.
+
+A `Portfolio` holds the lots of one warehouse. Each lot is scored once with
+`risk_engine.compute_risk` when it is added or its conditions change, and
+its contribution is swapped in and out of the running totals, so reading
+the dashboard summary never rescores the inventory. Lots are indexed by
+(crop, region, level) for grouped views.
+
+`tick(days)` ages every lot in one batched pass: lots that share the same
+conditions are scored once per pass.
+"""
+
+from __future__ import annotations
+
+import heapq
+import math
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import risk_engine
+from eligibility_engine import normalize_risk_level
+
+
+LEVELS = ('SAFE', 'MODERATE', 'HIGH', 'CRITICAL')
+
+# Fields that feed compute_risk; changing any of them rescores the lot
+CONDITION_FIELDS = ('crop_type', 'region', 'temperature', 'humidity', 'season', 'storage_days')
+
+
+class PortfolioError(ValueError):
+    pass
+
+
+# amounts and ages cannot go below zero; temperature and humidity are left to the engine
+NON_NEGATIVE_FIELDS = ('storage_days', 'quantity', 'value')
+
+
+def _to_number(value, field: str) -> float:
+    try:
+        number = float(value or 0)
+    except (TypeError, ValueError):
+        raise PortfolioError(f'{field} must be a number')
+    # one NaN would poison the running totals for good (NaN - NaN is still NaN)
+    if not math.isfinite(number):
+        raise PortfolioError(f'{field} must be a finite number')
+    if number < 0 and field in NON_NEGATIVE_FIELDS:
+        raise PortfolioError(f'{field} cannot be negative')
+    return number
+
+
+def _score_conditions(conditions: Tuple) -> Tuple[float, str]:
+    res = risk_engine.compute_risk(dict(zip(CONDITION_FIELDS, conditions)))
+    # the rice/paddy branch reports a percentage on the same 0-100 scale
+    score = res.get('risk_score', res.get('risk_percentage', 0.0))
+    return float(score), normalize_risk_level(res.get('risk_level') or '')
+
+
+def _index_key(lot: Dict) -> Tuple[str, str, str]:
+    # crop and region lookups are case-insensitive everywhere else in the app
+    return lot['crop_type'].lower(), lot['region'].lower(), lot['risk_level']
+
+
+def _empty_totals() -> Dict:
+    return {level: {'lots': 0, 'quantity': 0.0, 'value': 0.0} for level in LEVELS}
+
+
+class Portfolio:
+    def __init__(self, warehouse_id: str):
+        self.warehouse_id = warehouse_id
+        self._lots: Dict[str, Dict] = {}
+        self._index: Dict[Tuple[str, str, str], set] = {}
+        self._by_level = _empty_totals()
+        self._weighted_score = 0.0
+        self._total_value = 0.0
+        self._total_quantity = 0.0
+        self._lock = threading.Lock()
+
+    # ---- incremental bookkeeping ------------------------------------
+
+    def _add_contribution(self, lot: Dict) -> None:
+        key = _index_key(lot)
+        self._index.setdefault(key, set()).add(lot['lot_id'])
+        totals = self._by_level.setdefault(lot['risk_level'], {'lots': 0, 'quantity': 0.0, 'value': 0.0})
+        totals['lots'] += 1
+        totals['quantity'] += lot['quantity']
+        totals['value'] += lot['value']
+        self._weighted_score += lot['value'] * lot['risk_score']
+        self._total_value += lot['value']
+        self._total_quantity += lot['quantity']
+
+    def _remove_contribution(self, lot: Dict) -> None:
+        key = _index_key(lot)
+        members = self._index.get(key)
+        if members is not None:
+            members.discard(lot['lot_id'])
+            if not members:
+                del self._index[key]
+        totals = self._by_level[lot['risk_level']]
+        totals['lots'] -= 1
+        totals['quantity'] -= lot['quantity']
+        totals['value'] -= lot['value']
+        self._weighted_score -= lot['value'] * lot['risk_score']
+        self._total_value -= lot['value']
+        self._total_quantity -= lot['quantity']
+
+    @staticmethod
+    def _conditions(lot: Dict) -> Tuple:
+        return tuple(lot[f] for f in CONDITION_FIELDS)
+
+    # ---- public API --------------------------------------------------
+
+    def _prepare(self, payload: Dict, current: Optional[Dict]) -> Dict:
+        """The lot `payload` turns `current` (None for a new lot) into, scored; changes nothing."""
+        lot = dict(current) if current else {
+            'lot_id': payload['lot_id'],
+            'crop_type': '',
+            'region': 'North',
+            'temperature': 0.0,
+            'humidity': 0.0,
+            'season': 'Post-harvest',
+            'storage_days': 0,
+            'quantity': 0.0,
+            'value': 0.0,
+        }
+        for field in ('crop_type', 'region', 'season'):
+            if payload.get(field):
+                lot[field] = str(payload[field]).strip()
+        for field in ('temperature', 'humidity', 'quantity', 'value'):
+            if payload.get(field) is not None:
+                lot[field] = _to_number(payload[field], field)
+        if payload.get('storage_days') is not None:
+            lot['storage_days'] = int(_to_number(payload['storage_days'], 'storage_days'))
+        if not lot['crop_type']:
+            raise PortfolioError('crop_type is required')
+
+        if current is None or self._conditions(current) != self._conditions(lot):
+            lot['risk_score'], lot['risk_level'] = _score_conditions(self._conditions(lot))
+        return lot
+
+    def _apply(self, lot: Dict) -> None:
+        current = self._lots.get(lot['lot_id'])
+        if current is not None:
+            self._remove_contribution(current)
+        self._lots[lot['lot_id']] = lot
+        self._add_contribution(lot)
+
+    def upsert(self, payload: Dict) -> Dict:
+        """Add a lot or merge changes into an existing one, rescoring only if needed."""
+        return self.upsert_many([payload])[0]
+
+    def upsert_many(self, payloads: List[Dict]) -> List[Dict]:
+        """Upsert several lots as one change: if any lot is invalid, none is applied."""
+        with self._lock:
+            staged: Dict[str, Dict] = {}
+            order = []
+            for i, payload in enumerate(payloads):
+                where = f'lots[{i}]: ' if len(payloads) > 1 else ''
+                if not isinstance(payload, dict):
+                    raise PortfolioError(f'{where}each lot must be an object')
+                lot_id = str(payload.get('lot_id') or '').strip()
+                if not lot_id:
+                    raise PortfolioError(f'{where}lot_id is required')
+                try:
+                    # a lot named twice in one batch builds on its earlier entry
+                    current = staged.get(lot_id) or self._lots.get(lot_id)
+                    staged[lot_id] = self._prepare({**payload, 'lot_id': lot_id}, current)
+                except PortfolioError as exc:
+                    raise PortfolioError(f'{where}{exc}')
+                order.append(lot_id)
+            for lot in staged.values():
+                self._apply(lot)
+            return [dict(staged[lot_id]) for lot_id in order]
+
+    def get(self, lot_id: str) -> Optional[Dict]:
+        with self._lock:
+            lot = self._lots.get(lot_id)
+            return dict(lot) if lot else None
+
+    def remove(self, lot_id: str) -> bool:
+        with self._lock:
+            lot = self._lots.pop(lot_id, None)
+            if lot is None:
+                return False
+            self._remove_contribution(lot)
+            return True
+
+    def tick(self, days: int = 1) -> Dict:
+        """Age every lot by `days` and rescore, grouping identical conditions."""
+        with self._lock:
+            memo: Dict[Tuple, Tuple[float, str]] = {}
+            for lot in self._lots.values():
+                lot['storage_days'] += days
+                conditions = self._conditions(lot)
+                scored = memo.get(conditions)
+                if scored is None:
+                    scored = memo[conditions] = _score_conditions(conditions)
+                lot['risk_score'], lot['risk_level'] = scored
+
+            # one rebuild is cheaper than remove/add per lot when everything moves
+            self._index = {}
+            self._by_level = _empty_totals()
+            self._weighted_score = self._total_value = self._total_quantity = 0.0
+            for lot in self._lots.values():
+                self._add_contribution(lot)
+            return {'lots_aged': len(self._lots), 'distinct_conditions': len(memo), 'days': days}
+
+    def lots(self, crop: Optional[str] = None, region: Optional[str] = None, level: Optional[str] = None) -> List[Dict]:
+        with self._lock:
+            ids: Iterable[str] = (
+                lot_id
+                for (c, r, lv), members in self._index.items()
+                if (crop is None or c == crop.strip().lower())
+                and (region is None or r == region.strip().lower())
+                and (level is None or lv == level.strip().upper())
+                for lot_id in members
+            )
+            return [dict(self._lots[i]) for i in ids]
+
+    def summary(self, top: int = 10) -> Dict:
+        with self._lock:
+            most_at_risk = heapq.nlargest(
+                top, self._lots.values(), key=lambda lot: (lot['risk_score'], lot['value'])
+            )
+            groups = [
+                {'crop_type': c, 'region': r, 'risk_level': lv, 'lots': len(members)}
+                for (c, r, lv), members in sorted(self._index.items())
+            ]
+            return {
+                'warehouse_id': self.warehouse_id,
+                'lots': len(self._lots),
+                'total_quantity': round(self._total_quantity, 2),
+                'total_value': round(self._total_value, 2),
+                'exposure_by_level': {
+                    level: {k: round(v, 2) if isinstance(v, float) else v for k, v in totals.items()}
+                    for level, totals in self._by_level.items()
+                },
+                'value_weighted_risk': (
+                    round(self._weighted_score / self._total_value, 1) if self._total_value > 0 else None
+                ),
+                'most_at_risk': [dict(lot) for lot in most_at_risk],
+                'groups': groups,
+            }
+
+
+_portfolios: Dict[str, Portfolio] = {}
+_registry_lock = threading.Lock()
+
+
+def get_portfolio(warehouse_id: str, create: bool = True) -> Optional[Portfolio]:
+    with _registry_lock:
+        portfolio = _portfolios.get(warehouse_id)
+        if portfolio is None and create:
+            portfolio = _portfolios[warehouse_id] = Portfolio(warehouse_id)
+        return portfolio
+
+
+def upsert_lots(warehouse_id: str, payloads: List[Dict]) -> Tuple[Portfolio, List[Dict]]:
+    """Upsert a batch into a warehouse, creating the warehouse only if the batch is valid."""
+    with _registry_lock:
+        book = _portfolios.get(warehouse_id)
+        if book is None:
+            book = Portfolio(warehouse_id)
+            # raises before the new warehouse is registered, so a rejected batch leaves nothing behind
+            lots = book.upsert_many(payloads)
+            _portfolios[warehouse_id] = book
+            return book, lots
+    return book, book.upsert_many(payloads)
+
+
+def tick_all(days: int = 1) -> Dict:
+    """Daily job: age every warehouse's inventory."""
+    with _registry_lock:
+        portfolios = list(_portfolios.values())
+    return {p.warehouse_id: p.tick(days) for p in portfolios}
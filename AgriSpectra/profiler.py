@@ -0,0 +1,434 @@
+"""Opt-in profiling of live requests, with flamegraph output.
+
+Disabled unless AGRISPECTRA_PROFILE_TOKEN is set; `install(app)` then adds
+the request hooks, otherwise it adds nothing and requests pay nothing.
+
+A request sent with ``X-AgriSpectra-Profile: <token>`` is profiled on its
+own thread, from the first request hook to the response being built:
+
+    sample   (default) a background thread records the request thread's
+             stack every AGRISPECTRA_PROFILE_INTERVAL_MS (default 2)
+    cprofile with ``X-AgriSpectra-Profile-Mode: cprofile``, deterministic
+             per-function call counts and times (slower while it runs);
+             one at a time, a request asking while another runs is sampled
+
+The response carries ``X-AgriSpectra-Profile-Id``; fetch the trace from
+`/api/profile/<id>` with the same header. `window(seconds)` samples every
+thread for a fixed time instead (`POST /api/profile/window`). At most
+AGRISPECTRA_PROFILE_RATE profiles start per minute (default 10); beyond
+that requests are served unprofiled with ``X-AgriSpectra-Profile:
+rate-limited``.
+
+Each trace splits its samples into upstream I/O, engine, render (Jinja),
+json and other by the innermost frame that belongs to one of them, and
+its stacks export in the collapsed format read by flamegraph.pl,
+speedscope and inferno (``frame;frame;frame count`` per line).
+
+Profiling never fails a request: an error while starting or finishing a
+trace is counted (`errors` in `stats()`) and the request is served as if it
+had not been profiled.
+"""
+
+from __future__ import annotations
+
+import hmac
+import itertools
+import logging
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+HEADER = 'X-AgriSpectra-Profile'
+MODE_HEADER = 'X-AgriSpectra-Profile-Mode'
+ID_HEADER = 'X-AgriSpectra-Profile-Id'
+MAX_WINDOW_SECONDS = 30.0
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# category -> modules (and their submodules) whose frames count towards it
+CATEGORIES = (
+    ('json', ('fastjson', 'json', 'flask.json')),
+    ('render', ('jinja2', 'markupsafe')),
+    ('upstream', ('forecast_cache', 'socket', 'ssl', 'http.client', 'urllib.request')),
+    ('engine', ('risk_engine', 'eligibility_engine', 'hazard_engine', 'crop_rules', 'risk_distribution',
+                'portfolio', 'bulk_eligibility', 'thresholds', 'climatology', 'schema')),
+)
+BREAKDOWN_KEYS = tuple(name for name, _ in CATEGORIES) + ('other',)
+
+_frames: Dict = {}
+
+logger = logging.getLogger(__name__)
+
+
+def _module_name(filename: str) -> str:
+    """Dotted module name for a source file ('flask.app', 'socket', 'risk_engine')."""
+    if filename.startswith('<'):
+        return filename
+    path = os.path.abspath(filename)
+    roots = sorted({APP_DIR, *(os.path.abspath(p) for p in sys.path if p)}, key=len, reverse=True)
+    for root in roots:
+        if path.startswith(root + os.sep):
+            relative = os.path.splitext(path[len(root) + 1:])[0]
+            parts = relative.split(os.sep)
+            if parts[-1] == '__init__':
+                parts.pop()
+            return '.'.join(parts)
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _describe(filename: str, name: str) -> Tuple[str, Optional[str]]:
+    """(flamegraph label, category) for a function; cached."""
+    found = _frames.get((filename, name))
+    if found is not None:
+        return found
+    module = _module_name(filename)
+    category = None
+    for candidate, modules in CATEGORIES:
+        if any(module == m or module.startswith(m + '.') for m in modules):
+            category = candidate
+            break
+    found = _frames[filename, name] = (f'{module}:{name}', category)
+    return found
+
+
+def _stack(frame) -> Tuple[Tuple[str, ...], str]:
+    """Labels from the outermost frame in, and the category of the innermost categorised frame."""
+    labels: List[str] = []
+    category = None
+    while frame is not None:
+        code = frame.f_code
+        label, frame_category = _describe(code.co_filename, code.co_name)
+        labels.append(label)
+        if category is None:
+            category = frame_category
+        if code.co_name == 'full_dispatch_request':
+            # the server and WSGI frames below Flask's dispatch are the same for every request
+            break
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels), category or 'other'
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class _Sampler(threading.Thread):
+    """Records the stacks of `thread_id` (when None, every thread but itself and `skip`) until stopped."""
+
+    def __init__(self, thread_id: Optional[int], interval: float, skip: Optional[int] = None):
+        super().__init__(name='profile-sampler', daemon=True)
+        self.thread_id = thread_id
+        self.interval = interval
+        self.skip = skip
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.samples = 0
+        self._done = threading.Event()
+
+    def run(self) -> None:
+        own = threading.get_ident()
+        while not self._done.wait(self.interval):
+            frames = sys._current_frames()
+            if self.thread_id is not None:
+                picked = [frames.get(self.thread_id)]
+            else:
+                picked = [f for tid, f in frames.items() if tid != own and tid != self.skip]
+            for frame in picked:
+                if frame is None:
+                    continue
+                stack, category = _stack(frame)
+                self.stacks[stack] += 1
+                self.categories[category] += 1
+                self.samples += 1
+            del frames, picked
+
+    def finish(self) -> None:
+        self._done.set()
+        self.join()
+
+
+class Trace:
+    __slots__ = ('id', 'kind', 'mode', 'method', 'path', 'status', 'started', 'wall_ms', 'interval_ms',
+                 'samples', 'stacks', 'categories', 'functions')
+
+    def __init__(self, trace_id: str, kind: str, mode: str, interval: float, method: str = None, path: str = None):
+        self.id = trace_id
+        self.kind = kind
+        self.mode = mode
+        self.method = method
+        self.path = path
+        self.status = None
+        self.started = _now_iso()
+        self.wall_ms = 0.0
+        self.interval_ms = round(interval * 1000, 3) if mode == 'sample' else None
+        self.samples = 0
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        # cprofile: (label, calls, own seconds, cumulative seconds)
+        self.functions: List[Tuple[str, int, float, float]] = []
+
+    def collapsed(self) -> str:
+        """Flamegraph input; cprofile traces export one frame per function weighted by own microseconds."""
+        if self.mode == 'cprofile':
+            rows = ((label, int(own * 1e6)) for label, _, own, _ in self.functions)
+            return ''.join(f'{label} {weight}\n' for label, weight in rows if weight)
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in self.stacks.most_common())
+
+    def summary(self, top: int = 0) -> Dict:
+        total = sum(self.categories.values())
+        out = {
+            'id': self.id,
+            'kind': self.kind,
+            'mode': self.mode,
+            'method': self.method,
+            'path': self.path,
+            'status': self.status,
+            'started': self.started,
+            'wall_ms': self.wall_ms,
+            'interval_ms': self.interval_ms,
+            'samples': self.samples,
+            'breakdown': {k: round(self.categories[k] / total, 3) if total else 0.0 for k in BREAKDOWN_KEYS},
+        }
+        if top and self.mode == 'cprofile':
+            ranked = sorted(self.functions, key=lambda f: f[3], reverse=True)[:top]
+            out['functions'] = [{'function': label, 'calls': calls, 'own_ms': round(own * 1000, 3),
+                                 'cumulative_ms': round(cum * 1000, 3)} for label, calls, own, cum in ranked]
+        elif top:
+            leaves = Counter()
+            for stack, count in self.stacks.items():
+                leaves[stack[-1]] += count
+            out['functions'] = [{'function': label, 'samples': count, 'share': round(count / self.samples, 3)}
+                                for label, count in leaves.most_common(top)]
+        return out
+
+
+def _cprofile_functions(profile) -> Tuple[List[Tuple[str, int, float, float]], Counter]:
+    import pstats
+
+    functions = []
+    categories: Counter = Counter()
+    for (filename, _, name), (_, calls, own, cum, _) in pstats.Stats(profile).stats.items():
+        if filename == '~':
+            # built-ins such as socket recv show up as '~' with the name in angle brackets
+            label, category = f'builtins:{name.strip("<>")}', None
+        else:
+            label, category = _describe(filename, name)
+        functions.append((label, calls, own, cum))
+        # own time in microseconds stands in for samples in the breakdown
+        categories[category or 'other'] += int(own * 1e6)
+    return functions, categories
+
+
+class Profiler:
+    """Rate-limited request and window profiling; keeps the last `keep` traces."""
+
+    def __init__(self, token: str, rate_per_minute: float = 10.0, interval: float = 0.002, keep: int = 50):
+        self.token = token
+        self.rate_per_minute = rate_per_minute
+        self.interval = interval
+        self._traces: deque = deque(maxlen=keep)
+        self._lock = threading.Lock()
+        self._window_lock = threading.Lock()
+        # cProfile hooks the interpreter, and overlapping traces would mix each other's calls
+        self._cprofile_lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self._allowance = rate_per_minute
+        self._refilled = time.monotonic()
+        self.started = 0
+        self.rate_limited = 0
+        self.rejected = 0
+        self.cprofile_busy = 0
+        self.errors = 0
+
+    def authorized(self, value: Optional[str]) -> bool:
+        ok = bool(value) and hmac.compare_digest(value.encode('utf-8'), self.token.encode('utf-8'))
+        if value and not ok:
+            self.rejected += 1
+        return ok
+
+    def _admit(self) -> bool:
+        # token bucket: rate_per_minute profiles, refilled continuously
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.rate_per_minute,
+                                  self._allowance + (now - self._refilled) * self.rate_per_minute / 60.0)
+            self._refilled = now
+            if self._allowance < 1.0:
+                self.rate_limited += 1
+                return False
+            self._allowance -= 1.0
+            self.started += 1
+            return True
+
+    def _new_trace(self, kind: str, mode: str, **request) -> Trace:
+        return Trace(f'{int(time.time())}-{next(self._ids)}', kind, mode, self.interval, **request)
+
+    def _store(self, trace: Trace) -> None:
+        with self._lock:
+            self._traces.append(trace)
+
+    def begin(self, mode: str, method: str, path: str):
+        """Start profiling the current thread; returns a handle for `end` or None when rate limited."""
+        if not self._admit():
+            return None
+        collector = None
+        if (mode or '').strip().lower() == 'cprofile':
+            collector = self._start_cprofile()
+        if collector is not None:
+            trace = self._new_trace('request', 'cprofile', method=method, path=path)
+        else:
+            trace = self._new_trace('request', 'sample', method=method, path=path)
+            collector = _Sampler(threading.get_ident(), self.interval)
+            collector.start()
+        return trace, collector, time.perf_counter()
+
+    def _start_cprofile(self):
+        """An enabled cProfile collector holding the cProfile lock, or None to sample instead."""
+        if not self._cprofile_lock.acquire(blocking=False):
+            with self._lock:
+                self.cprofile_busy += 1
+            return None
+        try:
+            # imported on first use to keep it out of start-up
+            import cProfile
+
+            collector = cProfile.Profile()
+            collector.enable()
+            return collector
+        except Exception as exc:
+            # e.g. another profiler already owns the interpreter's profile hook
+            self._cprofile_lock.release()
+            self.failed('cprofile', exc)
+            return None
+
+    def end(self, handle, status: Optional[int] = None) -> Trace:
+        trace, collector, began = handle
+        if trace.mode == 'cprofile':
+            try:
+                collector.disable()
+            finally:
+                self._cprofile_lock.release()
+            trace.wall_ms = round((time.perf_counter() - began) * 1000, 3)
+            trace.functions, trace.categories = _cprofile_functions(collector)
+        else:
+            collector.finish()
+            trace.wall_ms = round((time.perf_counter() - began) * 1000, 3)
+            trace.samples, trace.stacks, trace.categories = collector.samples, collector.stacks, collector.categories
+        trace.status = status
+        self._store(trace)
+        return trace
+
+    def window(self, seconds: float) -> Optional[Trace]:
+        """Sample every thread for `seconds`; None when rate limited or another window is running."""
+        seconds = max(0.01, min(float(seconds), MAX_WINDOW_SECONDS))
+        if not self._window_lock.acquire(blocking=False):
+            return None
+        try:
+            if not self._admit():
+                return None
+            trace = self._new_trace('window', 'sample')
+            # the caller only sleeps; leave it out
+            sampler = _Sampler(None, self.interval, skip=threading.get_ident())
+            began = time.perf_counter()
+            sampler.start()
+            time.sleep(seconds)
+            sampler.finish()
+            trace.wall_ms = round((time.perf_counter() - began) * 1000, 3)
+            trace.samples, trace.stacks, trace.categories = sampler.samples, sampler.stacks, sampler.categories
+            self._store(trace)
+            return trace
+        finally:
+            self._window_lock.release()
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            return next((t for t in self._traces if t.id == trace_id), None)
+
+    def traces(self, path: Optional[str] = None) -> List[Trace]:
+        with self._lock:
+            found = list(self._traces)
+        return [t for t in reversed(found) if path is None or t.path == path]
+
+    def collapsed(self, traces: Iterable[Trace]) -> str:
+        """Sampled stacks of `traces` merged into one flamegraph."""
+        merged: Counter = Counter()
+        for trace in traces:
+            if trace.mode == 'sample':
+                merged.update(trace.stacks)
+        return ''.join(f'{";".join(stack)} {count}\n' for stack, count in merged.most_common())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            stored = len(self._traces)
+        return {
+            'enabled': True,
+            'rate_per_minute': self.rate_per_minute,
+            'interval_ms': round(self.interval * 1000, 3),
+            'traces': stored,
+            'started': self.started,
+            'rate_limited': self.rate_limited,
+            'rejected': self.rejected,
+            'cprofile_busy': self.cprofile_busy,
+            'errors': self.errors,
+        }
+
+    def failed(self, stage: str, exc: Exception) -> None:
+        logger.warning('profiler: %s failed: %s', stage, exc)
+        with self._lock:
+            self.errors += 1
+
+
+def install(app, token: Optional[str] = None) -> Optional[Profiler]:
+    """Add the profiling hooks to `app` when a token is configured; returns the profiler or None."""
+    token = token or os.environ.get('AGRISPECTRA_PROFILE_TOKEN')
+    if not token:
+        return None
+    profiler = Profiler(
+        token,
+        rate_per_minute=float(os.environ.get('AGRISPECTRA_PROFILE_RATE', '10')),
+        interval=float(os.environ.get('AGRISPECTRA_PROFILE_INTERVAL_MS', '2')) / 1000.0,
+    )
+    from flask import g, request
+
+    @app.before_request
+    def _start_profile():
+        value = request.headers.get(HEADER)
+        if value is None or request.path.startswith('/api/profile') or not profiler.authorized(value):
+            return
+        try:
+            g.profile = profiler.begin(request.headers.get(MODE_HEADER), request.method, request.path)
+        except Exception as exc:
+            profiler.failed('begin', exc)
+            return
+        g.profile_limited = g.profile is None
+
+    @app.after_request
+    def _finish_profile(response):
+        handle = g.pop('profile', None)
+        if handle is not None:
+            try:
+                trace = profiler.end(handle, response.status_code)
+            except Exception as exc:
+                profiler.failed('end', exc)
+            else:
+                response.headers[ID_HEADER] = trace.id
+        elif g.pop('profile_limited', False):
+            response.headers[HEADER] = 'rate-limited'
+        return response
+
+    @app.teardown_request
+    def _drop_profile(exc):
+        # the request failed before after_request; keep the trace of what ran
+        handle = g.pop('profile', None)
+        if handle is not None:
+            try:
+                profiler.end(handle, 500)
+            except Exception as exc:
+                profiler.failed('end', exc)
+
+    return profiler
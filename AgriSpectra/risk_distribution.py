@@ -0,0 +1,168 @@
+"""Risk as a distribution rather than a single score.
+
+`simulate()` draws correlated (temperature, RH) pairs around the given
+conditions, scores them all in one `risk_engine.score_inputs` pass and
+reports how likely each risk level is and the spread of scores. The spread
+comes from the caller (`temperature_sd`, `humidity_sd`, `correlation`),
+from a daily forecast series, or from defaults typical of a 10-day
+forecast.
+
+Every call reuses one fixed pool of standard-normal pairs (common random
+numbers), so the same request always gets the same answer, two requests
+that differ only in their inputs are compared on the same draws, and no
+random numbers are generated on the request path.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import risk_engine
+
+
+DEFAULT_SAMPLES = 2000
+MAX_SAMPLES = 20000
+
+# typical day-to-day spread of a 10-day forecast mean; warmer days tend to be drier
+DEFAULT_TEMPERATURE_SD = 1.5
+DEFAULT_HUMIDITY_SD = 6.0
+DEFAULT_CORRELATION = -0.4
+
+PERCENTILES = (5, 25, 50, 75, 95)
+
+class DistributionError(ValueError):
+    pass
+
+
+_POOL_SEED = 20240601
+_pool: Optional[Tuple[List[float], List[float]]] = None
+_pool_lock = threading.Lock()
+
+
+def _normal_pool() -> Tuple[List[float], List[float]]:
+    """MAX_SAMPLES independent standard-normal pairs, built once."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                rng = random.Random(_POOL_SEED)
+                gauss = rng.gauss
+                z1 = [gauss(0.0, 1.0) for _ in range(MAX_SAMPLES)]
+                z2 = [gauss(0.0, 1.0) for _ in range(MAX_SAMPLES)]
+                _pool = (z1, z2)
+    return _pool
+
+
+def _stdev(values: Sequence[float], mean: float) -> float:
+    if len(values) < 2:
+        return 0.0
+    return math.sqrt(sum((v - mean) ** 2 for v in values) / (len(values) - 1))
+
+
+def _finite(value) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def spread_from_series(temperatures: Sequence[float], humidities: Sequence[float]) -> Optional[Dict]:
+    """Standard deviations and correlation of a daily forecast series; days with a missing value are skipped."""
+    if not isinstance(temperatures, (list, tuple)) or not isinstance(humidities, (list, tuple)):
+        return None
+    pairs = [(t, h) for t, h in zip(temperatures, humidities) if _finite(t) and _finite(h)]
+    if len(pairs) < 2:
+        return None
+    temps = [t for t, _ in pairs]
+    rhs = [h for _, h in pairs]
+    mt = sum(temps) / len(temps)
+    mh = sum(rhs) / len(rhs)
+    st = _stdev(temps, mt)
+    sh = _stdev(rhs, mh)
+    corr = 0.0
+    if st > 0 and sh > 0:
+        cov = sum((t - mt) * (h - mh) for t, h in pairs) / (len(pairs) - 1)
+        corr = max(-1.0, min(1.0, cov / (st * sh)))
+    return {'temperature_sd': round(st, 2), 'humidity_sd': round(sh, 2), 'correlation': round(corr, 2)}
+
+
+def _number(value, default: float, low: float, high: float) -> float:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return default
+    if math.isnan(number):
+        return default
+    return max(low, min(high, number))
+
+
+def simulate(inputs, temperature_sd=None, humidity_sd=None, correlation=None,
+             samples=None, source: str = 'default') -> Dict:
+    """Level probabilities and score percentiles for a RiskInputs record under uncertainty."""
+    temp, rh = inputs.temperature, inputs.humidity
+    sd_t = _number(temperature_sd, DEFAULT_TEMPERATURE_SD, 0.0, 15.0)
+    sd_h = _number(humidity_sd, DEFAULT_HUMIDITY_SD, 0.0, 40.0)
+    rho = _number(correlation, DEFAULT_CORRELATION, -1.0, 1.0)
+    n = int(_number(samples, DEFAULT_SAMPLES, 1, MAX_SAMPLES))
+
+    z1, z2 = _normal_pool()
+    z1, z2 = z1[:n], z2[:n]
+    mix = math.sqrt(1.0 - rho * rho)
+    temps = [temp + sd_t * a for a in z1]
+    rhs = [rh + sd_h * (rho * a + mix * b) for a, b in zip(z1, z2)]
+    rhs = [100.0 if h > 100.0 else (0.0 if h < 0.0 else h) for h in rhs]
+
+    batch = risk_engine.score_inputs(inputs, temps, rhs)
+    summary = batch.summary(PERCENTILES)
+    return {
+        'samples': n,
+        'level_probabilities': {name: round(c / n, 3) for name, c in summary['counts'].items()},
+        'score_percentiles': {f'p{p}': score for p, score in summary['percentiles'].items()},
+        'mean_score': summary['mean'],
+        'assumed': {
+            'temperature_sd': sd_t,
+            'humidity_sd': sd_h,
+            'correlation': rho,
+            'source': source,
+        },
+    }
+
+
+def _series(forecast: Dict, key: str) -> List[float]:
+    values = forecast.get(key)
+    if values is None:
+        return []
+    if not isinstance(values, list) or not all(_finite(v) for v in values):
+        raise DistributionError(f'forecast.{key} must be a list of numbers')
+    return values
+
+
+def simulate_request(params: Dict, inputs=None) -> Optional[Dict]:
+    """`simulate()` configured from an API payload; None when the caller turned it off.
+
+    Payload keys: `distribution` (false to skip), `uncertainty`
+    ({temperature_sd, humidity_sd, correlation, samples}) and `forecast`
+    ({temperature: [...], humidity: [...]} daily values). `inputs` is the
+    payload's RiskInputs record when the caller already parsed it. Raises
+    DistributionError for a malformed forecast series.
+    """
+    if params.get('distribution') in (False, 'false', 'off', '0', 0):
+        return None
+    options = params.get('uncertainty') if isinstance(params.get('uncertainty'), dict) else {}
+    source = 'user' if options else 'default'
+    forecast = params.get('forecast') if isinstance(params.get('forecast'), dict) else None
+    if forecast:
+        temperatures, humidities = _series(forecast, 'temperature'), _series(forecast, 'humidity')
+        spread = spread_from_series(temperatures, humidities) if not options else None
+        if spread:
+            options, source = spread, 'forecast'
+    if inputs is None:
+        inputs = risk_engine.normalize_inputs(params)
+    return simulate(
+        inputs,
+        temperature_sd=options.get('temperature_sd'),
+        humidity_sd=options.get('humidity_sd'),
+        correlation=options.get('correlation'),
+        samples=options.get('samples'),
+        source=source,
+    )
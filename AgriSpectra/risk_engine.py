@@ -40,7 +40,10 @@ Outputs:
 - recommendations: list of actions
 """
 
-from math import fabs
+from functools import lru_cache
+
+import crop_rules
+import schema
 
 
 # Base crop thresholds (example values refined for Indian regions)
@@ -144,266 +147,74 @@ RESPIRATION_FACTOR = {
     'very_high': 1.5
 }
 
+# Evaluators for the rules above, built once at import. A threshold reload
+# compiles a new set and swaps it in with install_rules().
+_COMPILED = crop_rules.compile_rules(CROPS, REGION_ADJUSTMENTS, RESPIRATION_FACTOR)
+
+
+def install_rules(rules):
+    """Make `rules` (from crop_rules.compile_rules) the active tables.
+
+    The swap is a single reference assignment, so a call in flight finishes
+    on the tables it started with. Cached inversions are keyed by the rules
+    object and dropped here.
+    """
+    global _COMPILED, CROPS, REGION_ADJUSTMENTS, RESPIRATION_FACTOR
+    _COMPILED = rules
+    CROPS = rules.crops
+    REGION_ADJUSTMENTS = rules.region_adjustments
+    RESPIRATION_FACTOR = rules.respiration_factor
+    _days_to_levels.cache_clear()
+    _envelopes.cache_clear()
+    _comparison.cache_clear()
+
+
+def rules_version():
+    return _COMPILED.version
+
 
 def clamp(v, a, b):
     return max(a, min(b, v))
 
 
-def compute_risk(params):
-    # normalize inputs
-    crop = (params.get('crop_type') or '').lower()
-    region = params.get('region') or 'North'
-    try:
-        temp = float(params.get('temperature') or 0.0)
-    except Exception:
-        temp = 0.0
-    try:
-        rh = float(params.get('humidity') or 0.0)
-    except Exception:
-        rh = 0.0
-    season = params.get('season') or 'Post-harvest'
-    try:
-        days = int(params.get('storage_days') or 0)
-    except Exception:
-        days = 0
-
-    explanation = []
-    recommendations = []
-
+def _crop_name(value):
+    crop = str(value or '').lower()
     # Accept common user typo 'rise' as 'rice'
-    if crop == 'rise':
-        crop = 'rice'
+    return 'rice' if crop == 'rise' else crop
 
-    # Special Rice/Paddy evaluation using user-provided rules
-    if crop in ('rice', 'paddy'):
-        # Inputs already normalized to temp, rh, days, season
-        s = (season or '').lower()
-        # Humidity score (0-100) - highest impact
-        if rh <= 65:
-            hum_score = 0.0
-            hum_label = 'Safe humidity (≤65%)'
-        elif 66 <= rh <= 75:
-            hum_score = 50.0
-            hum_label = 'Moderate humidity (66–75%)'
-        else:
-            hum_score = 100.0
-            hum_label = 'High humidity (>75%) — fungal/mold risk'
-
-        # Temperature score
-        if temp <= 25:
-            temp_score = 0.0
-            temp_label = 'Safe temperature (≤25°C)'
-        elif 26 <= temp <= 32:
-            temp_score = 40.0
-            temp_label = 'Moderate temperature (26–32°C)'
-        else:
-            temp_score = 80.0
-            temp_label = 'High temperature (>32°C) — spoilage/insects'
-
-        # Storage duration score
-        if days <= 30:
-            days_score = 0.0
-            days_label = 'Short storage (≤30 days)'
-        elif 31 <= days <= 90:
-            days_score = 40.0
-            days_label = 'Medium storage (31–90 days)'
-        else:
-            days_score = 80.0
-            days_label = 'Long storage (>90 days) — quality loss'
-
-        # Season multiplier
-        if 'monsoon' in s or 'heavy' in s:
-            season_mul = 1.15
-            season_label = 'Monsoon/Heavy rainfall — high impact'
-        elif 'moderate' in s or 'rain' in s:
-            season_mul = 1.05
-            season_label = 'Moderate rainfall — medium impact'
-        else:
-            season_mul = 0.95
-            season_label = 'Dry/Winter — low impact'
-
-        # Weights: humidity highest, then temperature, then duration
-        w_hum = 0.5
-        w_temp = 0.3
-        w_days = 0.2
-
-        combined = (hum_score * w_hum) + (temp_score * w_temp) + (days_score * w_days)
-        combined = combined * season_mul
-        risk_pct = clamp(round(combined, 1), 0.0, 100.0)
-
-        # Risk level mapping per spec
-        if risk_pct <= 30:
-            level = 'Low'
-            recommendation = 'Store as usual; monitor regularly.'
-        elif risk_pct <= 60:
-            level = 'Medium'
-            recommendation = 'Monitor closely; consider selling part or improve storage.'
-        else:
-            level = 'High'
-            recommendation = 'Sell now or move to controlled storage immediately.'
-
-        # Farmer-friendly explanation
-        explanation_text = f"{hum_label}. {temp_label}. {days_label}. {season_label}."
 
-        return {
-            'risk_percentage': risk_pct,
-            'risk_level': level,
-            'explanation': explanation_text,
-            'recommendation': recommendation,
-            'details': {
-                'humidity': rh,
-                'temperature': temp,
-                'storage_days': days,
-                'season': season
-            }
-        }
+# how compute_risk reads its inputs; missing or unreadable values take the default
+RISK_INPUTS = schema.Schema('RiskInputs', (
+    schema.Field('crop_type', _crop_name, ''),
+    schema.Field('region', 'text', 'North'),
+    schema.Field('temperature', 'number', 0.0),
+    schema.Field('humidity', 'number', 0.0),
+    schema.Field('season', 'text', 'Post-harvest'),
+    schema.Field('storage_days', 'days', 0),
+))
 
-    if crop not in CROPS:
-        # unknown crop: use conservative defaults
-        base_safe_temp = (15, 30)
-        base_safe_rh = (30, 70)
-        safe_days = 90
-        respiration = 'medium'
-        notes = 'Unknown crop — using conservative defaults.'
-    else:
-        info = CROPS[crop]
-        base_safe_temp = info['ideal_temp']
-        base_safe_rh = info['ideal_humidity']
-        safe_days = info['storage_days_safe']
-        respiration = info['respiration']
-        notes = info.get('notes', '')
-
-    # apply regional adjustments
-    adj = REGION_ADJUSTMENTS.get(region, {'humidity_bias': 0, 'temp_bias': 0})
-    ideal_temp = (base_safe_temp[0] + adj['temp_bias'], base_safe_temp[1] + adj['temp_bias'])
-    ideal_rh = (base_safe_rh[0] + adj['humidity_bias'], base_safe_rh[1] + adj['humidity_bias'])
-
-    score = 0.0
-
-    # Temperature factor: penalty when outside ideal range
-    if temp < ideal_temp[0]:
-        diff = ideal_temp[0] - temp
-        temp_penalty = diff * 1.5
-        explanation.append(f'Temperature {temp}°C below ideal range {ideal_temp[0]}–{ideal_temp[1]}°C.')
-    elif temp > ideal_temp[1]:
-        diff = temp - ideal_temp[1]
-        temp_penalty = diff * 2.0
-        explanation.append(f'Temperature {temp}°C above ideal range {ideal_temp[0]}–{ideal_temp[1]}°C.')
-    else:
-        temp_penalty = 0.0
-        explanation.append(f'Temperature {temp}°C within ideal range.')
-
-    score += temp_penalty
-
-    # Humidity factor
-    if rh < ideal_rh[0]:
-        diff = ideal_rh[0] - rh
-        rh_penalty = diff * 1.2
-        explanation.append(f'Humidity {rh}% below ideal range {ideal_rh[0]}–{ideal_rh[1]}% (dry).')
-    elif rh > ideal_rh[1]:
-        diff = rh - ideal_rh[1]
-        rh_penalty = diff * 2.5
-        explanation.append(f'Humidity {rh}% above ideal range {ideal_rh[0]}–{ideal_rh[1]}% (wet).')
-    else:
-        rh_penalty = 0.0
-        explanation.append(f'Humidity {rh}% within ideal range.')
 
-    score += rh_penalty
+def normalize_inputs(params):
+    """RiskInputs(crop_type, region, temperature, humidity, season, storage_days) for `params`.
 
-    # Storage duration penalty
-    if days <= safe_days:
-        days_penalty = 0.0
-        explanation.append(f'Storage duration {days} days within safe limit ({safe_days} days).')
-    else:
-        over = days - safe_days
-        # penalize proportionally but cap
-        days_penalty = min(30.0, over * 0.5)
-        explanation.append(f'Storage duration {days} days exceeds safe limit ({safe_days} days) by {over} days.')
-
-    score += days_penalty
-
-    # Seasonal adjustments
-    season = season.lower()
-    if 'monsoon' in season:
-        season_penalty = 12.0
-        explanation.append('Season = Monsoon; raises risk due to high ambient moisture.')
-    elif 'summer' in season:
-        # humid summer vs dry summer depends on region/humidity
-        if rh > 65:
-            season_penalty = 10.0
-            explanation.append('Humid summer conditions increase fungal/spoilage risk.')
-        else:
-            season_penalty = 2.0
-            explanation.append('Summer season with moderate humidity.')
-    elif 'post-harvest' in season:
-        season_penalty = 3.0
-        explanation.append('Post-harvest handling affects risk depending on storage readiness.')
-    else:
-        season_penalty = 0.0
-        explanation.append('Seasonal effect minimal.')
-
-    score += season_penalty
-
-    # Respiration / crop sensitivity multiplier
-    resp_factor = RESPIRATION_FACTOR.get(respiration, 1.0)
-    if resp_factor > 1.0:
-        explanation.append(f'Crop respiration rate {respiration} increases spoilage risk.')
-
-    score *= resp_factor
-
-    # Special critical checks (e.g., sugarcane, banana)
-    if crop in ['sugarcane', 'banana']:
-        # extremely sensitive: if storage days > safe by even small amount, escalate
-        if days > safe_days:
-            score += 20.0
-            explanation.append('Highly perishable crop: rapid risk escalation when stored beyond safe duration.')
-
-    # Caps and normalization to 0-100
-    raw_score = clamp(score, 0.0, 100.0)
-    # Round for readability
-    risk_score = round(raw_score, 1)
-
-    # Risk level mapping
-    if risk_score <= 20:
-        level = 'SAFE'
-    elif risk_score <= 50:
-        level = 'MODERATE'
-    elif risk_score <= 80:
-        level = 'HIGH'
-    else:
-        level = 'CRITICAL'
-
-    # Build human explanation and recommendations
-    explanation_text = notes + ' ' + ' '.join(explanation)
-
-    if level == 'SAFE':
-        recommendations.append('Maintain current storage conditions; monitor weekly.')
-    if level == 'MODERATE':
-        recommendations.append('Consider ventilation and reduce humidity (use desiccants or drying).')
-        recommendations.append('Check storage for early signs of mold or pests.')
-    if level == 'HIGH':
-        recommendations.append('Reduce storage temperature if possible; increase ventilation.')
-        recommendations.append('Move to dryer storage or use moisture control measures.')
-    if level == 'CRITICAL':
-        recommendations.append('Immediate action: move produce to cold storage or sell/consume promptly.')
-        recommendations.append('Use aeration, drying, or short-term processing to avoid loss.')
-
-    # Tailored recommendations based on crop
-    if crop in ['paddy', 'groundnut'] and rh > 70:
-        recommendations.append('Dry grains to safe moisture content and avoid long storage during humid season.')
+    Equal records give equal results under the same rules, so the record is
+    also a cache key for anything derived from the result.
+    """
+    return RISK_INPUTS(params)
 
-    return {
-        'risk_score': risk_score,
-        'risk_level': level,
-        'explanation': explanation_text.strip(),
-        'recommendations': recommendations,
-        'details': {
-            'ideal_temp': ideal_temp,
-            'ideal_humidity': ideal_rh,
-            'safe_days': safe_days,
-            'respiration': respiration
-        }
-    }
+
+def evaluate(inputs, rules=None):
+    """compute_risk for an already validated RiskInputs record."""
+    crop, region, temp, rh, season, days = inputs
+
+    # rules are compiled per crop in crop_rules; see compile_rules()
+    if rules is None:
+        rules = _COMPILED
+    return rules.evaluator_for(crop)(crop, region, temp, rh, season, days)
+
+
+def compute_risk(params, rules=None):
+    return evaluate(RISK_INPUTS(params), rules)
 
 
 def calculate_risk(crop_type, region, temperature, humidity, season, storage_days):
@@ -416,4 +227,273 @@ def calculate_risk(crop_type, region, temperature, humidity, season, storage_day
         'season': season,
         'storage_days': storage_days
     }
-    return compute_risk(params)
\ No newline at end of file
+    return compute_risk(params)
+
+
+def score_batch(crop_type, region, season, storage_days, temperatures, humidities, rules=None):
+    """Score many (temperature, humidity) pairs under one crop/region/season/duration.
+
+    Returns a crop_rules.ScoreBatch whose scores() and levels() match what
+    compute_risk gives for each pair, without building explanations.
+    """
+    inputs = RISK_INPUTS({'crop_type': crop_type, 'region': region, 'season': season, 'storage_days': storage_days})
+    return score_inputs(inputs, temperatures, humidities, rules)
+
+
+def score_inputs(inputs, temperatures, humidities, rules=None):
+    """score_batch for an already validated RiskInputs record; its own temperature and humidity are not used."""
+    if rules is None:
+        rules = _COMPILED
+    scorer = rules.batch_scorer_for(inputs.crop_type)
+    return scorer(inputs.region, inputs.season, inputs.storage_days, temperatures, humidities)
+
+
+# -------------------------------
+# Threshold inversion
+# -------------------------------
+# The general rules are piecewise linear in temperature, humidity and days,
+# and the rice/paddy rules are step functions. Between breakpoints the score
+# is linear, so each limit is found by evaluating the engine at the segment
+# ends and solving the line, then nudged to the exact rounding boundary.
+# Results are cached per configuration and per installed rules version.
+
+LEVEL_ORDER = ('SAFE', 'MODERATE', 'HIGH', 'CRITICAL')
+
+# (level, highest score still in that level) for each rule set
+GENERAL_LEVEL_LIMITS = (('SAFE', 20.0), ('MODERATE', 50.0), ('HIGH', 80.0))
+RICE_LEVEL_LIMITS = (('SAFE', 30.0), ('MODERATE', 60.0))
+
+TEMP_DOMAIN = (-10.0, 60.0)
+RH_DOMAIN = (0.0, 100.0)
+_EDGE = 1e-6
+
+
+def _inversion_profile(rules, crop, region, season):
+    """Breakpoints and level limits for one crop/region/season configuration."""
+    if crop in ('rice', 'paddy'):
+        return {
+            'limits': RICE_LEVEL_LIMITS,
+            'reference': (20.0, 50.0),
+            'temp_stops': (25.0, 26.0, 32.0),
+            'rh_stops': (65.0, 66.0, 75.0),
+            'day_segments': ((0, 30), (31, 90), (91, 91)),
+        }
+
+    info = rules.crops.get(crop)
+    base_temp = info['ideal_temp'] if info else (15, 30)
+    base_rh = info['ideal_humidity'] if info else (30, 70)
+    safe_days = info['storage_days_safe'] if info else 90
+    adj = rules.region_adjustments.get(region, {'humidity_bias': 0, 'temp_bias': 0})
+    ideal_temp = (base_temp[0] + adj['temp_bias'], base_temp[1] + adj['temp_bias'])
+    ideal_rh = (base_rh[0] + adj['humidity_bias'], base_rh[1] + adj['humidity_bias'])
+    rh_stops = list(ideal_rh)
+    if 'summer' in (season or '').lower():
+        # humid-summer penalty switches on above 65% RH
+        rh_stops.append(65.0)
+    return {
+        'limits': GENERAL_LEVEL_LIMITS,
+        'reference': ((ideal_temp[0] + ideal_temp[1]) / 2.0, (ideal_rh[0] + ideal_rh[1]) / 2.0),
+        'temp_stops': tuple(ideal_temp),
+        'rh_stops': tuple(sorted(rh_stops)),
+        # duration penalty: flat, then +0.5/day for 60 days, then capped
+        'day_segments': ((0, safe_days), (safe_days + 1, safe_days + 60)),
+    }
+
+
+def _score(rules, crop, region, temp, rh, season, days):
+    res = compute_risk({
+        'crop_type': crop,
+        'region': region,
+        'temperature': temp,
+        'humidity': rh,
+        'season': season,
+        'storage_days': days,
+    }, rules)
+    return res.get('risk_score', res.get('risk_percentage', 0.0))
+
+
+def _first_day_above(score_at, segments, limit):
+    """First storage day whose score exceeds `limit`, or None if it never does."""
+    for start, end in segments:
+        v_start = score_at(start)
+        if v_start > limit:
+            return start
+        v_end = score_at(end)
+        if v_end <= limit:
+            continue
+        day = start + int((limit - v_start) / (v_end - v_start) * (end - start))
+        while day > start and score_at(day - 1) > limit:
+            day -= 1
+        while score_at(day) <= limit:
+            day += 1
+        return day
+    return None
+
+
+def _edge_of_band(score_at, start, stops, domain_end, limit):
+    """Furthest point from `start` towards `domain_end` that stays within `limit`.
+
+    `stops` are the breakpoints of `score_at`; between two of them the score is
+    linear, so the crossing point is solved directly. Returns None when the
+    whole stretch up to `domain_end` stays within the limit.
+    """
+    step = 1.0 if domain_end > start else -1.0
+    points = sorted((p for p in stops if (p - start) * step > 0), key=lambda p: (p - start) * step)
+    points.append(domain_end)
+    a = start
+    for b in points:
+        va = score_at(a + step * _EDGE)
+        if va > limit:
+            edge = a
+            break
+        vb = score_at(b - step * _EDGE)
+        if vb > limit:
+            edge = a + (limit - va) / (vb - va) * (b - a)
+            break
+        a = b
+    else:
+        return None
+    # snap inwards to the 0.1 resolution the UI shows, then confirm with the engine
+    edge = (int(edge * 10) if step > 0 else -int(-edge * 10)) / 10.0
+    while (edge - start) * step > 0 and score_at(edge) > limit:
+        edge = round(edge - step * 0.1, 1)
+    while score_at(round(edge + step * 0.1, 1)) <= limit:
+        edge = round(edge + step * 0.1, 1)
+    return edge
+
+
+@lru_cache(maxsize=2048)
+def _days_to_levels(rules, crop, region, temp, rh, season):
+    profile = _inversion_profile(rules, crop, region, season)
+    score_at = lambda d: _score(rules, crop, region, temp, rh, season, d)
+    firsts = []
+    for idx, (_, limit) in enumerate(profile['limits']):
+        firsts.append((LEVEL_ORDER[idx + 1], _first_day_above(score_at, profile['day_segments'], limit)))
+    return tuple(firsts)
+
+
+@lru_cache(maxsize=2048)
+def _envelopes(rules, crop, region, season, days):
+    profile = _inversion_profile(rules, crop, region, season)
+    ref_temp, ref_rh = profile['reference']
+    out = []
+    for level, limit in profile['limits']:
+        temp_score = lambda t: _score(rules, crop, region, t, ref_rh, season, days)
+        rh_score = lambda h: _score(rules, crop, region, ref_temp, h, season, days)
+        if temp_score(ref_temp) > limit:
+            out.append((level, None))
+            continue
+        temp_band = (
+            _edge_of_band(temp_score, ref_temp, profile['temp_stops'], TEMP_DOMAIN[0], limit),
+            _edge_of_band(temp_score, ref_temp, profile['temp_stops'], TEMP_DOMAIN[1], limit),
+        )
+        rh_band = (
+            _edge_of_band(rh_score, ref_rh, profile['rh_stops'], RH_DOMAIN[0], limit),
+            _edge_of_band(rh_score, ref_rh, profile['rh_stops'], RH_DOMAIN[1], limit),
+        )
+        out.append((level, (temp_band, rh_band)))
+    return tuple(out)
+
+
+def days_to_levels(crop_type, region, temperature, humidity, season):
+    """First storage day at which each risk level is reached.
+
+    Returns a dict with `days_to_level` (level -> day, None if never reached),
+    `level_at_start` and `safe_until_day` (last SAFE day; None when the lot is
+    never SAFE or never leaves SAFE, see `level_at_start`).
+    """
+    crop = _crop_name(crop_type)
+    region = region or 'North'
+    season = season or 'Post-harvest'
+    temp = float(temperature or 0.0)
+    rh = float(humidity or 0.0)
+    firsts = dict(_days_to_levels(_COMPILED, crop, region, temp, rh, season))
+
+    level_at_start = 'SAFE'
+    for level in LEVEL_ORDER[1:]:
+        if firsts.get(level) == 0:
+            level_at_start = level
+    leaves_safe = firsts.get('MODERATE')
+    return {
+        'days_to_level': firsts,
+        'level_at_start': level_at_start,
+        'safe_until_day': leaves_safe - 1 if leaves_safe else None,
+    }
+
+
+def safe_envelope(crop_type, region, season, storage_days):
+    """Temperature and humidity bands that keep each risk level from being exceeded.
+
+    Each band is solved with the other variable held at the middle of its
+    ideal range. `min`/`max` of None mean no limit within the physical range;
+    a level mapped to None cannot be met for this storage duration.
+    """
+    crop = _crop_name(crop_type)
+    result = {}
+    for level, bands in _envelopes(_COMPILED, crop, region or 'North', season or 'Post-harvest', int(storage_days or 0)):
+        if bands is None:
+            result[level] = None
+            continue
+        (t_min, t_max), (h_min, h_max) = bands
+        result[level] = {
+            'temperature': {'min': t_min, 'max': t_max},
+            'humidity': {'min': h_min, 'max': h_max},
+        }
+    return result
+
+
+# -------------------------------
+# Crop x region comparison
+# -------------------------------
+@lru_cache(maxsize=1024)
+def _comparison(rules, crops, temp, rh, season, days):
+    regions = tuple(rules.region_adjustments)
+    rows = []
+    for name in crops:
+        scorer = rules.batch_scorer_for(_crop_name(name))
+        for region in regions:
+            batch = scorer(region, season, days, (temp,), (rh,))
+            level = batch.levels()[0]
+            # position on the crop's own level scale (rice has three levels, the rest four)
+            severity = round(level / (len(batch.level_names) - 1), 3)
+            rows.append((name, region, batch.scores()[0], batch.level_names[level], severity))
+    # lowest risk first; ties keep the order crops were given in
+    rows.sort(key=lambda row: (row[2], row[4]))
+    return regions, tuple(rows)
+
+
+def compare_crops(crops, temperature, humidity, season, storage_days):
+    """Score every crop in every region under one set of conditions, ranked.
+
+    Scores come from the batch scorers (no explanations are built) and are
+    cached per conditions and installed rules version.
+    """
+    temp = float(temperature or 0.0)
+    rh = float(humidity or 0.0)
+    season = season or 'Post-harvest'
+    days = int(storage_days or 0)
+    rules = _COMPILED
+    regions, rows = _comparison(rules, tuple(crops), temp, rh, season, days)
+
+    ranking = []
+    best_region = {}
+    best_crop = {}
+    for rank, (crop, region, score, level, severity) in enumerate(rows, 1):
+        ranking.append({
+            'rank': rank,
+            'crop': crop,
+            'region': region,
+            'risk_score': score,
+            'risk_level': level,
+            'severity': severity,
+        })
+        best_region.setdefault(crop, region)
+        best_crop.setdefault(region, crop)
+    return {
+        'conditions': {'temperature': temp, 'humidity': rh, 'season': season, 'storage_days': days},
+        'regions': list(regions),
+        'ranking': ranking,
+        'best_region': best_region,
+        'best_crop': best_crop,
+        'version': rules.version,
+    }
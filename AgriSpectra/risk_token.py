@@ -0,0 +1,81 @@
+"""Compact signed tokens carrying a computed risk result between API calls.
+
+`/api/risk` returns a token alongside its result; `/api/eligibility` accepts
+it back and reads the risk level from it instead of running the engine a
+second time. The token is bound to the risk inputs and to the threshold
+version that scored them, so it is only honoured when the follow-up request
+describes the same crop and conditions and the thresholds have not been
+reloaded in between.
+
+Format: ``<base64url(json payload)>.<base64url(hmac-sha256[:16])>``
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import json
+import time
+from typing import Dict, Optional, Union
+
+import risk_engine
+
+
+MAX_AGE_SECONDS = 3600
+
+RISK_INPUT_FIELDS = ('crop_type', 'region', 'temperature', 'humidity', 'season', 'storage_days')
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def _unb64(text: str) -> bytes:
+    return base64.urlsafe_b64decode(text + '=' * (-len(text) % 4))
+
+
+def fingerprint(params: Union[Dict, tuple]) -> str:
+    """Digest of the risk inputs: a request payload or an already parsed RISK_INPUTS record."""
+    parts = params if isinstance(params, tuple) else risk_engine.normalize_inputs(params)
+    return hashlib.sha256(repr(tuple(parts)).encode('utf-8')).hexdigest()[:16]
+
+
+def issue(result: Dict, params: Union[Dict, tuple], secret: str, version: str = '') -> str:
+    payload = {
+        'l': result.get('risk_level'),
+        's': result.get('risk_score', result.get('risk_percentage')),
+        'f': fingerprint(params),
+        't': int(time.time()),
+        'v': version,
+    }
+    body = _b64(json.dumps(payload, separators=(',', ':')).encode('utf-8'))
+    sig = hmac.new(secret.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()[:16]
+    return f'{body}.{_b64(sig)}'
+
+
+def verify(token, params: Union[Dict, tuple], secret: str, max_age: int = MAX_AGE_SECONDS,
+           version: Optional[str] = None) -> Optional[Dict]:
+    """Return the token payload if it is authentic, fresh and matches `params` (and `version`, if given).
+
+    `token` comes straight from request JSON; anything but a string is not a token.
+    """
+    if not isinstance(token, str):
+        return None
+    try:
+        body, sig = token.split('.', 1)
+        expected = hmac.new(secret.encode('utf-8'), body.encode('ascii'), hashlib.sha256).digest()[:16]
+        if not hmac.compare_digest(expected, _unb64(sig)):
+            return None
+        payload = json.loads(_unb64(body))
+    except (ValueError, TypeError, UnicodeError):
+        return None
+    if not isinstance(payload, dict):
+        return None
+    if time.time() - payload.get('t', 0) > max_age:
+        return None
+    if payload.get('f') != fingerprint(params):
+        return None
+    if version is not None and payload.get('v', '') != version:
+        return None
+    return payload
@@ -0,0 +1,141 @@
+"""Request schemas compiled into single-pass validators.
+
+A schema is a list of `Field`s. `Schema(name, fields)` resolves each
+field's coercer once; calling the schema on a payload (a JSON dict, form or
+query args) reads every field in one pass and returns a named tuple, so the
+engines receive typed values instead of re-parsing strings.
+
+Missing values take the field default unless the field is `required`.
+Values that cannot be coerced take the default too, the way the engines have
+always treated bad input, unless the field is `strict`. A required or
+strict field that fails raises `SchemaError`, which handlers turn into 400.
+
+Kinds:
+    number     finite float ('nan' and 'inf' are invalid)
+    integer    int (a fractional string such as '30.5' is invalid)
+    days       non-negative whole days ('30.5' counts as 30)
+    text       strings as given and numbers as strings, default when empty
+    trimmed    stripped, default when empty
+    key        stripped and lower-cased, default when empty
+    title      stripped and title-cased, default when empty
+    callable   any f(value) -> value; raise ValueError for invalid input
+"""
+
+from __future__ import annotations
+
+import math
+from collections import namedtuple
+from typing import Any, Callable, Mapping, NamedTuple, Sequence
+
+
+class SchemaError(ValueError):
+    pass
+
+
+class Field(NamedTuple):
+    name: str
+    kind: Any = 'text'
+    default: Any = None
+    required: bool = False
+    strict: bool = False
+
+
+_MISSING = object()
+
+
+def _number(value):
+    number = float(value)
+    # float() parses 'nan' and 'inf'; no engine can use them
+    if not math.isfinite(number):
+        raise ValueError('not a finite number')
+    return number
+
+
+def _integer(value):
+    return int(value)
+
+
+def _days(value):
+    days = int(float(value))
+    if days < 0:
+        raise ValueError('negative duration')
+    return days
+
+
+def _text(value):
+    if isinstance(value, str):
+        return value
+    # the engines call string methods on text fields; JSON numbers are fine, objects are not
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise TypeError(f'expected text, got {type(value).__name__}')
+
+
+def _trimmed(value):
+    return str(value).strip()
+
+
+def _key(value):
+    return str(value).strip().lower()
+
+
+def _title(value):
+    return str(value).strip().title()
+
+
+# kind -> (coercer, whether an empty result falls back to the default)
+_COERCERS = {
+    'number': (_number, False),
+    'integer': (_integer, False),
+    'days': (_days, False),
+    'text': (_text, True),
+    'trimmed': (_trimmed, True),
+    'key': (_key, True),
+    'title': (_title, True),
+}
+
+_KIND_NAMES = {'number': 'a number', 'integer': 'a whole number', 'days': 'a non-negative number of days'}
+
+
+def _compile_field(field: Field) -> Callable[[Any], Any]:
+    coerce, empty_is_default = (field.kind, False) if callable(field.kind) else _COERCERS[field.kind]
+    name, default, required, strict = field.name, field.default, field.required, field.strict
+    problem = f'{name} must be {_KIND_NAMES.get(field.kind, "valid")}'
+
+    def read(value):
+        # empty strings from forms and query strings count as missing, and so
+        # does any falsy value for the text kinds (the engines read `value or default`)
+        if value is None or value == '' or (empty_is_default and not value):
+            if required:
+                raise SchemaError(f'{name} is required')
+            return default
+        try:
+            result = coerce(value)
+        except (TypeError, ValueError, OverflowError):
+            if strict:
+                raise SchemaError(problem)
+            return default
+        if empty_is_default and not result:
+            return default
+        return result
+    return read
+
+
+class Schema:
+    """A compiled validator returning `name` records with one attribute per field."""
+
+    def __init__(self, name: str, fields: Sequence[Field]):
+        self.name = name
+        self.fields = tuple(fields)
+        self.record = namedtuple(name, [f.name for f in self.fields])
+        self._make = self.record._make
+        self._steps = tuple((f.name, _compile_field(f)) for f in self.fields)
+
+    def __call__(self, payload: Mapping):
+        get = payload.get
+        return self._make([read(get(key)) for key, read in self._steps])
+
+    def derive(self, name: str, **changes) -> 'Schema':
+        """The same fields with per-field overrides, e.g. derive('X', temperature={'strict': True})."""
+        fields = [f._replace(**changes.get(f.name, {})) for f in self.fields]
+        return Schema(name, fields)
@@ -6,6 +6,9 @@ document.addEventListener('DOMContentLoaded', () => {
 
   if(!form || !fetchRiskBtn || !riskInput || !resultSection) return;
 
+  // signed result of the last /api/risk call; lets /api/eligibility skip recomputing
+  let riskToken = '';
+
   function getPayload() {
     const fd = new FormData(form);
     return {
@@ -18,7 +21,8 @@ document.addEventListener('DOMContentLoaded', () => {
       temperature: fd.get('temperature'),
       humidity: fd.get('humidity'),
       season: fd.get('season'),
-      risk_level: fd.get('risk_level')
+      risk_level: fd.get('risk_level'),
+      risk_token: riskToken
     };
   }
 
@@ -43,6 +47,7 @@ document.addEventListener('DOMContentLoaded', () => {
       body: JSON.stringify(riskPayload)
     });
     const data = await resp.json();
+    riskToken = data.risk_token || '';
     const level = riskLevelFromResponse(data);
     riskInput.value = String(level).toUpperCase();
     return riskInput.value;
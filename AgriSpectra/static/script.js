@@ -174,8 +174,17 @@ document.addEventListener('DOMContentLoaded', () => {
     return data;
   }
 
+  // day-to-day spread of the last autofilled forecast, sent as the risk uncertainty
+  let weatherSpread = null;
+
+  // hand-edited values no longer come from that forecast
+  [temperatureInput, humidityInput].forEach((input) => {
+    if (input) input.addEventListener('input', () => { weatherSpread = null; });
+  });
+
   async function autofillWeatherFromPlace(payload) {
     const data = await fetchWeatherAverage(payload);
+    weatherSpread = data.spread || null;
     if (temperatureInput) temperatureInput.value = data.avg_temperature;
     if (humidityInput) humidityInput.value = data.avg_humidity;
 
@@ -187,8 +196,13 @@ document.addEventListener('DOMContentLoaded', () => {
     });
 
     updateMap(data.place || (placeInput ? placeInput.value : 'India'));
+    const filledFrom = data.source === 'forecast'
+      ? 'Auto-filled 10-day avg'
+      : data.approximate
+        ? 'Forecast unavailable; filled from modelled seasonal estimates (approximate)'
+        : 'Forecast unavailable; filled from long-term monthly averages';
     ui.setLocation(
-      `Auto-filled 10-day avg: ${data.avg_temperature} C and ${data.avg_humidity}% RH for ${data.place || 'selected place'}.`
+      `${filledFrom}: ${data.avg_temperature} C and ${data.avg_humidity}% RH for ${data.place || 'selected place'}.`
     );
 
     try {
@@ -317,6 +331,19 @@ document.addEventListener('DOMContentLoaded', () => {
     }
   };
 
+  function renderDistribution(dist) {
+    if (!dist || !dist.score_percentiles) return '';
+    const pct = dist.score_percentiles;
+    const chances = Object.entries(dist.level_probabilities || {})
+      .filter(([, p]) => p > 0)
+      .map(([level, p]) => `${level} ${Math.round(p * 100)}%`)
+      .join(', ');
+    return `
+      <h4>If the weather varies</h4>
+      <p>Likely score range ${pct.p5} - ${pct.p95} (median ${pct.p50}). Chance of each level: ${chances}.</p>
+    `;
+  }
+
   function renderResult(data) {
     const existing = document.getElementById('clientResult');
     if (existing) existing.remove();
@@ -335,6 +362,7 @@ document.addEventListener('DOMContentLoaded', () => {
           <p>${data.explanation || ''}</p>
           <h4>Recommendations</h4>
           <ul>${(data.recommendations || []).map((r) => `<li>${r}</li>`).join('')}</ul>
+          ${renderDistribution(data.distribution)}
         </div>
       </div>
       <section id="inlineEligibilityResult" class="content-section" style="margin-top:1rem;">
@@ -419,7 +447,8 @@ document.addEventListener('DOMContentLoaded', () => {
   }
 
   const riskApi = {
-    async computeFromForm(formEl) {
+    // risk + eligibility in one round trip and one engine pass
+    async assessFromForm(formEl) {
       const fd = new FormData(formEl);
       const payload = {
         crop_type: fd.get('crop_type'),
@@ -430,24 +459,23 @@ document.addEventListener('DOMContentLoaded', () => {
         temperature: fd.get('temperature'),
         humidity: fd.get('humidity'),
         season: fd.get('season'),
-        storage_days: fd.get('storage_days')
+        storage_days: fd.get('storage_days'),
+        state: '',
+        farmer_category: '',
+        landholding_size: ''
       };
+      if (weatherSpread) payload.uncertainty = weatherSpread;
 
-      const response = await fetch('/api/risk', {
-        method: 'POST',
-        headers: { 'Content-Type': 'application/json' },
-        body: JSON.stringify(payload)
-      });
-
-      return response.json();
-    },
-    async computeEligibility(payload) {
-      const response = await fetch('/api/eligibility', {
+      const response = await fetch('/api/assess', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify(payload)
       });
-      return response.json();
+      const data = await response.json().catch(() => ({}));
+      if (!response.ok) {
+        throw new Error(data.error || 'Error computing risk');
+      }
+      return data;
     }
   };
 
@@ -455,32 +483,14 @@ document.addEventListener('DOMContentLoaded', () => {
     form.addEventListener('submit', async (ev) => {
       ev.preventDefault();
       try {
-        const riskData = await riskApi.computeFromForm(form);
+        const assessment = await riskApi.assessFromForm(form);
+        const riskData = assessment.risk || {};
         renderResult(riskData);
         speech.speakRiskSummary(riskData);
-
-        const fd = new FormData(form);
-        const eligibilityPayload = {
-          crop_type: fd.get('crop_type'),
-          place: fd.get('place'),
-          latitude: fd.get('latitude'),
-          longitude: fd.get('longitude'),
-          region: fd.get('region'),
-          temperature: fd.get('temperature'),
-          humidity: fd.get('humidity'),
-          season: fd.get('season'),
-          storage_days: fd.get('storage_days'),
-          risk_level: riskData.risk_level,
-          state: '',
-          farmer_category: '',
-          landholding_size: ''
-        };
-
-        const eligibilityData = await riskApi.computeEligibility(eligibilityPayload);
-        renderEligibilityResult(eligibilityData);
+        renderEligibilityResult(assessment.eligibility || {});
       } catch (err) {
         console.error(err);
-        alert('Error computing risk');
+        alert(err.message || 'Error computing risk');
       }
     });
   }
@@ -590,6 +600,7 @@ document.addEventListener('DOMContentLoaded', () => {
       ]);
       if (temp && temperatureInput) {
         temperatureInput.value = temp;
+        weatherSpread = null;
         updated.push('temperature');
       }
 
@@ -599,6 +610,7 @@ document.addEventListener('DOMContentLoaded', () => {
       ]);
       if (humidity && humidityInput) {
         humidityInput.value = humidity;
+        weatherSpread = null;
         updated.push('humidity');
       }
 
@@ -0,0 +1,28 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# keep background services and on-disk state out of the tests
+os.environ.setdefault('AGRISPECTRA_HISTORY', '0')
+os.environ.setdefault('AGRISPECTRA_PREFETCH', '0')
+os.environ.setdefault('AGRISPECTRA_THRESHOLDS_POLL', '0')
+os.environ.setdefault('AGRISPECTRA_ALERT_INTERVAL', '0')
+os.environ.setdefault('AGRISPECTRA_SNAPSHOT', '0')
+# nothing listens here, so a test that reaches the network fails fast
+os.environ.setdefault('AGRISPECTRA_FORECAST_URL', 'http://127.0.0.1:9/v1/forecast')
+os.environ.setdefault('AGRISPECTRA_GEOCODING_URL', 'http://127.0.0.1:9/v1/search')
+
+
+@pytest.fixture(scope='session')
+def app_module():
+    import app
+
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
@@ -0,0 +1,211 @@
+import socket
+import threading
+
+import pytest
+
+import alerts
+import webhook_sink
+
+SUB = {'warehouse_id': 'wh-1', 'latitude': 20.46, 'longitude': 85.88, 'crop_type': 'Rice',
+       'webhook': 'http://127.0.0.1:8091/hook'}
+
+
+@pytest.mark.parametrize('address, public', [
+    ('8.8.8.8', True), ('2606:4700:4700::1111', True), ('127.0.0.1', False), ('10.1.2.3', False),
+    ('192.168.0.1', False), ('169.254.169.254', False), ('::1', False), ('fe80::1%eth0', False),
+    ('::ffff:127.0.0.1', False), ('0.0.0.0', False), ('224.0.0.1', False),
+])
+def test_only_public_addresses_pass(address, public):
+    assert alerts._is_public(address) is public
+
+
+@pytest.mark.parametrize('webhook', [
+    'http://127.0.0.1:8091/hook', 'http://localhost/hook', 'https://10.0.0.5/hook',
+    'http://169.254.169.254/latest/meta-data', 'http://[::1]:8080/hook',
+])
+def test_private_webhooks_are_refused(webhook):
+    with pytest.raises(alerts.AlertError, match='non-public'):
+        alerts.Registry().subscribe({**SUB, 'webhook': webhook})
+
+
+def test_any_private_answer_blocks_the_host(monkeypatch):
+    answers = [(socket.AF_INET, socket.SOCK_STREAM, 6, '', ('93.184.216.34', 80)),
+               (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('127.0.0.1', 80))]
+    monkeypatch.setattr(alerts.socket, 'getaddrinfo', lambda *args, **kwargs: answers)
+    with pytest.raises(alerts.AlertError):
+        alerts.public_address('rebind.example', 80)
+    monkeypatch.setattr(alerts.socket, 'getaddrinfo', lambda *args, **kwargs: answers[:1])
+    assert alerts.public_address('rebind.example', 80) == '93.184.216.34'
+
+
+def test_changes_need_the_owner_token():
+    registry = alerts.Registry(allow_private=True)
+    created = registry.subscribe(SUB)
+    token = created.pop('owner_token')
+    assert 'owner_hash' not in created and 'secret' not in created
+    with pytest.raises(alerts.AlertForbidden):
+        registry.subscribe({**SUB, 'webhook': 'http://127.0.0.1:9999/evil'})
+    with pytest.raises(alerts.AlertForbidden):
+        registry.unsubscribe('wh-1', 'wrong')
+    replaced = registry.subscribe({**SUB, 'storage_days': 40}, token)
+    assert 'owner_token' not in replaced and registry.get('wh-1')['storage_days'] == 40
+    assert registry.unsubscribe('wh-1', token) is True
+    assert registry.unsubscribe('wh-1', token) is False
+
+
+@pytest.mark.parametrize('secret, expected', [(12345, '12345'), ('s3', 's3')])
+def test_secret_is_text(secret, expected):
+    registry = alerts.Registry(allow_private=True)
+    assert registry.subscribe({**SUB, 'secret': secret})['signed'] is True
+    assert registry.get('wh-1')['secret'] == expected
+
+
+@pytest.mark.parametrize('secret', [{'k': 'v'}, ['s'], True])
+def test_unusable_secret_is_rejected(secret):
+    with pytest.raises(alerts.AlertError, match='secret'):
+        alerts.Registry(allow_private=True).subscribe({**SUB, 'secret': secret})
+
+
+def _dispatcher(registry, risk, send, **kwargs):
+    return alerts.Dispatcher(registry, lambda subs: {}, risk, interval=0, workers=1, send=send,
+                             backoff_seconds=0.01, **kwargs)
+
+
+def test_check_scores_all_subscriptions_in_one_call():
+    registry = alerts.Registry(allow_private=True)
+    for i in range(5):
+        registry.subscribe({**SUB, 'warehouse_id': f'wh-{i}'})
+    calls = []
+
+    def risk(subs):
+        calls.append(len(subs))
+        return {sub['warehouse_id']: {'risk_level': 'HIGH', 'risk_score': 70.0} for sub in subs[:3]}
+
+    sent = []
+    dispatcher = _dispatcher(registry, risk, lambda url, body, headers, timeout: sent.append(body) or 200)
+    summary = dispatcher.check()
+    assert calls == [5] and summary['alerts'] == 3
+    assert dispatcher.drain(5) and len(sent) == 1
+    dispatcher.stop()
+
+
+def test_a_batch_that_cannot_be_sent_counts_as_failed():
+    registry = alerts.Registry(allow_private=True)
+    registry.subscribe(SUB)
+
+    def send(url, body, headers, timeout):
+        raise alerts.AlertError('webhook host resolves to a non-public address')
+
+    dispatcher = _dispatcher(registry, lambda subs: {'wh-1': {'risk_level': 'CRITICAL'}}, send)
+    dispatcher.check()
+    assert dispatcher.drain(5)
+    stats = dispatcher.stats()
+    assert stats['failed'] == 1 and stats['retries'] == 0
+    assert 'non-public' in stats['recent_failures'][0]['error']
+    dispatcher.stop()
+
+
+@pytest.fixture
+def sink():
+    config = webhook_sink.SinkConfig()
+    server = webhook_sink.make_server('127.0.0.1', 0, config)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server.server_address[1], config
+    server.shutdown()
+    server.server_close()
+
+
+def test_post_json_refuses_private_hosts_unless_allowed(sink):
+    port, config = sink
+    url = f'http://127.0.0.1:{port}/hook'
+    with pytest.raises(alerts.AlertError):
+        alerts.post_json(url, b'{}', {'Content-Type': 'application/json'}, 2.0)
+    assert alerts.post_json(url, b'{}', {'Content-Type': 'application/json'}, 2.0, allow_private=True) == 200
+    assert config.counters['batches'] == 1
+
+
+def test_post_json_connects_to_the_checked_address(sink, monkeypatch):
+    port, config = sink
+    # the name would not resolve at all; only the checked address is used to connect
+    monkeypatch.setattr(alerts, 'public_address', lambda host, port: '127.0.0.1')
+    status = alerts.post_json(f'http://hooks.invalid:{port}/hook', b'{"alerts": []}', {}, 2.0)
+    assert status == 200 and config.counters['batches'] == 1
+
+
+def test_subscription_endpoints(client, app_module, monkeypatch):
+    response = client.post('/api/alerts/subscriptions', json={**SUB, 'warehouse_id': 'api-1'})
+    assert response.status_code == 400 and 'non-public' in response.get_json()['error']
+
+    registry, dispatcher = app_module._alert_service()
+    monkeypatch.setattr(registry, 'allow_private', True)
+    monkeypatch.setattr(dispatcher, 'start', lambda: None)
+    created = client.post('/api/alerts/subscriptions', json={**SUB, 'warehouse_id': 'api-1'}).get_json()
+    token = created['subscription']['owner_token']
+    assert client.post('/api/alerts/subscriptions', json={**SUB, 'warehouse_id': 'api-1'}).status_code == 403
+    assert client.delete('/api/alerts/subscriptions/api-1').status_code == 403
+    response = client.delete('/api/alerts/subscriptions/api-1', headers={alerts.TOKEN_HEADER: token})
+    assert response.status_code == 200
+    assert client.delete('/api/alerts/subscriptions/api-1', headers={alerts.TOKEN_HEADER: token}).status_code == 404
+
+
+def test_subscription_risks_batch_the_forecast(app_module, monkeypatch):
+    urls = []
+
+    def fetch(url, deadline=None):
+        urls.append((url, deadline))
+        count = url.split('latitude=')[1].split('&')[0].count(',') + 1
+        return [{'daily': {'temperature_2m_mean': [30, 32], 'relative_humidity_2m_mean': [80, 84]}}] * count
+
+    monkeypatch.setattr(app_module, '_fetch_json', fetch)
+    subs = [{**SUB, 'warehouse_id': f'b-{i}', 'latitude': 20.0 + i, 'season': 'Monsoon', 'storage_days': 30}
+            for i in range(4)]
+    found = app_module._subscription_risks(subs)
+    assert len(urls) == 1 and urls[0][1] is not None
+    assert sorted(found) == ['b-0', 'b-1', 'b-2', 'b-3']
+    assert found['b-0']['temperature'] == 31.0 and found['b-0']['source'] == 'forecast'
+    # the averages are cached, so the next check does not go upstream
+    app_module._subscription_risks(subs)
+    assert len(urls) == 1
+
+
+def test_listing_is_scoped_to_the_owner_token(client, app_module, monkeypatch):
+    registry, dispatcher = app_module._alert_service()
+    monkeypatch.setattr(registry, 'allow_private', True)
+    monkeypatch.setattr(dispatcher, 'start', lambda: None)
+    monkeypatch.setattr(app_module, 'ALERT_ADMIN_TOKEN', 'ops-secret')
+    tokens = {}
+    for name in ('list-1', 'list-2'):
+        created = client.post('/api/alerts/subscriptions', json={**SUB, 'warehouse_id': name}).get_json()
+        tokens[name] = created['subscription']['owner_token']
+    try:
+        assert client.get('/api/alerts/subscriptions').status_code == 403
+        mine = client.get('/api/alerts/subscriptions', headers={alerts.TOKEN_HEADER: tokens['list-1']}).get_json()
+        assert [s['warehouse_id'] for s in mine['subscriptions']] == ['list-1']
+        wrong = client.get('/api/alerts/subscriptions', headers={alerts.TOKEN_HEADER: 'guess'}).get_json()
+        assert wrong['subscriptions'] == []
+        everything = client.get('/api/alerts/subscriptions', headers={alerts.ADMIN_HEADER: 'ops-secret'}).get_json()
+        assert {'list-1', 'list-2'} <= {s['warehouse_id'] for s in everything['subscriptions']}
+        assert all('owner_hash' not in s and 'secret' not in s for s in everything['subscriptions'])
+    finally:
+        for name, token in tokens.items():
+            client.delete(f'/api/alerts/subscriptions/{name}', headers={alerts.TOKEN_HEADER: token})
+
+
+def test_manual_check_needs_the_admin_token(client, app_module, monkeypatch):
+    checks = []
+
+    def check():
+        checks.append(1)
+        return {'subscriptions': 0}
+
+    _, dispatcher = app_module._alert_service()
+    monkeypatch.setattr(dispatcher, 'start', lambda: None)
+    monkeypatch.setattr(dispatcher, 'check', check)
+    monkeypatch.setattr(app_module, 'ALERT_ADMIN_TOKEN', None)
+    assert client.post('/api/alerts/check', headers={alerts.ADMIN_HEADER: 'anything'}).status_code == 404
+    monkeypatch.setattr(app_module, 'ALERT_ADMIN_TOKEN', 'ops-secret')
+    assert client.post('/api/alerts/check').status_code == 403
+    assert client.post('/api/alerts/check', headers={alerts.ADMIN_HEADER: 'ops-secre'}).status_code == 403
+    assert checks == []
+    response = client.post('/api/alerts/check', headers={alerts.ADMIN_HEADER: 'ops-secret'})
+    assert response.status_code == 200 and checks == [1]
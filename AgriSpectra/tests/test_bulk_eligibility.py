@@ -0,0 +1,48 @@
+import json
+
+import bulk_eligibility
+
+HEADER = 'member_id,crop,state,land_size,category,storage_days,temperature,humidity\n'
+ROW = 'm{0},Wheat,Punjab,1.5,small,30,28,65\n'
+
+
+def _lines(body):
+    return [json.loads(line) for line in body.splitlines() if line]
+
+
+def _post(client, data):
+    rv = client.post('/api/eligibility/bulk', data=data, content_type='text/csv')
+    assert rv.status_code == 200
+    return _lines(rv.get_data(as_text=True))
+
+
+def test_good_roll_ends_with_a_complete_summary(client):
+    out = _post(client, (HEADER + ''.join(ROW.format(i) for i in range(3))).encode())
+    assert 'schemes' in out[0]
+    assert [line['member_id'] for line in out[1:-1]] == ['m0', 'm1', 'm2']
+    assert out[-1]['summary']['rows'] == 3
+    assert out[-1]['summary']['complete'] is True
+
+
+def test_non_utf8_upload_reports_an_error_and_still_summarises(client):
+    body = (HEADER + ROW.format(1)).encode() + b'm2,Wh\xe9at,Punjab,1,small,30,28,65\n'
+    out = _post(client, body)
+    assert out[-2]['error'] == 'not UTF-8 text'
+    summary = out[-1]['summary']
+    assert summary['complete'] is False
+    assert summary['errors'] == 1
+
+
+def test_malformed_csv_reports_an_error_and_still_summarises(client):
+    huge = 'x' * 200_000
+    out = _post(client, (HEADER + ROW.format(1) + f'm2,"{huge}",Punjab,1,small,30,28,65\n').encode())
+    assert out[-2]['error'].startswith('malformed CSV')
+    assert out[-1]['summary']['complete'] is False
+    assert out[-1]['summary']['rows'] == 1
+
+
+def test_stream_assessments_handles_plain_iterables():
+    out = [json.loads(line) for chunk in bulk_eligibility.stream_assessments([HEADER, ROW.format(7)])
+           for line in chunk.splitlines()]
+    assert out[1]['member_id'] == 'm7'
+    assert out[-1]['summary']['complete'] is True
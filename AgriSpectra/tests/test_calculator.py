@@ -0,0 +1,95 @@
+import pytest
+
+import data
+import eligibility_engine
+import risk_engine
+import thresholds
+
+
+FORM = {'crop_type': 'Wheat', 'place': 'Cuttack', 'latitude': '20.46', 'longitude': '85.88',
+        'temperature': '32', 'humidity': '75', 'season': 'Monsoon', 'storage_days': '60'}
+
+
+@pytest.fixture
+def restore_tables():
+    saved = (risk_engine._COMPILED, eligibility_engine.SCHEMES, data.CROP_DATA, thresholds._current)
+    yield
+    risk_engine.install_rules(saved[0])
+    eligibility_engine.SCHEMES, data.CROP_DATA, thresholds._current = saved[1:]
+
+
+def test_shell_has_one_slot_per_value(app_module):
+    with app_module.app.test_request_context():
+        bare = app_module._calculator_shell(False)
+        full = app_module._calculator_shell(True)
+    assert set(bare[1::2]) == set(app_module.CALCULATOR_FIELDS) | {'map_query'}
+    assert set(full[1::2]) == set(bare[1::2]) | {'result_html', 'eligibility_html'}
+    assert not any('\x00' in chunk for chunk in full[::2])
+
+
+def test_empty_calculator_renders_without_placeholders(client):
+    html = client.get('/calculator').get_data(as_text=True)
+    assert '\x00' not in html
+    assert 'q=India' in html
+    assert 'id="riskLevel"' not in html
+
+
+@pytest.mark.parametrize('crop, score_key', [('Wheat', 'risk_score'), ('Rice', 'risk_percentage')])
+def test_posted_form_renders_the_engine_result(client, crop, score_key):
+    form = {**FORM, 'crop_type': crop}
+    html = client.post('/calculator', data=form).get_data(as_text=True)
+    expected = risk_engine.evaluate(risk_engine.normalize_inputs({**form, 'region': 'East'}))
+    assert '\x00' not in html
+    assert f'data-key="risk_{expected["risk_level"].lower()}"' in html
+    assert f'<div class="score-number">{expected[score_key]}</div>' in html
+    assert 'value="Cuttack"' in html
+
+
+def test_user_input_is_escaped_in_every_slot(client):
+    attack = '"><script>alert(1)</script>'
+    form = {**FORM, 'place': attack, 'temperature': attack, 'storage_days': '<b>9</b>'}
+    html = client.post('/calculator', data=form).get_data(as_text=True)
+    assert '<script>alert(1)</script>' not in html
+    assert '&#34;&gt;&lt;script&gt;alert(1)&lt;/script&gt;' in html
+    assert '&lt;b&gt;9&lt;/b&gt;' in html
+    # the map query is URL-encoded first, then escaped for the attribute
+    assert 'q=%22%3E%3Cscript%3E' in html
+
+
+def test_fragments_endpoint_matches_the_page(client):
+    rv = client.post('/calculator/fragments', json=FORM)
+    assert rv.status_code == 200
+    body = rv.get_json()
+    page = client.post('/calculator', data=FORM).get_data(as_text=True)
+    assert body['result_html'] in page
+    assert body['eligibility_html'] in page
+    expected = risk_engine.evaluate(risk_engine.normalize_inputs({**FORM, 'region': 'East'}))
+    assert body['risk_level'] == expected['risk_level']
+
+
+def test_repeat_submissions_hit_the_fragment_cache(client, app_module):
+    form = {**FORM, 'temperature': '27.25'}
+    client.post('/calculator/fragments', json=form)
+    hits = app_module._risk_fragments.stats()['hits']
+    first = client.post('/calculator/fragments', json=form).get_json()
+    assert app_module._risk_fragments.stats()['hits'] == hits + 1
+    # the same conditions written differently normalise to the same entry
+    again = client.post('/calculator/fragments', json={**form, 'crop_type': 'WHEAT', 'temperature': '27.250'})
+    again = again.get_json()
+    assert app_module._risk_fragments.stats()['hits'] == hits + 2
+    assert again['result_html'] == first['result_html']
+
+
+def test_threshold_reload_invalidates_cached_fragments(client, app_module, restore_tables):
+    form = {**FORM, 'temperature': '18', 'humidity': '55', 'storage_days': '100'}
+    before = client.post('/calculator/fragments', json=form).get_json()
+
+    document = thresholds.export_builtin('calculator-test')
+    document['crops']['wheat']['storage_days_safe'] = 1
+    thresholds.install(thresholds.build(document, source='test', digest='calculator-test'))
+    misses = app_module._risk_fragments.stats()['misses']
+    after = client.post('/calculator/fragments', json=form).get_json()
+    assert app_module._risk_fragments.stats()['misses'] == misses + 1
+    expected = risk_engine.evaluate(risk_engine.normalize_inputs({**form, 'region': 'East'}))
+    assert f'<div class="score-number">{expected["risk_score"]}</div>' in after['result_html']
+    assert after['result_html'] != before['result_html']
@@ -0,0 +1,45 @@
+import pytest
+
+
+@pytest.mark.parametrize('query', [
+    'latitude=nan&longitude=85.88',
+    'latitude=20.46&longitude=inf',
+    'month=1e400',
+    'month=nan',
+    'month=13',
+    'latitude=abc&longitude=85.88',
+])
+def test_climatology_rejects_unusable_numbers(client, query):
+    response = client.get(f'/api/climatology?{query}')
+    assert response.status_code == 400
+
+
+def test_climatology_is_labelled_as_modelled(client):
+    body = client.get('/api/climatology?latitude=20.46&longitude=85.88&month=7').get_json()
+    assert body['source'] == 'modelled-climatology' and body['approximate'] is True
+    assert len(body['monthly']) == 12
+    body = client.get('/api/climatology?month=7').get_json()
+    assert body['scope'] == 'india' and body['approximate'] is True
+
+
+@pytest.mark.parametrize('storage_days', ['inf', 'nan', -5, 'many'])
+def test_weather_average_rejects_bad_storage_days(client, storage_days):
+    response = client.post('/api/weather-average', json={'latitude': 20.46, 'longitude': 85.88,
+                                                         'storage_days': storage_days})
+    assert response.status_code == 400
+
+
+def test_weather_average_clamps_long_storage_periods(client, app_module):
+    response = client.post('/api/weather-average', json={'latitude': 20.46, 'longitude': 85.88,
+                                                         'storage_days': 5000000})
+    assert response.status_code == 200
+    body = response.get_json()
+    # the forecast is unreachable in the tests, so the modelled normals answer
+    assert body['source'] == 'modelled-climatology' and body['approximate'] is True
+    outlook = body['storage_outlook']
+    assert outlook['days'] == app_module.MAX_OUTLOOK_DAYS and outlook['approximate'] is True
+
+
+def test_weather_average_with_nan_coordinates_needs_a_place(client):
+    response = client.post('/api/weather-average', json={'latitude': 'nan', 'longitude': 85.88})
+    assert response.status_code == 400
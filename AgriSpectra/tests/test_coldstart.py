@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+import threading
+
+import pytest
+
+import coldstart
+import history
+
+
+def test_lazy_import_is_safe_under_concurrent_first_use(tmp_path, monkeypatch):
+    (tmp_path / 'slow_module_for_coldstart.py').write_text('import time\ntime.sleep(0.2)\nVALUE = 42\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = coldstart.lazy_import('slow_module_for_coldstart')
+    assert 'slow_module_for_coldstart' not in sys.modules
+    assert coldstart.report()['deferred_imports']['slow_module_for_coldstart'] == 'deferred'
+
+    start = threading.Barrier(8)
+    results, errors = [], []
+
+    def use():
+        start.wait()
+        try:
+            results.append(module.VALUE)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=use) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert errors == [] and results == [42] * 8
+    assert coldstart.report()['deferred_imports']['slow_module_for_coldstart'] == 'loaded'
+    monkeypatch.delitem(sys.modules, 'slow_module_for_coldstart')
+
+
+def test_lazy_import_returns_loaded_modules_and_rejects_missing_ones():
+    assert coldstart.lazy_import('json') is sys.modules['json']
+    with pytest.raises(ImportError):
+        coldstart.lazy_import('no_such_module_anywhere')
+
+
+def test_history_writer_starts_with_the_first_record(app_module, client, tmp_path, monkeypatch):
+    store = history.HistoryStore(str(tmp_path), flush_seconds=60)
+    monkeypatch.setattr(app_module, '_history', store)
+    client.get('/api/metrics')
+    assert not store.running
+    client.post('/api/risk', json={'crop_type': 'Wheat', 'temperature': 25, 'humidity': 60, 'distribution': False})
+    assert store.running
+    store.stop()
+
+
+def test_app_import_leaves_feature_modules_unloaded():
+    # a fresh interpreter, so modules other tests imported do not count
+    deferred = ('hazard_engine', 'bulk_eligibility', 'portfolio', 'climatology', 'history', 'alerts', 'profiler')
+    code = (
+        'import sys, app\n'
+        "assert app.app.test_client().get('/').status_code == 200\n"
+        f'print(",".join(m for m in {deferred!r} if m in sys.modules))\n'
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {**os.environ, 'AGRISPECTRA_PROFILE_TOKEN': ''}
+    done = subprocess.run([sys.executable, '-c', code], cwd=root, env=env, capture_output=True, text=True,
+                          timeout=60)
+    assert done.returncode == 0, done.stderr
+    assert done.stdout.strip() == ''
+
+
+def test_loaded_tells_deferred_modules_apart(tmp_path, monkeypatch):
+    (tmp_path / 'idle_module_for_coldstart.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    module = coldstart.lazy_import('idle_module_for_coldstart')
+    assert coldstart.loaded(sys) and not coldstart.loaded(module)
+    assert module.VALUE == 1 and coldstart.loaded(module)
+    monkeypatch.delitem(sys.modules, 'idle_module_for_coldstart')
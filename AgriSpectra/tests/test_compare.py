@@ -0,0 +1,80 @@
+import pytest
+
+import data
+import eligibility_engine
+import risk_engine
+import thresholds
+
+CROPS = ('Wheat', 'Rice', 'Onion', 'Potato', 'Coffee')
+CONDITIONS = {'temperature': 31, 'humidity': 78, 'season': 'Monsoon', 'storage_days': 60}
+
+
+@pytest.fixture
+def restore_tables():
+    saved = (risk_engine._COMPILED, eligibility_engine.SCHEMES, data.CROP_DATA, thresholds._current)
+    yield
+    risk_engine.install_rules(saved[0])
+    eligibility_engine.SCHEMES, data.CROP_DATA, thresholds._current = saved[1:]
+
+
+@pytest.mark.parametrize('temperature, humidity, season, days', [
+    (31, 78, 'Monsoon', 60), (12, 45, 'Winter', 0), (38.5, 92, 'Summer', 240), (25, 65, 'Post-harvest', 30),
+])
+def test_every_row_matches_compute_risk(temperature, humidity, season, days):
+    result = risk_engine.compare_crops(CROPS, temperature, humidity, season, days)
+    assert len(result['ranking']) == len(CROPS) * len(result['regions'])
+    for row in result['ranking']:
+        single = risk_engine.compute_risk({'crop_type': row['crop'], 'region': row['region'],
+                                           'temperature': temperature, 'humidity': humidity,
+                                           'season': season, 'storage_days': days})
+        assert row['risk_score'] == single.get('risk_score', single.get('risk_percentage'))
+        assert row['risk_level'] == single['risk_level']
+        assert 0 <= row['severity'] <= 1
+
+
+def test_ranking_is_lowest_risk_first():
+    result = risk_engine.compare_crops(CROPS, **CONDITIONS)
+    ranking = result['ranking']
+    assert [row['rank'] for row in ranking] == list(range(1, len(ranking) + 1))
+    keys = [(row['risk_score'], row['severity']) for row in ranking]
+    assert keys == sorted(keys)
+    for crop in CROPS:
+        assert result['best_region'][crop] == next(r['region'] for r in ranking if r['crop'] == crop)
+    for region in result['regions']:
+        assert result['best_crop'][region] == next(r['crop'] for r in ranking if r['region'] == region)
+    assert result['version'] == risk_engine.rules_version()
+
+
+def test_get_is_revalidated_and_answers_304_for_a_matching_etag(client):
+    response = client.get('/api/risk/compare', query_string=CONDITIONS)
+    assert response.status_code == 200
+    assert response.cache_control.no_cache and response.cache_control.max_age is None
+    etag = response.headers['ETag']
+    again = client.get('/api/risk/compare', query_string=CONDITIONS, headers={'If-None-Match': etag})
+    assert again.status_code == 304
+    other = client.get('/api/risk/compare', query_string={**CONDITIONS, 'storage_days': 61},
+                       headers={'If-None-Match': etag})
+    assert other.status_code == 200 and other.headers['ETag'] != etag
+
+
+def test_threshold_reload_changes_the_etag(client, restore_tables):
+    before = client.get('/api/risk/compare', query_string=CONDITIONS)
+    document = thresholds.export_builtin('compare-test')
+    thresholds.install(thresholds.build(document, source='test', digest='compare-test'))
+    after = client.get('/api/risk/compare', query_string=CONDITIONS,
+                       headers={'If-None-Match': before.headers['ETag']})
+    # identical tables under a new version still invalidate cached comparisons
+    assert after.status_code == 200
+    assert after.get_json()['version'] == 'compare-test'
+    assert after.headers['ETag'] != before.headers['ETag']
+
+
+def test_post_is_not_cached(client):
+    response = client.post('/api/risk/compare', json=CONDITIONS)
+    assert response.status_code == 200
+    assert 'ETag' not in response.headers
+    assert response.get_json()['conditions'] == {**CONDITIONS, 'temperature': 31.0, 'humidity': 78.0}
+
+
+def test_conditions_are_required(client):
+    assert client.get('/api/risk/compare?temperature=30').status_code == 400
@@ -0,0 +1,54 @@
+import random
+
+import pytest
+
+import risk_engine
+
+CROPS = ('wheat', 'paddy', 'rice', 'rise', 'mustard', 'sugarcane', 'black pepper', 'coffee', 'banana',
+         'potato', 'onion', 'groundnut', 'bajra', 'unknown-crop')
+REGIONS = ('North', 'South', 'East', 'West', 'Central', 'Nowhere')
+SEASONS = ('Summer', 'Monsoon', 'Winter', 'Post-harvest', 'heavy rain', 'moderate rain', '')
+
+
+# (humidity, temperature, days, season) -> score from the rice rule table:
+# (humidity band * 0.5 + temperature band * 0.3 + duration band * 0.2) * season factor
+@pytest.mark.parametrize('humidity, temperature, days, season, score, level', [
+    (70, 30, 60, 'Monsoon', 51.7, 'Medium'),      # (25 + 12 + 8) * 1.15
+    (60, 20, 10, 'Winter', 0.0, 'Low'),
+    (80, 35, 100, 'Monsoon', 100.0, 'High'),      # 103.5, capped
+    (70, 26, 31, 'moderate rain', 47.2, 'Medium'),  # (25 + 12 + 8) * 1.05
+    (65, 25, 30, 'Post-harvest', 0.0, 'Low'),     # band edges are inclusive
+])
+def test_rice_rules_match_the_rule_table(humidity, temperature, days, season, score, level):
+    result = risk_engine.compute_risk({'crop_type': 'Paddy', 'region': 'South', 'temperature': temperature,
+                                       'humidity': humidity, 'season': season, 'storage_days': days})
+    assert result['risk_percentage'] == score
+    assert result['risk_level'] == level
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_batch_scorer_matches_compute_risk(seed):
+    rng = random.Random(seed)
+    crop, region, season = rng.choice(CROPS), rng.choice(REGIONS), rng.choice(SEASONS)
+    days = rng.randint(0, 400)
+    temps = [round(rng.uniform(-5, 50), 1) for _ in range(200)]
+    rhs = [round(rng.uniform(0, 100), 1) for _ in range(200)]
+    batch = risk_engine.score_batch(crop, region, season, days, temps, rhs)
+    for temp, rh, score, level in zip(temps, rhs, batch.scores(), batch.levels()):
+        result = risk_engine.compute_risk({'crop_type': crop, 'region': region, 'temperature': temp,
+                                           'humidity': rh, 'season': season, 'storage_days': days})
+        assert score == result.get('risk_score', result.get('risk_percentage'))
+        assert batch.level_names[level] == result['risk_level']
+
+
+def test_scores_stay_in_range_and_grow_with_storage_time():
+    rng = random.Random(7)
+    for _ in range(300):
+        params = {'crop_type': rng.choice(CROPS), 'region': rng.choice(REGIONS), 'season': rng.choice(SEASONS),
+                  'temperature': rng.uniform(-5, 50), 'humidity': rng.uniform(0, 100)}
+        scores = []
+        for days in (0, 30, 90, 180, 365):
+            result = risk_engine.compute_risk({**params, 'storage_days': days})
+            scores.append(result.get('risk_score', result.get('risk_percentage')))
+        assert all(0.0 <= s <= 100.0 for s in scores)
+        assert scores == sorted(scores)
@@ -0,0 +1,132 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+from urllib.request import urlopen
+
+import pytest
+
+from deadline import Deadline, DeadlineExceeded, read_body
+
+
+class _Drip(BaseHTTPRequestHandler):
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        size = 10 if self.path == '/short' else 100
+        self.send_response(200)
+        self.send_header('Content-Length', str(size))
+        self.end_headers()
+        try:
+            for _ in range(size):
+                self.wfile.write(b'x')
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def drip_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _Drip)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}/'
+    server.shutdown()
+    server.server_close()
+
+
+def test_read_body_stops_a_slow_drip_at_the_deadline(drip_url):
+    deadline = Deadline(0.4)
+    started = time.monotonic()
+    with urlopen(drip_url, timeout=deadline.timeout(10)) as response:
+        with pytest.raises((DeadlineExceeded, OSError)):
+            read_body(response, deadline)
+    assert time.monotonic() - started < 1.0
+
+
+def test_read_body_reads_everything_within_budget(drip_url):
+    with urlopen(drip_url + 'short', timeout=10) as response:
+        assert read_body(response, Deadline(5)) == b'x' * 10
+    with urlopen(drip_url + 'short', timeout=10) as response:
+        assert read_body(response, None) == b'x' * 10
+
+
+class _SlowForecast(BaseHTTPRequestHandler):
+    """Open-Meteo stand-in: requests whose first latitude is >= 30 (or any geocoding search) hang."""
+
+    def log_message(self, fmt, *args):
+        pass
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        lats = (query.get('latitude') or ['0'])[0].split(',')
+        if self.path.startswith('/v1/search') or float(lats[0]) >= 30:
+            time.sleep(2)
+        daily = {'time': ['2024-07-01'], 'precipitation_sum': [120], 'windspeed_10m_max': [10], 'weathercode': [1],
+                 'temperature_2m_mean': [30], 'relative_humidity_2m_mean': [80]}
+        items = [{'daily': daily} for _ in lats]
+        body = json.dumps(items if len(items) > 1 else items[0]).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except OSError:
+            pass
+
+
+@pytest.fixture
+def slow_upstream(app_module, monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), _SlowForecast)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+    monkeypatch.setattr(app_module, 'FORECAST_URL', base + '/v1/forecast')
+    monkeypatch.setattr(app_module, 'GEOCODING_URL', base + '/v1/search')
+    yield app_module
+    server.shutdown()
+    server.server_close()
+
+
+BUDGET = {'X-Request-Budget-Ms': '400'}
+
+
+def test_expired_cache_entry_answers_when_the_budget_runs_out(client, slow_upstream):
+    cell = slow_upstream._grid_cell(31.0, 77.0)
+    slow_upstream._weather_cache.put(('average',) + cell, {'avg_temperature': 12.5, 'avg_humidity': 55.0,
+                                                           'days_used': 10, 'spread': None}, ttl=-1)
+    started = time.monotonic()
+    response = client.post('/api/weather-average', json={'latitude': 31.0, 'longitude': 77.0}, headers=BUDGET)
+    assert time.monotonic() - started < 1.5
+    body = response.get_json()
+    assert response.status_code == 200 and body['stale'] is True
+    assert body['source'] == 'forecast' and body['avg_temperature'] == 12.5
+
+
+def test_budget_exhausted_without_a_stale_entry_is_a_504(client, slow_upstream):
+    started = time.monotonic()
+    response = client.post('/api/weather-alerts', json={'latitude': 32.0, 'longitude': 78.0}, headers=BUDGET)
+    assert response.status_code == 504
+    response = client.post('/api/weather-average', json={'place': 'Shimla'}, headers=BUDGET)
+    assert response.status_code == 504
+    assert time.monotonic() - started < 3.0
+
+
+def test_hazard_batch_returns_what_it_fetched_in_time(client, slow_upstream):
+    fast = [{'id': f'fast-{i}', 'latitude': 20 + i * 0.01, 'longitude': 80}
+            for i in range(slow_upstream.HAZARD_BATCH_SIZE)]
+    slow = [{'id': f'slow-{i}', 'latitude': 33 + i * 0.01, 'longitude': 80} for i in range(5)]
+    response = client.post('/api/weather-alerts/batch', json={'locations': fast + slow}, headers=BUDGET)
+    body = response.get_json()
+    assert response.status_code == 200 and body['partial'] is True
+    assert body['locations_checked'] == len(fast)
+    assert {a['location_id'] for a in body['alerts']} == {loc['id'] for loc in fast}
+
+
+def test_hazard_batch_with_nothing_fetched_is_a_504(client, slow_upstream):
+    slow = [{'latitude': 34 + i * 0.01, 'longitude': 80} for i in range(3)]
+    response = client.post('/api/weather-alerts/batch', json={'locations': slow}, headers=BUDGET)
+    assert response.status_code == 504
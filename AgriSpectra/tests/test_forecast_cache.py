@@ -0,0 +1,164 @@
+import random
+import threading
+import time
+
+import pytest
+
+import forecast_cache
+
+
+def test_prefetch_counters_are_exact_under_concurrency():
+    cache = forecast_cache.ForecastCache(60)
+    scheduler = forecast_cache.PrefetchScheduler(cache, forecast_cache.HotKeyTracker())
+
+    def fail():
+        raise RuntimeError('upstream down')
+
+    def work(i):
+        for j in range(200):
+            scheduler._refresh(('k', i, j), (lambda: 1) if j % 2 else fail, None, time.monotonic())
+
+    threads = [threading.Thread(target=work, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = scheduler.stats()
+    assert stats['refreshed'] == 800
+    assert stats['failed'] == 800
+    assert stats['inflight'] == 0
+
+
+class _Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class _Pool:
+    """Stands in for the thread pool: holds submitted refreshes until run()."""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args):
+        self.pending.append((fn, args))
+
+    def run(self):
+        pending, self.pending = self.pending, []
+        for fn, args in pending:
+            fn(*args)
+
+
+class _EdgeRng:
+    """Always draws the low or the high end of the jitter range."""
+
+    def __init__(self, high):
+        self.high = high
+        self.calls = []
+
+    def uniform(self, a, b):
+        self.calls.append((a, b))
+        return b if self.high else a
+
+
+def _setup(rng=None, **kwargs):
+    clock = _Clock()
+    tracker = forecast_cache.HotKeyTracker(clock=clock)
+    cache = forecast_cache.ForecastCache(600, tracker=tracker, clock=clock)
+    options = {'refresh_ahead_seconds': 300, 'jitter_seconds': 0, **kwargs}
+    scheduler = forecast_cache.PrefetchScheduler(cache, tracker, clock=clock, rng=rng, **options)
+    scheduler._pool = _Pool()
+    return clock, cache, scheduler
+
+
+def test_entries_are_refreshed_ahead_of_expiry():
+    clock, cache, scheduler = _setup()
+    version = {'n': 0}
+
+    def load():
+        version['n'] += 1
+        return version['n']
+
+    assert cache.get_or_load('cuttack', load) == 1
+    clock.now += 299
+    assert scheduler.tick() == 0  # 301 s left, outside the 300 s window
+    clock.now += 2
+    assert scheduler.tick() == 1
+    assert cache.get('cuttack') == 1  # still served until the refresh lands
+    scheduler._pool.run()
+    assert cache.get('cuttack') == 2 and cache.expires_in('cuttack') == 600
+    stats = scheduler.stats()
+    assert stats['refreshed'] == 1 and stats['inflight'] == 0
+    # due at 300 s, ran at 301 s
+    assert stats['last_lag_seconds'] == 1.0
+
+
+def test_tick_only_considers_the_hottest_cached_keys():
+    clock, cache, scheduler = _setup(hot_keys=2)
+    for key, hits in (('a', 5), ('b', 3), ('c', 1)):
+        for _ in range(hits):
+            cache.get_or_load(key, lambda: 0)
+    # asked for but never stored: left to the next real request
+    for _ in range(10):
+        cache.tracker.record('uncached', lambda: 0)
+    clock.now += 400
+    assert scheduler.tick() == 1
+    assert [args[0] for _, args in scheduler._pool.pending] == ['a']
+
+
+@pytest.mark.parametrize('high, left, queued', [
+    (False, 301, False), (False, 299, True), (True, 359, True), (True, 361, False),
+])
+def test_jitter_widens_the_window_by_at_most_jitter_seconds(high, left, queued):
+    rng = _EdgeRng(high)
+    clock, cache, scheduler = _setup(rng=rng, jitter_seconds=60)
+    cache.get_or_load('k', lambda: 0)
+    clock.now += 600 - left
+    assert scheduler.tick() == int(queued)
+    assert rng.calls == [(0, 60)]
+
+
+def test_seeded_jitter_is_reproducible():
+    draws = []
+    for _ in range(2):
+        clock, cache, scheduler = _setup(rng=random.Random(3), jitter_seconds=60)
+        for i in range(20):
+            cache.get_or_load(i, lambda: 0)
+        clock.now += 600 - 330  # due only when the jitter draw is over 30 s
+        scheduler.tick()
+        draws.append(sorted(args[0] for _, args in scheduler._pool.pending))
+    assert draws[0] == draws[1] and 0 < len(draws[0]) < 20
+
+
+def test_refreshes_in_flight_are_capped():
+    clock, cache, scheduler = _setup(max_concurrency=2)
+    for key in 'abcde':
+        cache.get_or_load(key, lambda: 0)
+    clock.now += 400
+    assert scheduler.tick() == 2
+    # nothing new while both slots are taken, and no key is queued twice
+    assert scheduler.tick() == 0
+    assert scheduler.stats()['inflight'] == 2
+    scheduler._pool.run()
+    assert scheduler.tick() == 2
+    scheduler._pool.run()
+    assert scheduler.tick() == 1
+    scheduler._pool.run()
+    assert scheduler.stats()['refreshed'] == 5 and scheduler.stats()['scheduled'] == 5
+
+
+def test_hot_key_counts_halve_every_half_life():
+    clock = _Clock()
+    tracker = forecast_cache.HotKeyTracker(half_life_seconds=100, clock=clock)
+    for _ in range(8):
+        tracker.record('busy', lambda: 0)
+    tracker.record('once', lambda: 0)
+    clock.now += 100
+    assert [key for key, _, _ in tracker.top(5)] == ['busy', 'once']
+    assert tracker._scores['busy'] == pytest.approx(4.0)
+    clock.now += 400
+    # 'once' decayed below the floor and is forgotten
+    assert [key for key, _, _ in tracker.top(5)] == ['busy']
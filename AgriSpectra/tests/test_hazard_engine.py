@@ -0,0 +1,102 @@
+import random
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import hazard_engine
+
+
+def _reference(daily):
+    """The per-day loop the single-location endpoint used before the columnar scan."""
+    days = daily.get('time') or []
+    rain_by_day = daily.get('precipitation_sum') or []
+    wind_by_day = daily.get('windspeed_10m_max') or []
+    codes = daily.get('weathercode') or []
+    found = []
+    for idx, day in enumerate(days):
+        rain = rain_by_day[idx] if idx < len(rain_by_day) else 0
+        wind = wind_by_day[idx] if idx < len(wind_by_day) else 0
+        code = codes[idx] if idx < len(codes) else None
+        if isinstance(rain, (int, float)) and rain >= 50:
+            found.append((day, 'HEAVY_RAIN', 'SEVERE' if rain >= 100 else 'HIGH'))
+        if (isinstance(wind, (int, float)) and wind >= 62) or code in {95, 96, 99}:
+            found.append((day, 'CYCLONE_RISK', 'SEVERE'))
+    return found
+
+
+def _daily(rng, width):
+    days = [f'2024-07-{d + 1:02d}' for d in range(width)]
+    return {
+        'time': days,
+        # ragged series and junk values are padded/ignored the same way
+        'precipitation_sum': [rng.choice([0, 12.5, 49.9, 50, 99.9, 100, 180, None])
+                              for _ in range(rng.randint(0, width))],
+        'windspeed_10m_max': [rng.choice([10, 61.9, 62, 90, 'calm']) for _ in range(rng.randint(0, width))],
+        'weathercode': [rng.choice([1, 3, 61, 95, 96, 99]) for _ in range(rng.randint(0, width))],
+    }
+
+
+def test_batch_scan_matches_the_per_location_check():
+    rng = random.Random(7)
+    locations = [{'id': f'site-{i}', 'daily': _daily(rng, rng.randint(0, 7))} for i in range(60)]
+    alerts = hazard_engine.scan_hazards(locations)
+
+    for idx, loc in enumerate(locations):
+        mine = [a for a in alerts if a['location_index'] == idx]
+        assert all(a['location_id'] == loc['id'] for a in mine)
+        assert [(a['date'], a['type'], a['severity']) for a in mine] == _reference(loc['daily'])
+        single = hazard_engine.evaluate_daily(loc['daily'])
+        assert single['alerts'] == [
+            {k: v for k, v in a.items() if k not in ('location_index', 'location_id')} for a in mine
+        ]
+        assert single['forecast_days_checked'] == len(loc['daily']['time'])
+
+
+def test_missing_daily_blocks_are_skipped():
+    assert hazard_engine.scan_hazards([{}, {'daily': None}, {'daily': {'time': []}}]) == []
+    assert hazard_engine.evaluate_daily(None) == {'alerts': [], 'forecast_days_checked': 0}
+
+
+def _fake_forecasts(url, deadline=None):
+    query = parse_qs(urlparse(url).query)
+    lats = query['latitude'][0].split(',')
+    items = [
+        {'daily': {'time': ['2024-07-01'], 'precipitation_sum': [120 if float(lat) > 20 else 0],
+                   'windspeed_10m_max': [10], 'weathercode': [1]}}
+        for lat in lats
+    ]
+    return items if len(items) > 1 else items[0]
+
+
+def test_batch_route_scans_every_location(client, app_module, monkeypatch):
+    calls = []
+
+    def fetch(url, deadline=None):
+        calls.append(url)
+        return _fake_forecasts(url, deadline)
+
+    monkeypatch.setattr(app_module, '_fetch_json', fetch)
+    locations = [{'id': f'wh-{i}', 'latitude': 15 + i * 0.1, 'longitude': 80} for i in range(120)]
+    body = client.post('/api/weather-alerts/batch', json={'locations': locations + ['junk', {'latitude': 'x'}]})
+    assert body.status_code == 200
+    body = body.get_json()
+    assert body['locations_checked'] == 120 and body['partial'] is False
+    assert len(calls) == 3  # batches of HAZARD_BATCH_SIZE
+    flagged = {a['location_id'] for a in body['alerts']}
+    assert flagged == {loc['id'] for loc in locations if loc['latitude'] > 20}
+
+
+def test_batch_route_caps_the_number_of_locations(client, app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'HAZARD_BATCH_MAX_LOCATIONS', 5)
+    monkeypatch.setattr(app_module, '_fetch_json', _fake_forecasts)
+    locations = [{'latitude': 21, 'longitude': 80}] * 6
+    response = client.post('/api/weather-alerts/batch', json={'locations': locations})
+    assert response.status_code == 400
+    assert 'at most 5' in response.get_json()['error']
+    response = client.post('/api/weather-alerts/batch', json={'locations': locations[:5]})
+    assert response.status_code == 200
+
+
+@pytest.mark.parametrize('body', [{}, {'locations': []}, {'locations': 'Cuttack'}, {'locations': [{'latitude': 1}]}])
+def test_batch_route_needs_coordinates(client, body):
+    assert client.post('/api/weather-alerts/batch', json=body).status_code == 400
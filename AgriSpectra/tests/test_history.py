@@ -0,0 +1,75 @@
+import time
+
+import history
+
+
+def test_records_round_trip_through_a_segment(tmp_path):
+    store = history.HistoryStore(str(tmp_path))
+    at = 1_700_000_000
+    store.record('risk', 'Wheat', 'North', 'Medium', 42.25, -3.4, 71.0, 30, at=at)
+    store.record('portfolio', 'Paddy ', 'East', 'critical', 88.0, 31.2, 90.5, 120, warehouse='WH-1', schemes=3,
+                 at=at + 60)
+    store.record('assess', 'Onion', 'West', None, None, None, None, None, at=at + 120)
+    assert store.flush() == 3
+
+    newest, middle, oldest = history.HistoryStore(str(tmp_path)).query(limit=10)
+    assert oldest == {
+        'at': '2023-11-14T22:13:20Z', 'ts': at, 'source': 'risk', 'crop_type': 'wheat', 'region': 'north',
+        'warehouse_id': None, 'risk_level': 'MODERATE', 'risk_score': 42.2, 'temperature': -3.4,
+        'humidity': 71.0, 'storage_days': 30, 'eligible_schemes': None,
+    }
+    assert middle['crop_type'] == 'paddy' and middle['warehouse_id'] == 'wh-1'
+    assert middle['risk_level'] == 'CRITICAL' and middle['eligible_schemes'] == 3 and middle['humidity'] == 90.5
+    assert newest['risk_level'] == 'UNKNOWN'
+    assert newest['risk_score'] is None and newest['temperature'] is None and newest['storage_days'] is None
+
+
+def test_non_finite_and_huge_values_are_stored_safely(tmp_path):
+    store = history.HistoryStore(str(tmp_path))
+    store.record('risk', 'wheat', 'north', 'HIGH', float('inf'), 1e308, float('nan'), 1e308, at=1_700_000_000)
+    assert store.flush() == 1
+    assert store.dropped == 0
+    (row,) = store.query()
+    assert row['risk_score'] is None and row['humidity'] is None
+    assert row['temperature'] == 3276.7 and row['storage_days'] == 65534
+
+
+def test_a_failing_batch_does_not_stop_the_writer(tmp_path, monkeypatch):
+    store = history.HistoryStore(str(tmp_path), flush_seconds=0.01)
+    encode = store._encode
+    calls = []
+
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        return encode(batch)
+
+    monkeypatch.setattr(store, '_encode', flaky)
+    store.start()
+    store.record('risk', 'wheat', 'north', 'SAFE', 1.0, at=1_700_000_000)
+    _wait(lambda: calls)
+    store.record('risk', 'wheat', 'north', 'SAFE', 2.0, at=1_700_000_001)
+    _wait(lambda: store.flushes)
+    assert store.running and store.dropped == 1 and store.last_error == 'boom'
+    assert [row['risk_score'] for row in store.query()] == [2.0]
+    store.stop()
+
+
+def test_a_dead_writer_is_restarted(tmp_path, monkeypatch):
+    store = history.HistoryStore(str(tmp_path), flush_seconds=0.01)
+    monkeypatch.setattr(store, '_run', lambda: None)
+    store.start()
+    store._thread.join()
+    assert not store.running
+    monkeypatch.undo()
+    store.start()
+    assert store.running and store.stats()['writer_restarts'] == 1
+    store.stop()
+
+
+def _wait(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, 'timed out'
+        time.sleep(0.01)
@@ -0,0 +1,57 @@
+import random
+
+import pytest
+
+import risk_engine
+
+RANK = {'SAFE': 0, 'LOW': 0, 'MODERATE': 1, 'MEDIUM': 1, 'HIGH': 2, 'CRITICAL': 3, 'VERY HIGH': 3}
+CROPS = ('wheat', 'onion', 'potato', 'rice', 'banana', 'coffee', 'unknown-crop')
+REGIONS = ('North', 'South', 'East', 'West', 'Central')
+SEASONS = ('Summer', 'Monsoon', 'Winter', 'Post-harvest')
+HORIZON = 800
+
+
+def _rank(crop, region, temp, rh, season, days):
+    result = risk_engine.compute_risk({'crop_type': crop, 'region': region, 'temperature': temp,
+                                       'humidity': rh, 'season': season, 'storage_days': days})
+    return RANK[result['risk_level'].upper()]
+
+
+def _configs(n, seed):
+    rng = random.Random(seed)
+    for _ in range(n):
+        yield (rng.choice(CROPS), rng.choice(REGIONS), round(rng.uniform(5, 42), 1),
+               round(rng.uniform(20, 98), 1), rng.choice(SEASONS))
+
+
+@pytest.mark.parametrize('config', list(_configs(60, seed=1)))
+def test_days_to_levels_matches_a_day_by_day_scan(config):
+    crop, region, temp, rh, season = config
+    ranks = [_rank(crop, region, temp, rh, season, d) for d in range(HORIZON)]
+    found = risk_engine.days_to_levels(crop, region, temp, rh, season)['days_to_level']
+    for level, day in found.items():
+        target = RANK[level]
+        expected = next((d for d, r in enumerate(ranks) if r >= target), None)
+        assert day == expected, (level, day, expected)
+
+
+@pytest.mark.parametrize('config', list(_configs(40, seed=2)))
+def test_safe_envelope_edges_are_tight(config):
+    crop, region, _, _, season = config
+    days = random.Random(str(config)).randint(0, 400)
+    # each band is solved with the other variable held at the profile's reference point
+    ref_temp, ref_rh = risk_engine._inversion_profile(risk_engine._COMPILED, crop, region, season)['reference']
+    for level, bands in risk_engine.safe_envelope(crop, region, season, days).items():
+        target = RANK[level]
+        if bands is None:
+            assert _rank(crop, region, ref_temp, ref_rh, season, days) > target
+            continue
+        t_band, h_band = bands['temperature'], bands['humidity']
+        for edge, step in ((t_band['min'], -0.1), (t_band['max'], 0.1)):
+            if edge is not None:
+                assert _rank(crop, region, edge, ref_rh, season, days) <= target
+                assert _rank(crop, region, round(edge + step, 1), ref_rh, season, days) > target
+        for edge, step in ((h_band['min'], -0.1), (h_band['max'], 0.1)):
+            if edge is not None:
+                assert _rank(crop, region, ref_temp, edge, season, days) <= target
+                assert _rank(crop, region, ref_temp, round(edge + step, 1), season, days) > target
@@ -0,0 +1,70 @@
+import json
+import random
+from urllib.parse import parse_qs
+
+import pytest
+
+import loadgen
+
+
+@pytest.mark.parametrize('pct, expected', [(0, 1), (1, 1), (10, 1), (11, 2), (50, 5), (95, 10), (99, 10), (100, 10)])
+def test_percentile_uses_the_nearest_rank(pct, expected):
+    assert loadgen.percentile(list(range(1, 11)), pct) == expected
+
+
+def test_percentile_edge_cases():
+    assert loadgen.percentile([], 50) is None
+    assert loadgen.percentile([0.25], 1) == 0.25 and loadgen.percentile([0.25], 99) == 0.25
+    values = sorted(i / 1000 for i in range(1000))
+    # nearest rank: the smallest value with at least pct% of samples at or below it
+    assert loadgen.percentile(values, 50) == 0.499
+    assert loadgen.percentile(values, 95) == 0.949
+    assert loadgen.percentile(values, 99) == 0.989
+
+
+def test_parse_mix_reads_weights():
+    assert loadgen._parse_mix(None) is None and loadgen._parse_mix('') is None
+    assert loadgen._parse_mix('api_risk=5, static=1') == {'api_risk': 5, 'static': 1}
+    # a bare name counts once
+    assert loadgen._parse_mix('calculator') == {'calculator': 1}
+    assert loadgen._parse_mix('api_risk=0,static=2') == {'api_risk': 0, 'static': 2}
+
+
+@pytest.mark.parametrize('text, message', [
+    ('api_rsk=5', 'unknown route'),
+    ('api_risk=lots', 'whole number'),
+    ('api_risk=1.5', 'whole number'),
+    ('api_risk=-2,static=3', 'negative'),
+    ('api_risk=0,static=0', 'positive weight'),
+])
+def test_parse_mix_rejects_bad_specs(text, message):
+    with pytest.raises(SystemExit, match=message):
+        loadgen._parse_mix(text)
+
+
+@pytest.mark.parametrize('route', sorted(loadgen.DEFAULT_MIX))
+def test_build_request_makes_well_formed_requests(route):
+    method, path, body, ctype = loadgen.build_request(route, random.Random(1))
+    assert path.startswith('/')
+    if method == 'GET':
+        assert body is None and ctype is None and path in loadgen.STATIC_PATHS
+    elif ctype == 'application/json':
+        assert isinstance(json.loads(body), dict)
+    else:
+        assert ctype == 'application/x-www-form-urlencoded'
+        assert {'crop_type', 'place', 'temperature'} <= set(parse_qs(body.decode()))
+
+
+def test_build_request_is_reproducible_and_rejects_unknown_routes():
+    assert loadgen.build_request('api_risk', random.Random(5)) == loadgen.build_request('api_risk', random.Random(5))
+    with pytest.raises(ValueError):
+        loadgen.build_request('nope', random.Random(0))
+
+
+@pytest.mark.parametrize('route', ['calculator', 'api_risk', 'api_eligibility', 'api_assess', 'static'])
+def test_generated_requests_are_accepted_by_the_app(client, route):
+    rng = random.Random(2)
+    for _ in range(5):
+        method, path, body, ctype = loadgen.build_request(route, rng)
+        response = client.open(path, method=method, data=body, content_type=ctype)
+        assert response.status_code == 200, (path, response.status_code)
@@ -0,0 +1,78 @@
+import json
+import random
+import threading
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+import openmeteo_stub
+
+
+@pytest.fixture(scope='module')
+def stub_url():
+    server = openmeteo_stub.make_server('127.0.0.1', 0)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f'http://127.0.0.1:{server.server_port}'
+    server.shutdown()
+    server.server_close()
+
+
+def _get(url):
+    try:
+        with urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as exc:
+        return exc.code, json.loads(exc.read())
+
+
+@pytest.mark.parametrize('query', [
+    'latitude=abc&longitude=80',
+    'latitude=20&longitude=80,x',
+    'latitude=20&longitude=80&forecast_days=seven',
+    'latitude=20&longitude=80&forecast_days=99',
+    'latitude=20,21&longitude=80',
+])
+def test_malformed_forecast_queries_get_400(stub_url, query):
+    status, body = _get(f'{stub_url}/v1/forecast?{query}&daily=precipitation_sum')
+    assert status == 400
+    assert body['error'] is True
+
+
+def test_forecast_is_deterministic(stub_url):
+    url = f'{stub_url}/v1/forecast?latitude=20,21&longitude=80,81&daily=temperature_2m_mean&forecast_days=3'
+    first, second = _get(url), _get(url)
+    assert first == second
+    assert first[0] == 200
+    assert len(first[1]) == 2
+    assert len(first[1][0]['daily']['temperature_2m_mean']) == 3
+
+
+@pytest.mark.parametrize('spec, low, high', [
+    ('none', 0, 0), ('', 0, 0), ('fixed:50', 0.05, 0.05), ('uniform:20,200', 0.02, 0.2),
+    ('normal:100,30', 0, None), ('lognormal:120,0.6', 0, None), ('exp:80', 0, None),
+])
+def test_latency_specs_sample_seconds(spec, low, high):
+    sample = openmeteo_stub.parse_latency(spec, random.Random(1))
+    for _ in range(50):
+        value = sample()
+        assert value >= low and (high is None or value <= high)
+
+
+@pytest.mark.parametrize('spec, message', [
+    ('gamma:10', 'unknown latency spec'),
+    ('fixed', 'must be fixed:MS'),
+    ('uniform:20', 'must be uniform:LO,HI'),
+    ('fixed:50,60', 'must be fixed:MS'),
+    ('fixed:fast', 'numbers in milliseconds'),
+    ('fixed:-5', 'MS must be a non-negative number'),
+    ('normal:nan,10', 'MEAN must be a non-negative number'),
+    ('uniform:200,20', 'LO must not exceed HI'),
+    ('lognormal:0,0.5', 'MEDIAN must be greater than zero'),
+    ('exp:0', 'MEAN must be greater than zero'),
+])
+def test_malformed_latency_specs_fail_at_startup(spec, message):
+    with pytest.raises(ValueError, match=message):
+        openmeteo_stub.StubConfig(latency=spec)
+    with pytest.raises(SystemExit):
+        openmeteo_stub.main(['--latency', spec])
@@ -0,0 +1,89 @@
+import pytest
+
+import portfolio
+
+
+def _lot(lot_id, **extra):
+    return {'lot_id': lot_id, 'crop_type': 'Wheat', 'region': 'North', 'temperature': 30, 'humidity': 70,
+            'storage_days': 20, 'quantity': 10, 'value': 100, **extra}
+
+
+def test_batch_with_an_invalid_lot_applies_nothing():
+    book = portfolio.Portfolio('wh-batch')
+    book.upsert(_lot('a'))
+    with pytest.raises(portfolio.PortfolioError, match=r'lots\[2\]'):
+        book.upsert_many([_lot('a', quantity=99), _lot('b'), _lot('c', temperature='warm')])
+    assert book.get('a')['quantity'] == 10
+    assert book.get('b') is None
+    assert book.summary(top=0)['lots'] == 1
+
+
+def test_batch_totals_match_one_by_one_upserts():
+    one_by_one = portfolio.Portfolio('wh-1')
+    batched = portfolio.Portfolio('wh-2')
+    lots = [_lot(str(i), temperature=20 + i, quantity=i + 1) for i in range(10)] + [_lot('3', humidity=90)]
+    for lot in lots:
+        one_by_one.upsert(lot)
+    batched.upsert_many(lots)
+    first, second = one_by_one.summary(), batched.summary()
+    first.pop('warehouse_id'), second.pop('warehouse_id')
+    assert first == second
+
+
+def test_filters_ignore_case():
+    book = portfolio.Portfolio('wh-case')
+    book.upsert(_lot('a', crop_type='Onion', region='South'))
+    lot = book.get('a')
+    assert [l['lot_id'] for l in book.lots(crop='ONION', region='south', level=lot['risk_level'].lower())] == ['a']
+    assert book.lots(region='North') == []
+
+
+def test_api_rejects_a_bad_batch_without_partial_commit(client):
+    rv = client.post('/api/portfolio/wh-api/lots', json={'lots': [_lot('x'), _lot('y', humidity='damp')]})
+    assert rv.status_code == 400
+    # the rejected batch does not leave an empty warehouse behind
+    assert client.get('/api/portfolio/wh-api/lots').status_code == 404
+    rv = client.post('/api/portfolio/wh-api/lots', json={'lots': [_lot('x', region='East')]})
+    assert rv.status_code == 200
+    assert len(client.get('/api/portfolio/wh-api/lots?region=east').get_json()['lots']) == 1
+
+
+@pytest.mark.parametrize('field, value', [
+    ('value', 'nan'), ('quantity', 'inf'), ('storage_days', 'inf'), ('storage_days', '-1e309'),
+    ('value', -5), ('quantity', '-1'), ('storage_days', -3), ('temperature', 'nan'),
+])
+def test_rejects_non_finite_and_negative_amounts(field, value):
+    book = portfolio.Portfolio('wh-finite')
+    book.upsert(_lot('a'))
+    before = book.summary()
+    with pytest.raises(portfolio.PortfolioError, match=field):
+        book.upsert(_lot('a', **{field: value}))
+    with pytest.raises(portfolio.PortfolioError, match=field):
+        book.upsert(_lot('b', **{field: value}))
+    assert book.summary() == before
+
+
+def test_negative_temperature_is_still_accepted():
+    book = portfolio.Portfolio('wh-cold')
+    assert book.upsert(_lot('a', temperature=-4))['temperature'] == -4.0
+
+
+def test_api_answers_non_finite_lots_with_400(client):
+    rv = client.post('/api/portfolio/wh-nan/lots', json=_lot('x', storage_days='inf'))
+    assert rv.status_code == 400
+    rv = client.post('/api/portfolio/wh-nan/lots', json=_lot('x', value='nan'))
+    assert rv.status_code == 400
+    assert client.get('/api/portfolio/wh-nan').status_code == 404
+
+
+@pytest.mark.parametrize('days', [-1, 1e30, 'inf', 'nan', 'soon'])
+def test_tick_rejects_bad_day_counts(client, days):
+    assert client.post('/api/portfolio/tick', json={'days': days}).status_code == 400
+
+
+def test_tick_ages_lots(client):
+    client.post('/api/portfolio/wh-tick/lots', json=_lot('a', storage_days=5))
+    rv = client.post('/api/portfolio/tick', json={'days': 3})
+    assert rv.status_code == 200
+    assert rv.get_json()['aged']['wh-tick']['days'] == 3
+    assert client.get('/api/portfolio/wh-tick/lots').get_json()['lots'][0]['storage_days'] == 8
@@ -0,0 +1,69 @@
+import cProfile
+
+import pytest
+from flask import Flask
+
+import profiler
+
+
+@pytest.fixture
+def prof():
+    return profiler.Profiler('t0ken', rate_per_minute=100)
+
+
+def test_only_one_cprofile_trace_at_a_time(prof):
+    first = prof.begin('cprofile', 'GET', '/a')
+    second = prof.begin('cprofile', 'GET', '/b')
+    assert first[0].mode == 'cprofile' and second[0].mode == 'sample'
+    assert prof.stats()['cprofile_busy'] == 1
+    prof.end(second, 200)
+    assert prof.end(first, 200).functions
+    third = prof.begin('cprofile', 'GET', '/c')
+    assert third[0].mode == 'cprofile'
+    prof.end(third, 200)
+
+
+def test_cprofile_that_cannot_start_falls_back_to_sampling(prof, monkeypatch):
+    class Broken:
+        def enable(self):
+            raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(cProfile, 'Profile', Broken)
+    handle = prof.begin('cprofile', 'GET', '/a')
+    assert handle[0].mode == 'sample' and prof.stats()['errors'] == 1
+    prof.end(handle, 200)
+    monkeypatch.undo()
+    handle = prof.begin('cprofile', 'GET', '/b')
+    assert handle[0].mode == 'cprofile'
+    prof.end(handle, 200)
+
+
+def test_profiling_errors_never_fail_the_request(monkeypatch):
+    app = Flask(__name__)
+
+    @app.route('/ping')
+    def ping():
+        return 'pong'
+
+    installed = profiler.install(app, token='t0ken')
+    client = app.test_client()
+    headers = {profiler.HEADER: 't0ken', profiler.MODE_HEADER: 'cprofile'}
+    response = client.get('/ping', headers=headers)
+    assert response.status_code == 200 and profiler.ID_HEADER in response.headers
+
+    def broken(*args, **kwargs):
+        raise RuntimeError('boom')
+
+    real_end = installed.end
+
+    def end_then_fail(handle, status=None):
+        # stop the collector first so it does not outlive the test
+        real_end(handle, status)
+        raise RuntimeError('boom')
+
+    monkeypatch.setattr(installed, 'end', end_then_fail)
+    response = client.get('/ping', headers=headers)
+    assert response.status_code == 200 and response.data == b'pong'
+    monkeypatch.setattr(installed, 'begin', broken)
+    assert client.get('/ping', headers=headers).status_code == 200
+    assert installed.stats()['errors'] == 2
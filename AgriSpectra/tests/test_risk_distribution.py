@@ -0,0 +1,51 @@
+import pytest
+
+import risk_distribution
+import risk_engine
+
+PARAMS = {'crop_type': 'Wheat', 'region': 'North', 'temperature': 28, 'humidity': 70, 'season': 'Monsoon',
+          'storage_days': 60}
+
+
+@pytest.mark.parametrize('forecast', [
+    {'temperature': [1, 2, 3], 'humidity': 5},
+    {'temperature': 'hot', 'humidity': [60, 70]},
+    {'temperature': [20, None, 22], 'humidity': [60, 70, 80]},
+    {'temperature': [20, 21], 'humidity': [60, float('nan')]},
+    {'temperature': [20, True], 'humidity': [60, 70]},
+])
+def test_malformed_forecast_series_is_rejected(forecast):
+    with pytest.raises(risk_distribution.DistributionError):
+        risk_distribution.simulate_request({**PARAMS, 'forecast': forecast})
+
+
+@pytest.mark.parametrize('path', ['/api/risk', '/api/assess'])
+def test_malformed_forecast_is_a_400(client, path):
+    response = client.post(path, json={**PARAMS, 'forecast': {'temperature': [1, 2, 3], 'humidity': 5}})
+    assert response.status_code == 400
+    assert 'forecast.humidity' in response.get_json()['error']
+
+
+def test_forecast_series_sets_the_spread():
+    result = risk_distribution.simulate_request(
+        {**PARAMS, 'forecast': {'temperature': [26, 28, 30, 29], 'humidity': [75, 70, 62, 66]}})
+    assert result['assumed']['source'] == 'forecast'
+    assert result['assumed']['correlation'] < 0
+    assert abs(sum(result['level_probabilities'].values()) - 1.0) < 0.01
+
+
+def test_spread_from_series_skips_missing_days_and_ignores_non_lists():
+    assert risk_distribution.spread_from_series([20, None, 22, 24], [60, 70, None, 80]) == \
+        risk_distribution.spread_from_series([20, 24], [60, 80])
+    assert risk_distribution.spread_from_series(5, [1, 2]) is None
+
+
+def test_simulation_uses_the_parsed_record():
+    inputs = risk_engine.normalize_inputs({**PARAMS, 'crop_type': 'RISE', 'storage_days': '60'})
+    assert inputs.crop_type == 'rice'
+    by_record = risk_distribution.simulate(inputs)
+    by_payload = risk_distribution.simulate_request({**PARAMS, 'crop_type': 'rice'})
+    assert by_record == by_payload
+    zero = risk_distribution.simulate(inputs, temperature_sd=0, humidity_sd=0)
+    expected = risk_engine.evaluate(inputs)
+    assert zero['level_probabilities'][expected['risk_level']] == 1.0
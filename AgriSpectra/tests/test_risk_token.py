@@ -0,0 +1,46 @@
+import pytest
+
+import risk_engine
+import risk_token
+
+PARAMS = {'crop_type': 'Onion', 'region': 'South', 'temperature': 31, 'humidity': 78,
+          'season': 'Monsoon', 'storage_days': 40}
+SECRET = 'test-secret'
+
+
+def _issue(params=PARAMS, version='v1'):
+    return risk_token.issue(risk_engine.compute_risk(params), params, SECRET, version)
+
+
+def test_round_trip():
+    payload = risk_token.verify(_issue(), PARAMS, SECRET, version='v1')
+    assert payload['l'] == risk_engine.compute_risk(PARAMS)['risk_level']
+
+
+def test_parsed_record_and_payload_share_a_fingerprint():
+    assert risk_token.verify(_issue(), risk_engine.normalize_inputs(PARAMS), SECRET) is not None
+
+
+@pytest.mark.parametrize('change', [{'humidity': 79}, {'crop_type': 'Wheat'}, {'storage_days': 41}])
+def test_other_inputs_are_rejected(change):
+    assert risk_token.verify(_issue(), {**PARAMS, **change}, SECRET) is None
+
+
+def test_tampering_wrong_secret_version_and_age_are_rejected():
+    token = _issue()
+    body, sig = token.split('.')
+    assert risk_token.verify(body + '.' + sig[::-1], PARAMS, SECRET) is None
+    assert risk_token.verify(token, PARAMS, 'other-secret') is None
+    assert risk_token.verify(token, PARAMS, SECRET, version='v2') is None
+    assert risk_token.verify(token, PARAMS, SECRET, max_age=-1) is None
+
+
+@pytest.mark.parametrize('token', [None, '', 123, 1.5, ['a'], {'a': 1}, True, 'no-dot', 'a.b.c', 'é.x'])
+def test_malformed_tokens_are_ignored(token):
+    assert risk_token.verify(token, PARAMS, SECRET) is None
+
+
+@pytest.mark.parametrize('token', [123, ['a'], {'x': 1}])
+def test_eligibility_ignores_non_string_tokens(client, token):
+    rv = client.post('/api/eligibility', json={**PARAMS, 'state': 'Punjab', 'risk_token': token})
+    assert rv.status_code == 200
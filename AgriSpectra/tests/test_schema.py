@@ -0,0 +1,105 @@
+import pytest
+
+import risk_engine
+import schema
+
+SAMPLE = schema.Schema('Sample', (
+    schema.Field('name', 'text', 'none'),
+    schema.Field('count', 'integer', 0),
+    schema.Field('days', 'days', 0),
+    schema.Field('size', 'number', None, strict=True),
+    schema.Field('code', 'key', ''),
+    schema.Field('label', 'trimmed', required=True),
+))
+
+
+def test_fields_are_coerced_in_one_pass():
+    record = SAMPLE({'name': 'Wheat', 'count': '3', 'days': '30.5', 'size': '1.5', 'code': ' AB ', 'label': ' x '})
+    assert record == ('Wheat', 3, 30, 1.5, 'ab', 'x')
+
+
+def test_missing_and_empty_values_take_defaults():
+    record = SAMPLE({'name': '', 'count': None, 'days': '', 'label': 'x'})
+    assert record == ('none', 0, 0, None, '', 'x')
+
+
+@pytest.mark.parametrize('value, expected', [(5, '5'), (2.5, '2.5'), ([1], 'none'), ({'a': 1}, 'none'), (True, 'none')])
+def test_text_fields_only_hold_strings(value, expected):
+    assert SAMPLE({'name': value, 'label': 'x'}).name == expected
+
+
+@pytest.mark.parametrize('value, expected', [('45', 45), (45.9, 45), ('-1', 0), ('nan', 0), ('1e400', 0), ('soon', 0)])
+def test_days_are_whole_and_non_negative(value, expected):
+    assert SAMPLE({'days': value, 'label': 'x'}).days == expected
+
+
+def test_required_and_strict_fields_raise():
+    with pytest.raises(schema.SchemaError, match='label is required'):
+        SAMPLE({})
+    with pytest.raises(schema.SchemaError, match='size must be a number'):
+        SAMPLE({'label': 'x', 'size': 'big'})
+    strict = schema.Schema('Strict', [schema.Field('days', 'days', 0, strict=True)])
+    with pytest.raises(schema.SchemaError, match='non-negative number of days'):
+        strict({'days': -3})
+
+
+@pytest.mark.parametrize('value', ['nan', 'inf', '-inf', '1e400', float('nan'), float('inf')])
+def test_numbers_must_be_finite(value):
+    with pytest.raises(schema.SchemaError, match='size must be a number'):
+        SAMPLE({'label': 'x', 'size': value})
+    lenient = schema.Schema('Lenient', [schema.Field('size', 'number', 7.0)])
+    assert lenient({'size': value}).size == 7.0
+
+
+def test_derive_overrides_single_fields():
+    derived = risk_engine.RISK_INPUTS.derive('Strict', storage_days={'strict': True})
+    assert derived({'storage_days': '12'}).storage_days == 12
+    with pytest.raises(schema.SchemaError):
+        derived({'storage_days': 'later'})
+
+
+@pytest.mark.parametrize('path', [
+    '/api/risk', '/api/assess', '/api/eligibility', '/api/risk/limits', '/api/risk/compare',
+    '/api/weather-average', '/api/weather-alerts', '/api/weather-alerts/batch', '/api/alerts/subscriptions',
+    '/api/portfolio/wh-1/lots', '/api/portfolio/tick', '/calculator/fragments',
+])
+@pytest.mark.parametrize('body', [[1, 2], 'text', 5])
+def test_json_bodies_must_be_objects(client, path, body):
+    response = client.post(path, json=body)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'request body must be a JSON object'
+
+
+@pytest.mark.parametrize('path', ['/api/risk', '/api/assess', '/api/eligibility'])
+def test_numeric_text_fields_do_not_crash(client, path):
+    response = client.post(path, json={'crop_type': 5, 'season': 5, 'region': 7, 'risk_level': 3,
+                                       'temperature': 25, 'humidity': 60, 'storage_days': 30})
+    assert response.status_code == 200
+
+
+def test_compare_and_risk_read_storage_days_alike(client):
+    conditions = {'temperature': 28, 'humidity': 72, 'season': 'Monsoon'}
+    for days in ('30.5', 30, '-4'):
+        compared = client.post('/api/risk/compare', json={**conditions, 'storage_days': days}).get_json()
+        row = next(r for r in compared['ranking'] if r['crop'] == 'Wheat' and r['region'] == 'North')
+        risk = risk_engine.compute_risk({**conditions, 'crop_type': 'Wheat', 'region': 'North', 'storage_days': days})
+        assert row['risk_score'] == risk['risk_score']
+
+
+@pytest.mark.parametrize('field', ['temperature', 'humidity'])
+@pytest.mark.parametrize('value', ['nan', 'inf', '-Infinity'])
+def test_limits_and_compare_reject_non_finite_conditions(client, field, value):
+    body = {'crop_type': 'Wheat', 'region': 'North', 'temperature': 30, 'humidity': 70, field: value}
+    assert client.post('/api/risk/limits', json=body).status_code == 400
+    assert client.post('/api/risk/compare', json=body).status_code == 400
+    assert client.get('/api/risk/compare', query_string=body).status_code == 400
+
+
+@pytest.mark.parametrize('field', ['latitude', 'longitude'])
+def test_alert_subscriptions_reject_non_finite_coordinates(field):
+    import alerts
+
+    payload = {'warehouse_id': 'wh', 'latitude': 20, 'longitude': 85, 'crop_type': 'Wheat',
+               'webhook': 'https://hooks.example.com/x', field: 'nan'}
+    with pytest.raises(schema.SchemaError, match=field):
+        alerts.SUBSCRIPTION(payload)
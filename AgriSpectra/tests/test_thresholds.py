@@ -0,0 +1,56 @@
+import json
+import os
+
+import pytest
+
+import data
+import eligibility_engine
+import risk_engine
+import thresholds
+
+
+@pytest.fixture
+def restore_tables():
+    saved = (risk_engine._COMPILED, eligibility_engine.SCHEMES, data.CROP_DATA, thresholds._current)
+    yield
+    risk_engine.install_rules(saved[0])
+    eligibility_engine.SCHEMES, data.CROP_DATA, thresholds._current = saved[1:]
+
+
+def _write(path, document, mtime):
+    path.write_text(json.dumps(document), encoding='utf-8')
+    os.utime(path, ns=(mtime, mtime))
+
+
+def test_changed_file_needs_a_new_version(tmp_path, restore_tables):
+    path = tmp_path / 'thresholds.json'
+    document = thresholds.export_builtin('v1')
+    _write(path, document, 1_000_000_000)
+    watcher = thresholds.ThresholdWatcher(str(path), poll_seconds=0)
+    assert watcher.check()
+    assert risk_engine.rules_version() == 'v1'
+    digest = thresholds.current().digest
+
+    document['crops']['wheat']['storage_days_safe'] += 30
+    _write(path, document, 2_000_000_000)
+    assert not watcher.check()
+    assert thresholds.current().digest == digest
+    assert watcher.failures == 1 and 'bump the version' in watcher.last_error
+
+    document['version'] = 'v2'
+    _write(path, document, 3_000_000_000)
+    assert watcher.check()
+    assert risk_engine.rules_version() == 'v2'
+    assert risk_engine.CROPS['wheat']['storage_days_safe'] == document['crops']['wheat']['storage_days_safe']
+    assert watcher.last_error is None
+
+
+def test_unchanged_content_is_not_reinstalled(tmp_path, restore_tables):
+    path = tmp_path / 'thresholds.json'
+    document = thresholds.export_builtin('v1')
+    _write(path, document, 1_000_000_000)
+    watcher = thresholds.ThresholdWatcher(str(path), poll_seconds=0)
+    assert watcher.check()
+    _write(path, document, 2_000_000_000)
+    assert not watcher.check()
+    assert watcher.failures == 0 and watcher.reloads == 1
@@ -0,0 +1,362 @@
+"""Threshold tables loaded from a versioned data file, hot-reloaded.
+
+The crop thresholds (`risk_engine.CROPS`), regional biases
+(`risk_engine.REGION_ADJUSTMENTS`), respiration factors, `data.CROP_DATA`
+and the scheme catalogue (`eligibility_engine.SCHEMES`) can be overridden
+by a JSON file:
+
+    {"version": "2025-06-01", "crops": {...}, "region_adjustments": {...},
+     "respiration_factor": {...}, "crop_data": {...}, "schemes": {...}}
+
+Every section is optional and falls back to the built-in tables. A
+`ThresholdWatcher` polls the file; when it changes, the new tables are
+validated and compiled on the watcher thread and then installed by swapping
+references, so requests keep running on the old version until the new one
+is complete. A file that fails validation is reported and ignored, and the
+previous version stays active. So is a changed file that keeps the active
+`version` label: rendered fragments and risk tokens are keyed by the label,
+so every content change must come with a new one.
+
+    python thresholds.py --export thresholds.json   # write the built-in tables
+    python thresholds.py --check thresholds.json    # validate without installing
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+import crop_rules
+import data
+import eligibility_engine
+import risk_engine
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+
+SECTIONS = ('crops', 'region_adjustments', 'respiration_factor', 'crop_data', 'schemes')
+
+# fields evaluate_eligibility reads from each scheme
+SCHEME_FIELDS = ('name', 'purpose', 'action', 'link', 'icon', 'type')
+
+
+class ThresholdError(ValueError):
+    pass
+
+
+# Built-in tables as shipped in the modules, captured before any reload
+_BUILTIN = {
+    'crops': copy.deepcopy({k: v for k, v in risk_engine.CROPS.items() if k != 'rice'}),
+    'region_adjustments': copy.deepcopy(risk_engine.REGION_ADJUSTMENTS),
+    'respiration_factor': copy.deepcopy(risk_engine.RESPIRATION_FACTOR),
+    'crop_data': copy.deepcopy(data.CROP_DATA),
+    'schemes': copy.deepcopy(eligibility_engine.SCHEMES),
+}
+
+
+def _range(value, where: str) -> Tuple[float, float]:
+    try:
+        low, high = value
+        low, high = (x if isinstance(x, int) else float(x) for x in (low, high))
+    except (TypeError, ValueError):
+        raise ThresholdError(f'{where} must be a [low, high] pair of numbers')
+    if low > high:
+        raise ThresholdError(f'{where}: low {low} is above high {high}')
+    return low, high
+
+
+def _number(value, where: str) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ThresholdError(f'{where} must be a number')
+    return value
+
+
+def _section(document: Dict, name: str) -> Dict:
+    value = document.get(name, _BUILTIN[name])
+    if not isinstance(value, dict) or not value:
+        raise ThresholdError(f'{name} must be a non-empty object')
+    return value
+
+
+def _parse_crops(raw: Dict, respiration_factor: Dict) -> Dict:
+    crops = {}
+    for name, info in raw.items():
+        where = f'crops.{name}'
+        if not isinstance(info, dict):
+            raise ThresholdError(f'{where} must be an object')
+        respiration = info.get('respiration')
+        if respiration not in respiration_factor:
+            raise ThresholdError(f'{where}.respiration {respiration!r} is not in respiration_factor')
+        safe_days = info.get('storage_days_safe')
+        if isinstance(safe_days, bool) or not isinstance(safe_days, int) or safe_days < 0:
+            raise ThresholdError(f'{where}.storage_days_safe must be a non-negative integer')
+        crops[name.lower()] = {
+            'ideal_temp': _range(info.get('ideal_temp'), f'{where}.ideal_temp'),
+            'ideal_humidity': _range(info.get('ideal_humidity'), f'{where}.ideal_humidity'),
+            'storage_days_safe': safe_days,
+            'respiration': respiration,
+            'notes': str(info.get('notes', '')),
+        }
+    # common alias: many users enter 'rice' for paddy
+    if 'paddy' in crops and 'rice' not in crops:
+        crops['rice'] = crops['paddy']
+    return crops
+
+
+def _parse_crop_data(raw: Dict) -> Dict:
+    out = {}
+    for region, crops in raw.items():
+        if not isinstance(crops, dict):
+            raise ThresholdError(f'crop_data.{region} must be an object')
+        out[region] = {}
+        for name, info in crops.items():
+            where = f'crop_data.{region}.{name}'
+            if not isinstance(info, dict):
+                raise ThresholdError(f'{where} must be an object')
+            entry = dict(info)
+            entry['temp'] = _range(info.get('temp'), f'{where}.temp')
+            entry['humidity'] = _range(info.get('humidity'), f'{where}.humidity')
+            out[region][name] = entry
+    return out
+
+
+def _parse_schemes(raw: Dict) -> Dict:
+    # the eligibility rules refer to schemes by code, so none may go missing
+    missing = sorted(set(_BUILTIN['schemes']) - set(raw))
+    if missing:
+        raise ThresholdError(f'schemes is missing {", ".join(missing)}')
+    schemes = {}
+    for code, scheme in raw.items():
+        if not isinstance(scheme, dict):
+            raise ThresholdError(f'schemes.{code} must be an object')
+        absent = [f for f in SCHEME_FIELDS if not scheme.get(f)]
+        if absent:
+            raise ThresholdError(f'schemes.{code} needs {", ".join(absent)}')
+        schemes[code] = dict(scheme)
+    return schemes
+
+
+class ThresholdTables:
+    """One validated, compiled version of every threshold table."""
+
+    def __init__(self, version: str, source: str, digest: str, crops: Dict, region_adjustments: Dict,
+                 respiration_factor: Dict, crop_data: Dict, schemes: Dict):
+        self.version = version
+        self.source = source
+        self.digest = digest
+        self.crops = crops
+        self.region_adjustments = region_adjustments
+        self.respiration_factor = respiration_factor
+        self.crop_data = crop_data
+        self.schemes = schemes
+        self.rules = crop_rules.compile_rules(crops, region_adjustments, respiration_factor, version=version)
+        self.loaded_at = time.time()
+
+    def describe(self) -> Dict:
+        return {'version': self.version, 'source': self.source, 'digest': self.digest,
+                'crops': len(self.crops), 'schemes': len(self.schemes), 'loaded_at': round(self.loaded_at, 3)}
+
+
+def build(document: Dict, source: str = 'inline', digest: str = '') -> ThresholdTables:
+    """Validate a threshold document and compile it (nothing is installed)."""
+    if not isinstance(document, dict):
+        raise ThresholdError('threshold file must contain a JSON object')
+    unknown = sorted(set(document) - set(SECTIONS) - {'version'})
+    if unknown:
+        raise ThresholdError(f'unknown sections: {", ".join(unknown)}')
+    version = document.get('version')
+    if version in (None, ''):
+        raise ThresholdError('version is required')
+
+    respiration_factor = {
+        name: _number(value, f'respiration_factor.{name}')
+        for name, value in _section(document, 'respiration_factor').items()
+    }
+    region_adjustments = {}
+    for region, adj in _section(document, 'region_adjustments').items():
+        if not isinstance(adj, dict):
+            raise ThresholdError(f'region_adjustments.{region} must be an object')
+        region_adjustments[region] = {
+            'humidity_bias': _number(adj.get('humidity_bias', 0), f'region_adjustments.{region}.humidity_bias'),
+            'temp_bias': _number(adj.get('temp_bias', 0), f'region_adjustments.{region}.temp_bias'),
+        }
+    return ThresholdTables(
+        version=str(version),
+        source=source,
+        digest=digest,
+        crops=_parse_crops(_section(document, 'crops'), respiration_factor),
+        region_adjustments=region_adjustments,
+        respiration_factor=respiration_factor,
+        crop_data=_parse_crop_data(_section(document, 'crop_data')),
+        schemes=_parse_schemes(_section(document, 'schemes')),
+    )
+
+
+def load_file(path: str) -> ThresholdTables:
+    with open(path, 'rb') as fh:
+        raw = fh.read()
+    try:
+        document = json.loads(raw.decode('utf-8'))
+    except (UnicodeDecodeError, json.JSONDecodeError) as exc:
+        raise ThresholdError(f'{path}: {exc}')
+    return build(document, source=path, digest=hashlib.sha256(raw).hexdigest()[:12])
+
+
+# -------------------------------
+# Active version
+# -------------------------------
+_current: Optional[ThresholdTables] = None
+_listeners: List[Callable[[ThresholdTables], None]] = []
+_install_lock = threading.Lock()
+
+
+def current() -> Optional[ThresholdTables]:
+    """Tables installed from a file, or None while the built-ins are active."""
+    return _current
+
+
+def version() -> str:
+    return risk_engine.rules_version()
+
+
+def on_install(callback: Callable[[ThresholdTables], None]) -> None:
+    """Run `callback(tables)` after each install (e.g. to rescore stored results)."""
+    _listeners.append(callback)
+
+
+def install(tables: ThresholdTables) -> None:
+    """Swap `tables` in. Each consumer sees either the old or the new table, never a mix."""
+    global _current
+    with _install_lock:
+        risk_engine.install_rules(tables.rules)
+        eligibility_engine.SCHEMES = tables.schemes
+        data.CROP_DATA = tables.crop_data
+        _current = tables
+    for callback in _listeners:
+        callback(tables)
+
+
+class ThresholdWatcher:
+    """Poll a threshold file and install new versions off the request path."""
+
+    def __init__(self, path: str, poll_seconds: float = 5.0):
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self._signature: Optional[Tuple[int, int]] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.checks = 0
+        self.reloads = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    def _stat(self) -> Optional[Tuple[int, int]]:
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def check(self) -> bool:
+        """Reload if the file changed since the last check; returns True when a new version was installed."""
+        with self._lock:
+            self.checks += 1
+            signature = self._stat()
+            if signature is None or signature == self._signature:
+                return False
+            self._signature = signature
+            try:
+                tables = load_file(self.path)
+            except (OSError, ThresholdError) as exc:
+                self.failures += 1
+                self.last_error = str(exc)
+                return False
+            active = current()
+            if active is not None and active.digest == tables.digest:
+                return False
+            if tables.version == version():
+                # cached fragments and issued risk tokens are keyed by the version label,
+                # so new content under the same label would be served stale or mis-verified
+                self.failures += 1
+                self.last_error = (f'{self.path}: content changed but version {tables.version!r} '
+                                   f'is already active; bump the version to install it')
+                return False
+            install(tables)
+            self.reloads += 1
+            self.last_error = None
+            return True
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='threshold-watcher', daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as exc:
+                # a failing listener must not stop the watcher
+                self.failures += 1
+                self.last_error = str(exc)
+
+    def stats(self) -> Dict:
+        active = current()
+        return {
+            'version': version(),
+            'active': active.describe() if active else {'version': version(), 'source': 'builtin'},
+            'path': self.path,
+            'watching': self.running,
+            'poll_seconds': self.poll_seconds,
+            'checks': self.checks,
+            'reloads': self.reloads,
+            'failures': self.failures,
+            'last_error': self.last_error,
+        }
+
+
+def export_builtin(version_label: str = '1') -> Dict:
+    document = {'version': version_label}
+    document.update(copy.deepcopy(_BUILTIN))
+    return document
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export or validate AgriSpectra threshold files.')
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--export', metavar='PATH', help='write the built-in tables as a threshold file')
+    group.add_argument('--check', metavar='PATH', help='validate a threshold file')
+    parser.add_argument('--version', default='1', help='version label for --export')
+    args = parser.parse_args(argv)
+
+    if args.export:
+        with open(args.export, 'w', encoding='utf-8') as fh:
+            json.dump(export_builtin(args.version), fh, indent=2, ensure_ascii=False)
+            fh.write('\n')
+        print(f'wrote {args.export}')
+        return
+    try:
+        tables = load_file(args.check)
+    except (OSError, ThresholdError) as exc:
+        raise SystemExit(f'invalid: {exc}')
+    print(json.dumps(tables.describe(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""Local webhook receiver for alert deliveries.
+
+Accepts the POSTs `alerts.py` sends, with configurable latency and error
+injection so batching, retries and backoff can be exercised offline (run
+the app with AGRISPECTRA_ALERT_ALLOW_PRIVATE=1 so it may deliver to 127.0.0.1):
+
+    python webhook_sink.py --port 8091 --latency fixed:20 --error-rate 0.2
+    curl -X POST localhost:5000/api/alerts/subscriptions -H 'Content-Type: application/json' \\
+         -d '{"warehouse_id": "wh-1", "latitude": 20.46, "longitude": 85.88,
+              "crop_type": "Rice", "webhook": "http://127.0.0.1:8091/hook"}'
+
+`GET /__stats` returns request, batch, alert and error counters;
+`GET /__received?limit=N` the most recent batches as received (with a
+`signature_ok` flag when started with `--secret`).
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import hmac
+import json
+import random
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+from openmeteo_stub import parse_latency
+
+
+class SinkConfig:
+    def __init__(self, latency: str = 'none', error_rate: float = 0.0, secret: str = '', keep: int = 1000,
+                 seed: int = 0):
+        self.rng = random.Random(seed)
+        self.latency_spec = latency
+        self.sample_latency = parse_latency(latency, self.rng)
+        self.error_rate = error_rate
+        self.secret = secret
+        self.lock = threading.Lock()
+        self.received: deque = deque(maxlen=keep)
+        self.counters = {'requests': 0, 'errors': 0, 'batches': 0, 'alerts': 0, 'bad_signatures': 0}
+
+    def count(self, key: str, n: int = 1) -> None:
+        with self.lock:
+            self.counters[key] += n
+
+    def draw(self):
+        # the rng is shared between handler threads
+        with self.lock:
+            return self.rng.random(), self.sample_latency()
+
+
+def make_handler(config: SinkConfig):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, fmt, *args):
+            pass
+
+        def _send(self, status: int, payload) -> None:
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path == '/__stats':
+                with config.lock:
+                    stats = dict(config.counters)
+                return self._send(200, {**stats, 'latency': config.latency_spec, 'error_rate': config.error_rate})
+            if url.path == '/__received':
+                limit = int(parse_qs(url.query).get('limit', ['50'])[-1])
+                with config.lock:
+                    batches = list(config.received)[-limit:] if limit > 0 else []
+                return self._send(200, {'batches': batches})
+            return self._send(404, {'error': True, 'reason': 'not found'})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            config.count('requests')
+            roll, delay = config.draw()
+            time.sleep(delay)
+            if roll < config.error_rate:
+                config.count('errors')
+                return self._send(500, {'error': True, 'reason': 'sink injected error'})
+            try:
+                payload = json.loads(body)
+            except ValueError:
+                return self._send(400, {'error': True, 'reason': 'body is not JSON'})
+
+            entry = {'path': urlparse(self.path).path, 'received_at': time.time(), 'payload': payload}
+            if config.secret:
+                expected = 'sha256=' + hmac.new(config.secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+                entry['signature_ok'] = hmac.compare_digest(expected, self.headers.get('X-AgriSpectra-Signature', ''))
+                if not entry['signature_ok']:
+                    config.count('bad_signatures')
+            alerts = payload.get('alerts') if isinstance(payload, dict) else None
+            with config.lock:
+                config.counters['batches'] += 1
+                config.counters['alerts'] += len(alerts or ())
+                config.received.append(entry)
+            return self._send(200, {'ok': True})
+
+    return Handler
+
+
+def make_server(host: str = '127.0.0.1', port: int = 8091, config: Optional[SinkConfig] = None) -> ThreadingHTTPServer:
+    """Build (but do not start) a sink server; call `serve_forever()` in a thread."""
+    server = ThreadingHTTPServer((host, port), make_handler(config or SinkConfig()))
+    server.daemon_threads = True
+    return server
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Local webhook receiver for alert deliveries.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8091)
+    parser.add_argument('--latency', default='none', help='e.g. fixed:50, uniform:20,200, lognormal:120,0.6')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of deliveries answered with HTTP 500')
+    parser.add_argument('--secret', default='', help='check X-AgriSpectra-Signature against this secret')
+    parser.add_argument('--keep', type=int, default=1000, help='how many received batches to keep')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    config = SinkConfig(latency=args.latency, error_rate=args.error_rate, secret=args.secret, keep=args.keep,
+                        seed=args.seed)
+    server = make_server(args.host, args.port, config)
+    print(f'Webhook sink listening on http://{args.host}:{args.port} (latency={args.latency})')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()